@@ -1,10 +1,15 @@
 from search_algorithm import SearchAlgorithm, Node
-from queue import PriorityQueue
+from bisect import bisect_left, bisect_right
+from heapq import heappush, heappop
+from compiled_graph import haversine_heuristic
 """
 Implementazione dell'algoritmo di ricerca A*.
 
 Questo modulo fornisce una implementazione dell'algoritmo di ricerca A*.
 Include una classe `AstarNode` per rappresentare i nodi nell'algoritmo A* e una classe `AStar` per l'algoritmo stesso.
+La classe `CompiledAStar` esegue lo stesso algoritmo su un grafo compilato (`compiled_graph.CompiledGraph`), lavorando solo su indici interi.
+La classe `BidirectionalAStar` esegue la ricerca contemporaneamente dallo stato iniziale e dall'obiettivo.
+La classe `ChargingAStar` risolve i problemi con stato di carica della batteria (`charging_path_finding.ChargingPathFinding`) in una sola ricerca a etichette.
 
 Esempio di utilizzo:
 
@@ -21,6 +26,10 @@ astar = AStar(graph, heuristic)
 
 # Risolvi il problema
 solution = astar.solve(problem)
+
+# Oppure, sul grafo compilato
+astar = CompiledAStar(compile_graph(graph))
+solution = astar.solve(problem)
 """
 
 class AstarNode(Node):
@@ -34,6 +43,8 @@ class AstarNode(Node):
         g (int or float, optional): Il costo per raggiungere questo nodo. Default è 0.
         h (int or float, optional): L'euristica per questo nodo. Default è 0.
     """
+    __slots__ = ('h',)
+
     def __init__(self, state, parent = None, action = None, g = 0, h = 0): # Costruttore
         super().__init__(state, parent, action, g)
         self.h = h
@@ -45,14 +56,20 @@ class AStar(SearchAlgorithm):
     """
     Implementazione dell'algoritmo di ricerca A*.
 
+    Il costo di uno stato viene aggiornato ogni volta che si trova un percorso migliore, finchè lo stato non viene espanso (insieme chiuso).
+    Con un'euristica consistente, come `heuristics.euclidean_distance` o l'euristica ALT, il costo di uno stato espanso è già ottimo.
+    Con un'euristica solo ammissibile, `reopen=True` riapre gli stati chiusi raggiunti con un costo minore, garantendo comunque l'ottimalità.
+
     Args:
         graph (object): Il grafo su cui eseguire l'algoritmo.
         heuristic (function): La funzione euristica da utilizzare.
         view (bool, optional): Se True, visualizza l'output dell'algoritmo. Default è False.
+        reopen (bool, optional): Se True, riapre gli stati chiusi quando viene trovato un percorso migliore. Default è False.
     """
-    def __init__(self, graph, heuristic, view = False):
+    def __init__(self, graph, heuristic, view = False, reopen = False):
         self.graph = graph
         self.heuristic = heuristic
+        self.reopen = reopen
         super().__init__(view)
 
     def solve(self, problem):
@@ -65,22 +82,313 @@ class AStar(SearchAlgorithm):
         Returns:
             object: La soluzione al problema, se esiste. Altrimenti, None.
         """
-        reached = set() # Insieme degli stati raggiunti
-        frontier = PriorityQueue() # Coda di priorità
-        frontier.put(AstarNode(problem.init, h = self.heuristic(problem.init, problem.goal, self.graph))) # Inserisce il nodo iniziale
-        reached.add(problem.init) # Aggiunge il nodo iniziale all'insieme degli stati raggiunti
+        frontier = [] # Coda di priorità (f, contatore, nodo), senza lock
+        best_g = {problem.init: 0} # Costo migliore noto per ogni stato generato
+        h_values = {} # Euristica già calcolata per ogni stato generato
+        closed = set() # Insieme degli stati espansi
+        h_values[problem.init] = self.heuristic(problem.init, problem.goal, self.graph)
+        heappush(frontier, (h_values[problem.init], 0, AstarNode(problem.init, h = h_values[problem.init]))) # Inserisce il nodo iniziale
+        counter = 1 # Ordine di inserimento, per non confrontare i nodi a parità di f
+        generated, heuristic_calls, peak_frontier = 0, 1, 1 # Contatori della ricerca
         self.reset_expanded() # Resetta il numero di nodi espansi
 
-        while not frontier.empty(): # Finchè la coda di priorità non è vuota
-            n = frontier.get() # Estrae il nodo con priorità più alta
+        while frontier: # Finchè la coda di priorità non è vuota
+            _, _, n = heappop(frontier) # Estrae il nodo con priorità più alta
+            if n.state in closed or n.g > best_g[n.state]: # Voce obsoleta: lo stato è stato reinserito con un costo minore (decrease-key pigro)
+                continue
             if problem.isGoal(n.state): # Se il nodo è lo stato obiettivo
+                self.update_counters(generated, heuristic_calls, peak_frontier)
                 return self.extract_solution(n) # Estrae la soluzione
+            closed.add(n.state)
+            self.update_expanded(n.state) # Aggiorna il numero di nodi espansi
             for action, s, cost, t in problem.getSuccessors(n.state): # Per ogni azione, stato e costo dei successori dello stato corrente
-                if s not in reached: # Se il nuovo stato non è stato raggiunto
-                    self.update_expanded(s) # Aggiorna il numero di nodi espansi
-                    reached.add(s) # Aggiunge il nuovo stato all'insieme degli stati raggiunti
-                    new_g = n.g + cost # Calcola il nuovo costo
-                    new_h = self.heuristic(s, problem.goal, self.graph) # Calcola la nuova euristica
-                    frontier.put(AstarNode(s, n, action, new_g, new_h)) # Inserisce il nuovo nodo nella coda di priorità
-
-        return None
\ No newline at end of file
+                generated += 1
+                if s in closed and not self.reopen: # Se il nuovo stato è già stato espanso
+                    continue
+                new_g = n.g + cost # Calcola il nuovo costo
+                if new_g < best_g.get(s, float('inf')): # Se il nuovo percorso è migliore di quello noto
+                    closed.discard(s) # Riapre lo stato, se era chiuso
+                    best_g[s] = new_g
+                    new_h = h_values.get(s)
+                    if new_h is None:
+                        new_h = h_values[s] = self.heuristic(s, problem.goal, self.graph) # Calcola la nuova euristica
+                        heuristic_calls += 1
+                    heappush(frontier, (new_g + new_h, counter, AstarNode(s, n, action, new_g, new_h))) # Inserisce il nuovo nodo nella coda di priorità
+                    counter += 1
+            if len(frontier) > peak_frontier: # La frontiera cresce solo durante la generazione dei successori
+                peak_frontier = len(frontier)
+
+        self.update_counters(generated, heuristic_calls, peak_frontier)
+        return None
+
+class CompiledAStar(SearchAlgorithm):
+    """
+    Implementazione dell'algoritmo di ricerca A* su un grafo compilato.
+
+    La ricerca avviene interamente sugli indici interi e sugli array CSR del grafo compilato: gli ID dei nodi vengono usati solo per
+    tradurre lo stato iniziale e l'obiettivo del problema e per costruire la soluzione, che ha lo stesso formato di quella di AStar.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato su cui eseguire l'algoritmo.
+        heuristic (function, optional): L'euristica su indici `(node_a, node_b, compiled_graph)`. Default è la distanza haversine.
+        view (bool, optional): Se True, visualizza l'output dell'algoritmo. Default è False.
+        weight (str, optional): La metrica di costo degli archi. Default è 'energy', lo stesso costo di SearchProblem.getSuccessors.
+        reopen (bool, optional): Se True, riapre gli indici chiusi quando viene trovato un percorso migliore, come in AStar. Default è False.
+    """
+    def __init__(self, compiled_graph, heuristic = haversine_heuristic, view = False, weight = 'energy', reopen = False):
+        self.compiled_graph = compiled_graph
+        self.heuristic = heuristic
+        self.weight = weight
+        self.reopen = reopen
+        super().__init__(view)
+
+    def solve(self, problem):
+        """
+        Risolve il problema utilizzando l'algoritmo A* sul grafo compilato.
+
+        Args:
+            problem (object): Il problema da risolvere. Lo stato iniziale e l'obiettivo sono ID di nodi del grafo.
+
+        Returns:
+            list: La soluzione al problema come lista di azioni `(u, v)`, se esiste. Altrimenti, None.
+        """
+        compiled = self.compiled_graph
+        heuristic = self.heuristic
+        offsets, targets, weights = compiled.as_lists(self.weight)
+        start = compiled.index[problem.init]
+        goal = compiled.index[problem.goal]
+        g = {start: 0} # Costo migliore noto per ogni indice raggiunto
+        parent = {start: None} # Indice del nodo genitore
+        closed = set() # Indici già espansi
+        frontier = [(heuristic(start, goal, compiled), 0, start)] # Coda di priorità (f, g, indice)
+        reopen = self.reopen
+        generated, heuristic_calls, peak_frontier = 0, 1, 1 # Contatori della ricerca
+        self.reset_expanded() # Resetta il numero di nodi espansi
+
+        while frontier: # Finchè la coda di priorità non è vuota
+            _, g_u, u = heappop(frontier) # Estrae l'indice con f minore
+            if u in closed or g_u > g[u]: # Voce obsoleta, l'indice è già stato espanso o reinserito con un costo minore
+                continue
+            if u == goal: # Se il nodo è lo stato obiettivo
+                self.update_counters(generated, heuristic_calls, peak_frontier)
+                return self.extract_path(parent, goal) # Estrae la soluzione
+            closed.add(u)
+            self.update_expanded(compiled.node_list[u]) # Aggiorna il numero di nodi espansi
+            generated += offsets[u + 1] - offsets[u]
+            for e in range(offsets[u], offsets[u + 1]): # Per ogni arco uscente
+                v = targets[e]
+                if v in closed and not reopen:
+                    continue
+                new_g = g_u + weights[e] # Calcola il nuovo costo
+                if new_g < g.get(v, float('inf')): # Se il nuovo percorso è migliore di quello noto
+                    closed.discard(v) # Riapre l'indice, se era chiuso
+                    g[v] = new_g
+                    parent[v] = u
+                    heappush(frontier, (new_g + heuristic(v, goal, compiled), new_g, v)) # Inserisce il nuovo indice nella coda di priorità
+                    heuristic_calls += 1
+            if len(frontier) > peak_frontier: # La frontiera cresce solo durante la generazione dei successori
+                peak_frontier = len(frontier)
+
+        self.update_counters(generated, heuristic_calls, peak_frontier)
+        return None
+
+    def extract_path(self, parent, goal):
+        """
+        Estrae la soluzione a partire dai puntatori ai genitori.
+
+        Args:
+            parent (dict): Il genitore di ogni indice raggiunto, None per lo stato iniziale.
+            goal (int): L'indice del nodo obiettivo.
+
+        Returns:
+            list: La lista di azioni `(u, v)` dallo stato iniziale all'obiettivo.
+        """
+        path = [goal]
+        while parent[path[-1]] is not None:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return self.compiled_graph.actions(path)
+
+class BidirectionalAStar(SearchAlgorithm):
+    """
+    Implementazione dell'algoritmo di ricerca A* bidirezionale.
+
+    La ricerca procede contemporaneamente in avanti da `problem.init` verso `problem.goal` e all'indietro da `problem.goal` verso `problem.init`,
+    espandendo ogni volta dalla frontiera più piccola. Le due direzioni usano potenziali bilanciati, `p(s) = (h(s, goal) - h(s, init)) / 2` in avanti
+    e `-p(s)` all'indietro, che restano consistenti se l'euristica è consistente. Ogni volta che una direzione genera uno stato già raggiunto
+    dall'altra viene aggiornato il miglior percorso noto; la ricerca termina quando la somma delle priorità minime delle due frontiere non è
+    inferiore al costo di quel percorso, condizione che garantisce l'ottimalità.
+
+    La ricerca all'indietro usa gli stessi successori di quella in avanti, per cui il grafo deve essere non diretto, come quello di `generate_osm_graph`.
+
+    Args:
+        graph (object): Il grafo su cui eseguire l'algoritmo.
+        heuristic (function): La funzione euristica da utilizzare, consistente.
+        view (bool, optional): Se True, visualizza l'output dell'algoritmo. Default è False.
+    """
+    def __init__(self, graph, heuristic, view = False):
+        self.graph = graph
+        self.heuristic = heuristic
+        super().__init__(view)
+
+    def solve(self, problem):
+        """
+        Risolve il problema utilizzando l'algoritmo A* bidirezionale.
+
+        Args:
+            problem (object): Il problema da risolvere.
+
+        Returns:
+            object: La soluzione al problema, se esiste. Altrimenti, None.
+        """
+        self.reset_expanded() # Resetta il numero di nodi espansi
+        if problem.isGoal(problem.init):
+            return []
+        potential = {} # Potenziale in avanti di ogni stato generato, quello all'indietro è il suo opposto
+        def forward_potential(state):
+            if state not in potential:
+                potential[state] = (self.heuristic(state, problem.goal, self.graph) - self.heuristic(state, problem.init, self.graph)) / 2
+            return potential[state]
+
+        sign = (1, -1) # Segno del potenziale in avanti e all'indietro
+        g = ({problem.init: 0}, {problem.goal: 0}) # Costo migliore noto in ogni direzione
+        parent = ({problem.init: None}, {problem.goal: None}) # (stato genitore, azione) in ogni direzione
+        closed = (set(), set()) # Stati espansi in ogni direzione
+        frontier = ([(forward_potential(problem.init), 0, problem.init)], [(-forward_potential(problem.goal), 1, problem.goal)]) # Code di priorità (priorità, contatore, stato)
+        counter = 2 # Ordine di inserimento, per non confrontare gli stati a parità di priorità
+        best_cost = float('inf') # Costo del miglior percorso trovato
+        meeting = None # Stato in cui si incontrano le due ricerche nel miglior percorso
+        generated, peak_frontier = 0, 2 # Contatori della ricerca
+
+        while frontier[0] and frontier[1]: # Finchè entrambe le code di priorità non sono vuote
+            if frontier[0][0][0] + frontier[1][0][0] >= best_cost: # Nessun percorso migliore è ancora possibile
+                break
+            d = 0 if len(frontier[0]) <= len(frontier[1]) else 1 # Espande dalla frontiera più piccola
+            _, _, state = heappop(frontier[d])
+            if state in closed[d]: # Voce obsoleta, lo stato è già stato espanso con un costo minore
+                continue
+            closed[d].add(state)
+            self.update_expanded(state) # Aggiorna il numero di nodi espansi
+            for action, s, cost, t in problem.getSuccessors(state): # Per ogni azione, stato e costo dei successori dello stato corrente
+                generated += 1
+                if s in closed[d]:
+                    continue
+                new_g = g[d][state] + cost # Calcola il nuovo costo
+                if new_g < g[d].get(s, float('inf')): # Se il nuovo percorso è migliore di quello noto
+                    g[d][s] = new_g
+                    parent[d][s] = (state, action)
+                    heappush(frontier[d], (new_g + sign[d] * forward_potential(s), counter, s))
+                    counter += 1
+                    if s in g[1 - d] and new_g + g[1 - d][s] < best_cost: # Le due ricerche si incontrano in s
+                        best_cost = new_g + g[1 - d][s]
+                        meeting = s
+            if len(frontier[0]) + len(frontier[1]) > peak_frontier:
+                peak_frontier = len(frontier[0]) + len(frontier[1])
+
+        self.update_counters(generated, 2 * len(potential), peak_frontier) # Ogni potenziale valuta l'euristica due volte
+        if meeting is None:
+            return None
+        return self.extract_bidirectional_solution(parent, meeting)
+
+    def extract_bidirectional_solution(self, parent, meeting):
+        """
+        Estrae la soluzione unendo i percorsi delle due ricerche nello stato di incontro.
+
+        Args:
+            parent (tuple): I puntatori ai genitori della ricerca in avanti e di quella all'indietro.
+            meeting (object): Lo stato in cui si incontrano le due ricerche.
+
+        Returns:
+            list: La lista di azioni dallo stato iniziale all'obiettivo.
+        """
+        solution = []
+        state = meeting
+        while parent[0][state] is not None: # Percorso in avanti, dallo stato di incontro all'indietro fino allo stato iniziale
+            state, action = parent[0][state]
+            solution.append(action)
+        solution.reverse()
+        state = meeting
+        while parent[1][state] is not None: # Percorso all'indietro, con le azioni invertite
+            state, action = parent[1][state]
+            solution.append((action[1], action[0]))
+        return solution
+
+class ChargingAStar(SearchAlgorithm):
+    """
+    Ricerca A* a etichette per problemi con stati (nodo, batteria), come `charging_path_finding.ChargingPathFinding`.
+
+    Uno stesso nodo può essere espanso più volte con energie diverse nella batteria. Un'etichetta viene scartata se il nodo è già stato espanso
+    con un costo non maggiore e almeno la stessa energia utile, restituita dal metodo `useful_battery(state)` del problema (dominanza di Pareto
+    su costo ed energia): nessuna etichetta con più carica viene scartata a favore di una più veloce.
+
+    Con l'energia continua il numero di etichette non dominate di un nodo non ha un limite, per cui ogni nodo viene espanso al più
+    `problem.max_labels` volte e le etichette successive vengono scartate. È un'approssimazione: se il limite viene raggiunto, la ricerca può
+    restituire un percorso più lento dell'ottimo o non trovarne uno. Il limite predefinito di ChargingPathFinding non viene raggiunto sui grafi
+    del benchmark, perchè la sua euristica conta anche il tempo minimo delle ricariche necessarie e le etichette con poca carica non vengono espanse.
+
+    L'euristica è fornita dal problema, con il metodo `heuristic(state)`; gli stati con euristica infinita (obiettivo non raggiungibile) vengono scartati.
+
+    Args:
+        view (bool, optional): Se True, visualizza l'output dell'algoritmo. Default è False.
+    """
+    def solve(self, problem):
+        """
+        Risolve il problema con una sola ricerca a etichette.
+
+        Args:
+            problem (object): Il problema da risolvere, con stati (nodo, batteria), i metodi `heuristic` e `useful_battery` e l'attributo `max_labels`.
+
+        Returns:
+            object: La lista di azioni dallo stato iniziale all'obiettivo, se esiste. Altrimenti, None.
+        """
+        fronts = {} # Etichette non dominate con cui ogni nodo è già stato espanso: costi ed energie utili, entrambi crescenti
+        labels = {} # Numero di espansioni di ogni nodo
+        useful_battery = problem.useful_battery
+        max_labels = problem.max_labels
+
+        def dominated(node, g, battery):
+            front = fronts.get(node)
+            if front is None:
+                return False
+            if labels[node] >= max_labels: # Limite di etichette del nodo raggiunto
+                return True
+            i = bisect_right(front[0], g) # L'etichetta con più energia tra quelle di costo non maggiore è l'ultima
+            return i > 0 and front[1][i - 1] >= battery
+
+        h = problem.heuristic(problem.init)
+        frontier = [(h, 0, AstarNode(problem.init, h = h))] # Coda di priorità (f, contatore, nodo)
+        counter = 1
+        generated, peak_frontier = 0, 1 # Contatori della ricerca, le valutazioni dell'euristica sono una per etichetta inserita
+        self.reset_expanded() # Resetta il numero di nodi espansi
+
+        while frontier: # Finchè la coda di priorità non è vuota
+            _, _, n = heappop(frontier)
+            node = n.state[0]
+            battery = useful_battery(n.state)
+            if dominated(node, n.g, battery): # Etichetta dominata da una già espansa
+                continue
+            if problem.isGoal(n.state): # Se il nodo è lo stato obiettivo
+                self.update_counters(generated, counter, peak_frontier)
+                return self.extract_solution(n)
+            costs, batteries = fronts.setdefault(node, ([], []))
+            i = j = bisect_left(costs, n.g)
+            while j < len(costs) and batteries[j] <= battery: # Etichette dominate dalla nuova
+                j += 1
+            costs[i:j], batteries[i:j] = [n.g], [battery]
+            labels[node] = labels.get(node, 0) + 1
+            self.update_expanded(n.state) # Aggiorna il numero di nodi espansi
+            for action, s, cost, t in problem.getSuccessors(n.state):
+                generated += 1
+                new_g = n.g + cost
+                if dominated(s[0], new_g, useful_battery(s)): # Successore già dominato
+                    continue
+                new_h = problem.heuristic(s)
+                if new_h == float('inf'): # Obiettivo non raggiungibile dal successore
+                    continue
+                heappush(frontier, (new_g + new_h, counter, AstarNode(s, n, action, new_g, new_h)))
+                counter += 1
+            if len(frontier) > peak_frontier:
+                peak_frontier = len(frontier)
+
+        self.update_counters(generated, counter, peak_frontier)
+        return None
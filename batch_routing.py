@@ -0,0 +1,217 @@
+import multiprocessing
+import numpy as np
+from compiled_graph import compile_graph
+from charging_stations import place_charging_stations, station_registry
+from electric_vehicle import ElectricVehicle, electric_vehicle_data
+from graph_store import load_osm_graph
+from route_metrics import evaluate_vehicles, route_metrics
+from station_matrix import station_matrix
+"""
+Modulo batch_routing.py
+
+Questo modulo fornisce un'interfaccia per calcolare molti viaggi sullo stesso grafo, distribuendoli su un pool di processi.
+
+Il grafo viene caricato una sola volta e condiviso in sola lettura con i processi del pool: dove è disponibile il metodo di avvio 'fork',
+i processi figli ereditano il grafo (già compilato, con il registro delle stazioni) senza serializzarlo; altrimenti il grafo viene inviato
+una sola volta a ogni processo, non a ogni viaggio. Ogni viaggio parte dalle stesse stazioni disponibili, e il grafo condiviso non viene modificato.
+
+Un viaggio è descritto da una tupla `(start, end, vehicle, temperature, min_battery_percent)`:
+
+- `start`, `end`: gli ID dei nodi di partenza e di arrivo;
+- `vehicle`: il nome di un modello di `electric_vehicle_data`, oppure un dizionario con `battery_capacity_kWh` ed `electric_constant`;
+- `temperature`: la temperatura ambiente in gradi Celsius, limitata ad almeno 1 come in `evopt` e nell'interfaccia grafica
+  (il consumo è inversamente proporzionale alla temperatura);
+- `min_battery_percent`: la percentuale minima di batteria da mantenere, come nell'interfaccia grafica.
+
+I risultati sono restituiti in forma colonnare: un dizionario di liste, una per campo, con un elemento per viaggio nell'ordine dei viaggi.
+
+`compare_vehicles` confronta molti veicoli sullo stesso viaggio: il percorso senza ricariche non dipende dal veicolo, per cui viene cercato
+una sola volta e valutato per tutti i veicoli insieme con `route_metrics.evaluate_vehicles`; solo i veicoli che devono ricaricare
+richiedono, se indicato, una ricerca con le ricariche.
+
+Esempio di utilizzo:
+
+```python
+from batch_routing import compare_vehicles, load_graph, route_batch
+
+G = load_graph("Brescia", num_charging_stations = 200, seed = 0)
+jobs = [(start, end, "Fiat 500e", 20, 20) for start, end in pairs]
+results = route_batch(G, jobs, processes = 8)
+results['time'] # Tempo di viaggio di ogni viaggio in secondi
+
+comparison = compare_vehicles(G, start, end, temperature = 5) # Tutti i modelli di electric_vehicle_data sullo stesso percorso
+```
+"""
+
+COLUMNS = ('start', 'end', 'vehicle', 'path', 'energy', 'time', 'recharges', 'energy_recharged', 'battery', 'error')
+VEHICLE_COLUMNS = ('vehicle', 'energy', 'battery', 'feasible', 'recharges', 'first_stop', 'time', 'path', 'error')
+
+_graph = None # Grafo condiviso con i processi del pool
+_search = 'adaptive' # Metodo di ricerca dei processi del pool
+
+def load_graph(location, num_charging_stations = 0, seed = None, store = None):
+    """
+    Carica il grafo elaborato di una località e imposta le stazioni di ricarica.
+
+    Args:
+        location (str): La località da cui scaricare i dati della rete stradale.
+        num_charging_stations (int, optional): Il numero di stazioni di ricarica. Se 0, il 10% dei nodi. Default è 0.
+        seed (int, optional): Il seme per la scelta delle stazioni, per ottenere sempre le stesse. Default è None.
+        store (GraphStore, optional): L'archivio dei grafi da usare. Default è l'archivio nella cartella 'graph_store'.
+
+    Returns:
+        networkx.Graph: Il grafo con le stazioni di ricarica.
+    """
+    G = load_osm_graph(location, store = store)
+    if num_charging_stations is None or num_charging_stations <= 0:
+        num_charging_stations = int(len(G) * 0.1)
+    place_charging_stations(G, num_charging_stations, seed)
+    return G
+
+def make_vehicle(vehicle, min_battery_percent):
+    """
+    Crea un veicolo elettrico con la batteria carica a partire dal modello.
+
+    Args:
+        vehicle (str or dict): Il nome di un modello di `electric_vehicle_data`, o un dizionario con le stesse chiavi.
+        min_battery_percent (float): La percentuale minima di batteria da mantenere.
+
+    Returns:
+        ElectricVehicle: Il veicolo elettrico.
+
+    Raises:
+        KeyError: Se il modello non esiste.
+    """
+    data = electric_vehicle_data[vehicle] if isinstance(vehicle, str) else vehicle
+    capacity = data["battery_capacity_kWh"]
+    return ElectricVehicle(capacity, capacity, capacity * min_battery_percent / 100, data["electric_constant"])
+
+def route_trip(graph, job, search = 'adaptive'):
+    """
+    Calcola un singolo viaggio. Le stazioni usate sono tracciate nella disponibilità del viaggio, il grafo non viene modificato.
+
+    Args:
+        graph (networkx.Graph): Il grafo con le stazioni di ricarica.
+        job (tuple): Il viaggio `(start, end, vehicle, temperature, min_battery_percent)`.
+        search (str, optional): 'adaptive' per `ElectricVehicle.adaptive_search`, 'charging' per `ElectricVehicle.charging_search`,
+            'stations' per `ElectricVehicle.station_search`, con la matrice delle stazioni già preparata (ad esempio da `route_batch`).
+            Default è 'adaptive'.
+
+    Returns:
+        dict: I campi di COLUMNS per il viaggio. Se il viaggio non ha soluzione, `path` è None ed `error` contiene il messaggio.
+    """
+    start, end, vehicle, temperature, min_battery_percent = job
+    temperature = max(temperature, 1) # Come evopt e l'interfaccia grafica: con temperature non positive il consumo sarebbe negativo o infinito
+    electric_vehicle = make_vehicle(vehicle, min_battery_percent)
+    result = {'start': start, 'end': end, 'vehicle': vehicle, 'path': None, 'error': None}
+    try:
+        if search == 'charging':
+            result['path'] = electric_vehicle.charging_search(graph, start, end, temperature)
+        elif search == 'stations':
+            result['path'] = electric_vehicle.station_search(graph, start, end, temperature)
+        else:
+            result['path'] = electric_vehicle.adaptive_search(graph, start, end, temperature)
+    except Exception as e:
+        result['error'] = str(e)
+    result['energy'] = electric_vehicle.battery_capacity + sum(electric_vehicle.energy_recharged) - electric_vehicle.battery # Energia consumata in kWh
+    result['time'] = electric_vehicle.travel_time
+    result['recharges'] = electric_vehicle.recharge
+    result['energy_recharged'] = electric_vehicle.energy_recharged
+    result['battery'] = electric_vehicle.battery
+    return result
+
+def compare_vehicles(graph, start, end, vehicles = None, temperature = 20, min_battery_percent = 20, search = None):
+    """
+    Confronta molti veicoli sullo stesso viaggio.
+
+    Il percorso che minimizza l'energia è lo stesso per tutti i veicoli, perché la costante elettrica e la temperatura scalano
+    allo stesso modo il costo di ogni arco: viene cercato una sola volta e valutato per tutti i veicoli in una sola passata vettoriale.
+
+    Args:
+        graph (networkx.Graph): Il grafo con le stazioni di ricarica.
+        start (int): L'ID del nodo di partenza.
+        end (int): L'ID del nodo di arrivo.
+        vehicles (list, optional): I veicoli, come nomi di modelli di `electric_vehicle_data` o dizionari con le stesse chiavi. Default sono tutti i modelli.
+        temperature (float or list, optional): La temperatura ambiente, una sola o una per veicolo, limitata ad almeno 1 come in `route_trip`. Default è 20.
+        min_battery_percent (float or list, optional): La percentuale minima di batteria, una sola o una per veicolo. Default è 20.
+        search (str, optional): Se indicato, il metodo di ricerca di `route_trip` con cui calcolare il percorso con le ricariche
+            dei veicoli che non arrivano senza ricaricare. Default è None, nessuna ricerca.
+
+    Returns:
+        dict: Un dizionario con una lista per ogni campo di VEHICLE_COLUMNS, con un elemento per veicolo nell'ordine di `vehicles`.
+        `path` è il percorso comune per i veicoli che non ricaricano e quello con le ricariche per gli altri, se `search` è indicato.
+
+    Raises:
+        KeyError: Se un modello non esiste.
+        Exception: Se non esiste un percorso tra partenza e arrivo.
+    """
+    vehicles = list(electric_vehicle_data) if vehicles is None else list(vehicles)
+    data = [electric_vehicle_data[vehicle] if isinstance(vehicle, str) else vehicle for vehicle in vehicles]
+    capacity = np.array([d["battery_capacity_kWh"] for d in data], dtype=np.float64)
+    electric_constant = np.array([d["electric_constant"] for d in data], dtype=np.float64)
+    min_battery_percent = np.broadcast_to(np.asarray(min_battery_percent, dtype=np.float64), capacity.shape)
+    temperature = np.broadcast_to(np.maximum(np.asarray(temperature, dtype=np.float64), 1), capacity.shape) # Come route_trip, almeno 1
+    solution = ElectricVehicle().solve_leg(graph, start, end) # Percorso comune a tutti i veicoli
+    if solution is None:
+        raise Exception("Percorso non trovato")
+    metrics = route_metrics(graph, solution)
+    table = evaluate_vehicles(metrics, capacity, electric_constant, capacity * min_battery_percent / 100, temperature)
+    result = {column: table[column].tolist() for column in ('energy', 'battery', 'feasible', 'recharges', 'first_stop')}
+    result['vehicle'] = vehicles
+    result['time'] = [metrics.total_time] * len(vehicles)
+    result['path'] = [solution if feasible else None for feasible in table['feasible']]
+    result['error'] = [None] * len(vehicles)
+    if search is not None:
+        for k in (~table['feasible']).nonzero()[0]: # Solo i veicoli che devono ricaricare richiedono una nuova ricerca
+            row = route_trip(graph, (start, end, vehicles[k], float(temperature[k]), float(min_battery_percent[k])), search)
+            for column in ('path', 'energy', 'battery', 'time', 'recharges', 'error'):
+                result[column][k] = row[column]
+    return {column: result[column] for column in VEHICLE_COLUMNS}
+
+def route_batch(graph, jobs, processes = None, search = 'adaptive', chunksize = None):
+    """
+    Calcola molti viaggi sullo stesso grafo, distribuendoli su un pool di processi.
+
+    Args:
+        graph (networkx.Graph): Il grafo con le stazioni di ricarica, condiviso in sola lettura.
+        jobs (list): I viaggi `(start, end, vehicle, temperature, min_battery_percent)`.
+        processes (int, optional): Il numero di processi. Se 1, i viaggi vengono calcolati nel processo corrente. Default è il numero di CPU.
+        search (str, optional): Il metodo di ricerca, come in `route_trip`. Default è 'adaptive'.
+        chunksize (int, optional): Il numero di viaggi inviati insieme a un processo. Default è scelto da `multiprocessing.Pool.map`.
+
+    Returns:
+        dict: Un dizionario con una lista per ogni campo di COLUMNS, con un elemento per viaggio nell'ordine di `jobs`.
+    """
+    global _graph, _search
+    jobs = list(jobs)
+    compile_graph(graph) # Compila il grafo e costruisce il registro prima del fork, così i processi figli li ereditano
+    station_registry(graph)
+    if search == 'stations' and jobs: # Matrice delle stazioni, costruita una sola volta prima dei viaggi e non durante le richieste
+        station_matrix(graph)
+    if processes == 1 or len(jobs) <= 1:
+        rows = [route_trip(graph, job, search) for job in jobs]
+    else:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _graph, _search = graph, search # Ereditati dai processi figli, senza serializzazione
+            pool = multiprocessing.get_context('fork').Pool(processes)
+        else:
+            pool = multiprocessing.Pool(processes, initializer = _init_worker, initargs = (graph, search)) # Grafo inviato una volta per processo
+        try:
+            with pool:
+                rows = pool.map(_route_job, jobs, chunksize)
+        finally:
+            _graph = None
+    return {column: [row[column] for row in rows] for column in COLUMNS}
+
+def _init_worker(graph, search):
+    """
+    Imposta il grafo condiviso in un processo del pool avviato senza 'fork'.
+    """
+    global _graph, _search
+    _graph, _search = graph, search
+
+def _route_job(job):
+    """
+    Calcola un viaggio nel processo del pool, sul grafo condiviso.
+    """
+    return route_trip(_graph, job, _search)
@@ -0,0 +1,616 @@
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import networkx as nx
+import numpy as np
+import heuristics as h
+from ASTAR import AStar, AstarNode
+from batch_routing import make_vehicle
+from charging_stations import place_charging_stations, station_registry
+from compiled_graph import compile_graph
+from graph_store import GraphStore, load_osm_graph
+from leg_cache import LegCache
+from path_finding import PathFinding
+from profiling import SearchTrace
+"""
+Modulo benchmark.py
+
+Questo modulo contiene i benchmark di regressione degli algoritmi di ricerca, eseguibili da riga di comando sui grafi delle città già scaricate.
+
+Il benchmark `astar` confronta, sulle stesse coppie origine/destinazione, l'A* attuale con il comportamento precedente (`LegacyAStar`), in cui il primo
+percorso trovato verso uno stato vinceva anche se non era il più economico. Per ogni coppia riporta i nodi espansi e il costo del percorso trovato.
+
+Il benchmark `startup` misura in processi nuovi il tempo di importazione del modulo `evopt` e il tempo totale di `python -m evopt route`
+su un grafo già presente nell'archivio, li confronta con i budget IMPORT_BUDGET e ROUTE_BUDGET e verifica che le librerie pesanti
+(HEAVY_MODULES) non vengano importate all'avvio. Termina con codice di uscita 1 se un budget viene superato.
+
+Il benchmark `suite` funziona senza rete sui grafi delle risposte Overpass già presenti nella cartella `cache/`. Per ogni grafo posiziona
+le stazioni di ricarica con un seme fisso e genera carichi di lavoro riproducibili di coppie origine/destinazione, divisi per distanza
+(WORKLOADS) e, per i viaggi completi, per livello di batteria alla partenza (BATTERY_LEVELS). Per AStar con ogni euristica di `heuristics`
+(HEURISTICS) e per `ElectricVehicle.adaptive_search` riporta i percentili della latenza, i nodi espansi e il picco di memoria (tracemalloc).
+I risultati possono essere salvati come riferimento e confrontati con un riferimento precedente: termina con codice di uscita 1
+se i nodi espansi aumentano. Il riferimento del repository è `benchmark_baseline.json`; i nodi espansi sono deterministici, mentre
+le latenze dipendono dalla macchina, per cui il confronto delle latenze va richiesto con `--latency`: 'relative' confronta le latenze
+divise per quella di AStar senza euristica (REFERENCE_ALGORITHM) sullo stesso grafo e nella stessa esecuzione, così una macchina più lenta
+non risulta un peggioramento; 'absolute' confronta i secondi, ed è significativo solo sulla macchina che ha registrato il riferimento.
+
+Il benchmark `haversine` misura il numero di distanze al secondo dei nuclei haversine di `heuristics` (una coppia alla volta, un punto contro molti,
+molti contro molti) rispetto all'implementazione precedente per singola chiamata (`legacy_haversine_distance`), su punti casuali riproducibili,
+e riporta l'errore massimo rispetto a quest'ultima.
+
+Esempio di utilizzo:
+
+```bash
+python3 benchmark.py astar --place Brescia --pairs 50 --seed 0
+python3 benchmark.py startup --place Brescia --runs 5
+python3 benchmark.py suite --save-baseline benchmark_baseline.json # Aggiorna il riferimento
+python3 benchmark.py suite --baseline benchmark_baseline.json # Verifica i peggioramenti dei nodi espansi
+python3 benchmark.py suite --baseline benchmark_baseline.json --latency relative # Anche delle latenze, normalizzate
+python3 benchmark.py haversine --points 100000 --anchors 100
+```
+"""
+
+IMPORT_BUDGET = 1.0 # Tempo massimo in secondi per importare evopt
+ROUTE_BUDGET = 5.0 # Tempo massimo in secondi di `python -m evopt route` su un grafo già nell'archivio
+HEAVY_MODULES = ('tkinter', 'customtkinter', 'folium', 'geopy', 'sklearn', 'osmnx') # Librerie da non importare all'avvio
+WORKLOADS = {'short': (0, 5), 'medium': (5, 15), 'long': (15, math.inf)} # Distanza in linea d'aria delle coppie in km, [minima, massima)
+BATTERY_LEVELS = {'low': 0.3, 'high': 1.0} # Batteria alla partenza dei viaggi completi, in frazione della capacità
+HEURISTICS = { # Euristiche di heuristics.py confrontate con AStar, con la firma (node_a, node_b, graph)
+    'euclidean_distance': h.euclidean_distance,
+    'time_based_heuristic': h.time_based_heuristic,
+    'shortest_destination': h.shortest_destination,
+    'blind': lambda node_a, node_b, graph: h.blind(node_a, node_b)
+}
+REFERENCE_ALGORITHM = 'astar_blind' # Riga di riferimento per il confronto relativo delle latenze
+DEFAULT_HEURISTICS = ('euclidean_distance', 'time_based_heuristic', 'blind') # shortest_destination con --heuristics: una ricerca all'indietro per obiettivo
+HIGHWAY_SPEEDS = { # Velocità in km/h per tipo di strada, usate quando nessuna strada dello stesso tipo ha un limite di velocità
+    'motorway': 130, 'trunk': 110, 'primary': 90, 'secondary': 70, 'tertiary': 60, 'unclassified': 50, 'residential': 30, 'living_street': 10
+}
+
+class LegacyAStar(AStar):
+    """
+    Riproduzione dell'A* precedente, usata solo come riferimento nei benchmark.
+
+    Uno stato viene segnato come raggiunto la prima volta che viene generato e non viene più aggiornato, per cui il primo percorso trovato
+    verso uno stato vince anche se non è il più economico. I nodi espansi vengono contati all'estrazione dalla coda, come in AStar.
+    """
+    def solve(self, problem):
+        """
+        Risolve il problema con la semantica precedente.
+
+        Args:
+            problem (object): Il problema da risolvere.
+
+        Returns:
+            object: La soluzione al problema, se esiste. Altrimenti, None.
+        """
+        from heapq import heappush, heappop
+        reached = {problem.init} # Insieme degli stati raggiunti
+        frontier = [(self.heuristic(problem.init, problem.goal, self.graph), 0, AstarNode(problem.init))]
+        counter = 1
+        self.reset_expanded()
+        while frontier:
+            _, _, n = heappop(frontier)
+            if problem.isGoal(n.state):
+                return self.extract_solution(n)
+            self.update_expanded(n.state)
+            for action, s, cost, t in problem.getSuccessors(n.state):
+                if s not in reached:
+                    reached.add(s)
+                    new_h = self.heuristic(s, problem.goal, self.graph)
+                    heappush(frontier, (n.g + cost + new_h, counter, AstarNode(s, n, action, n.g + cost, new_h)))
+                    counter += 1
+        return None
+
+def legacy_haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Riproduzione della distanza haversine precedente, per singola chiamata, usata solo come riferimento nei benchmark.
+
+    Args:
+        lat1 (float): La latitudine del primo punto.
+        lon1 (float): La longitudine del primo punto.
+        lat2 (float): La latitudine del secondo punto.
+        lon2 (float): La longitudine del secondo punto.
+
+    Returns:
+        float: La distanza haversine tra i due punti in chilometri.
+    """
+    lat1_rad, lon1_rad, lat2_rad, lon2_rad = math.radians(lat1), math.radians(lon1), math.radians(lat2), math.radians(lon2)
+    a = math.sin((lat2_rad - lat1_rad) / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin((lon2_rad - lon1_rad) / 2)**2
+    return 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def compare_haversine(points = 100000, anchors = 100, seed = 0):
+    """
+    Misura il numero di distanze al secondo dei nuclei haversine rispetto a `legacy_haversine_distance`.
+
+    I punti sono casuali in un riquadro di circa 30 km. Le versioni per singola chiamata calcolano la distanza tra punti consecutivi;
+    `haversine_many` e `haversine_matrix` calcolano le distanze di `anchors` punti da tutti i punti.
+
+    Args:
+        points (int, optional): Il numero di punti. Default è 100000.
+        anchors (int, optional): Il numero di punti confrontati con tutti gli altri dalle versioni vettoriali. Default è 100.
+        seed (int, optional): Il seme del generatore casuale. Default è 0.
+
+    Returns:
+        list: Per ogni versione, un dizionario con il numero di distanze, il tempo in secondi, le distanze al secondo, l'accelerazione rispetto
+        alla versione precedente (`legacy_euclidean`, con le coordinate lette dai nodi del grafo, per `euclidean_distance`) e l'errore massimo
+        in chilometri rispetto alla versione precedente.
+    """
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(45.4, 45.7, points)
+    lon = rng.uniform(10.0, 10.4, points)
+    lat_list, lon_list = lat.tolist(), lon.tolist()
+    graph = nx.Graph()
+    graph.add_nodes_from((k, {'y': y, 'x': x}) for k, (y, x) in enumerate(zip(lat_list, lon_list)))
+    h.node_radians(graph) # Radianti dei nodi precalcolati fuori dalla misura
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat_rad)
+    pairs = range(points - 1)
+    anchors = min(anchors, points)
+    sample = min(points, 1000) # Punti su cui verificare le versioni vettoriali
+    reference = [legacy_haversine_distance(lat_list[k], lon_list[k], lat_list[k + 1], lon_list[k + 1]) for k in pairs]
+    reference_row = np.array([legacy_haversine_distance(lat_list[0], lon_list[0], lat_list[k], lon_list[k]) for k in range(sample)])
+    nodes = graph.nodes
+    kernels = ( # Nome, numero di distanze, esecuzione, risultati da verificare
+        ('legacy', len(pairs), lambda: [legacy_haversine_distance(lat_list[k], lon_list[k], lat_list[k + 1], lon_list[k + 1]) for k in pairs],
+         lambda result: np.asarray(result)),
+        ('legacy_euclidean', len(pairs), lambda: [legacy_haversine_distance(nodes[k]['y'], nodes[k]['x'], nodes[k + 1]['y'], nodes[k + 1]['x']) for k in pairs],
+         lambda result: np.asarray(result)),
+        ('haversine_distance', len(pairs), lambda: [h.haversine_distance(lat_list[k], lon_list[k], lat_list[k + 1], lon_list[k + 1]) for k in pairs],
+         lambda result: np.asarray(result)),
+        ('euclidean_distance', len(pairs), lambda: [h.euclidean_distance(k, k + 1, graph) for k in pairs], lambda result: np.asarray(result)),
+        ('haversine_array', len(pairs), lambda: h.haversine_array(lat_rad[:-1], lon_rad[:-1], cos_lat[:-1], lat_rad[1:], lon_rad[1:], cos_lat[1:]),
+         lambda result: result),
+        ('haversine_many', anchors * points, lambda: [h.haversine_many(lat_list[k], lon_list[k], lat, lon) for k in range(anchors)],
+         lambda result: result[0][:sample]),
+        ('haversine_matrix', anchors * points, lambda: h.haversine_matrix(lat[:anchors], lon[:anchors], lat, lon), lambda result: result[0, :sample]),
+    )
+    results = []
+    for name, distances, run, check in kernels:
+        t = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - t
+        expected = reference_row if name in ('haversine_many', 'haversine_matrix') else reference
+        results.append({'kernel': name, 'distances': distances, 'time': elapsed, 'throughput': distances / elapsed,
+                        'max_error': float(np.max(np.abs(check(result) - expected)))})
+    for row in results: # euclidean_distance è confrontata con la versione precedente che leggeva le coordinate dai nodi del grafo
+        reference = results[1] if row['kernel'] == 'euclidean_distance' else results[0]
+        row['speedup'] = row['throughput'] / reference['throughput']
+    return results
+
+def random_pairs(graph, count, seed = 0):
+    """
+    Genera coppie origine/destinazione casuali e riproducibili.
+
+    Args:
+        graph (networkx.Graph): Il grafo da cui scegliere i nodi.
+        count (int): Il numero di coppie.
+        seed (int, optional): Il seme del generatore casuale. Default è 0.
+
+    Returns:
+        list: Una lista di coppie (origine, destinazione).
+    """
+    rng = random.Random(seed)
+    nodes = sorted(graph.nodes)
+    return [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+def path_cost(graph, solution):
+    """
+    Calcola il costo di un percorso con la stessa metrica usata dalla ricerca.
+
+    Args:
+        graph (networkx.Graph): Il grafo che contiene il percorso.
+        solution (list): Il percorso come lista di coppie di nodi.
+
+    Returns:
+        float: Il costo del percorso.
+    """
+    problem = PathFinding(graph, None, None)
+    cost = 0
+    for u, v in solution:
+        cost += next(c for action, s, c, t in problem.getSuccessors(u) if s == v)
+    return cost
+
+def compare_astar(graph, pairs, heuristic = h.euclidean_distance):
+    """
+    Confronta AStar con LegacyAStar sulle stesse coppie origine/destinazione.
+
+    Args:
+        graph (networkx.Graph): Il grafo su cui eseguire le ricerche.
+        pairs (list): Le coppie (origine, destinazione).
+        heuristic (function, optional): L'euristica da utilizzare. Default è la distanza haversine.
+
+    Returns:
+        list: Per ogni coppia, un dizionario con nodi espansi, costo e tempo delle due versioni.
+    """
+    results = []
+    for start, goal in pairs:
+        row = {'start': start, 'goal': goal}
+        for name, algorithm in (('legacy', LegacyAStar(graph, heuristic)), ('astar', AStar(graph, heuristic))):
+            t = time.perf_counter()
+            solution = algorithm.solve(PathFinding(graph, start, goal))
+            row[f'{name}_time'] = time.perf_counter() - t
+            row[f'{name}_expanded'] = algorithm.expanded
+            row[f'{name}_cost'] = path_cost(graph, solution) if solution is not None else None
+        results.append(row)
+    return results
+
+def summarize_astar(results):
+    """
+    Riassume i risultati di `compare_astar`.
+
+    Args:
+        results (list): I risultati di `compare_astar`.
+
+    Returns:
+        dict: Nodi espansi e costo totali delle due versioni, e numero di coppie in cui il percorso precedente era più costoso.
+    """
+    solved = [row for row in results if row['astar_cost'] is not None]
+    return {
+        'pairs': len(results),
+        'legacy_expanded': sum(row['legacy_expanded'] for row in solved),
+        'astar_expanded': sum(row['astar_expanded'] for row in solved),
+        'legacy_cost': sum(row['legacy_cost'] for row in solved),
+        'astar_cost': sum(row['astar_cost'] for row in solved),
+        'suboptimal_legacy': sum(row['legacy_cost'] > row['astar_cost'] + 1e-9 for row in solved)
+    }
+
+def measure_startup(place, runs = 3, store = 'graph_store', seed = 0):
+    """
+    Misura il tempo di avvio di evopt in processi nuovi, su un grafo già presente nell'archivio.
+
+    Args:
+        place (str): La località, già presente nell'archivio.
+        runs (int, optional): Il numero di esecuzioni di cui prendere la mediana. Default è 3.
+        store (str, optional): La cartella dell'archivio dei grafi. Default è 'graph_store'.
+        seed (int, optional): Il seme per la scelta dei nodi di partenza e di arrivo. Default è 0.
+
+    Returns:
+        dict: La mediana dei tempi di importazione e di calcolo del percorso in secondi, e le librerie pesanti importate all'avvio.
+
+    Raises:
+        ValueError: Se la località non è nell'archivio.
+    """
+    graph = GraphStore(store).load_graph(place)
+    if graph is None:
+        raise ValueError(f"{place} non è nell'archivio dei grafi")
+    start, end = random_pairs(graph, 1, seed)[0]
+    start, end = (f"{graph.nodes[node]['y']},{graph.nodes[node]['x']}" for node in (start, end))
+    probe = f"import sys, json, evopt; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    import_times, route_times = [], []
+    for _ in range(runs):
+        t = time.perf_counter()
+        heavy = json.loads(subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout)
+        import_times.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'evopt', 'route', '--place', place, '--start', start, '--end', end, '--store', store, '--json'],
+                       capture_output=True, text=True, check=True)
+        route_times.append(time.perf_counter() - t)
+    return {'import_time': statistics.median(import_times), 'route_time': statistics.median(route_times), 'heavy_modules': heavy}
+
+def parse_maxspeed(value):
+    """
+    Converte il tag OSM `maxspeed` in km/h.
+
+    Args:
+        value (str): Il valore del tag, ad esempio "50", "30 mph" o "50;70".
+
+    Returns:
+        float: La velocità in km/h, o None se il valore non è numerico (ad esempio "IT:urban").
+    """
+    match = re.match(r'\s*(\d+(?:\.\d+)?)\s*(mph)?', value or '')
+    if match is None:
+        return None
+    return float(match.group(1)) * (1.609344 if match.group(2) else 1)
+
+def graph_from_overpass(path):
+    """
+    Costruisce il grafo stradale da una risposta Overpass salvata nella cache di osmnx, senza rete e senza osmnx.
+
+    Il grafo ha gli stessi attributi di quello di `graph_store.build_osm_graph` (coordinate dei nodi, lunghezza in metri, velocità in km/h,
+    tempo di percorrenza in secondi e nome degli archi), ma non è semplificato: ogni nodo OSM delle strade resta un nodo del grafo.
+    Le velocità mancanti sono la media dei limiti delle strade dello stesso tipo, come in osmnx, o HIGHWAY_SPEEDS. Viene mantenuta
+    solo la componente connessa più grande.
+
+    Args:
+        path (str): Il file JSON della risposta Overpass.
+
+    Returns:
+        networkx.Graph: Il grafo non diretto, o None se il file non è una risposta Overpass.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or 'elements' not in data:
+        return None
+    coordinates = {e['id']: (e['lat'], e['lon']) for e in data['elements'] if e['type'] == 'node'}
+    ways = [e for e in data['elements'] if e['type'] == 'way' and 'highway' in e.get('tags', {})]
+    speeds = {} # Limiti di velocità per tipo di strada
+    for way in ways:
+        speed = parse_maxspeed(way['tags'].get('maxspeed'))
+        if speed is not None:
+            speeds.setdefault(way['tags']['highway'], []).append(speed)
+    default_speed = statistics.mean(s for values in speeds.values() for s in values) if speeds else 50
+    graph = nx.Graph()
+    for way in ways:
+        tags = way['tags']
+        highway = tags['highway'].replace('_link', '')
+        speed = parse_maxspeed(tags.get('maxspeed'))
+        if speed is None:
+            speed = statistics.mean(speeds[tags['highway']]) if tags['highway'] in speeds else HIGHWAY_SPEEDS.get(highway, default_speed)
+        for u, v in zip(way['nodes'][:-1], way['nodes'][1:]):
+            if u == v or u not in coordinates or v not in coordinates:
+                continue
+            length = h.haversine_distance(*coordinates[u], *coordinates[v]) * 1000
+            travel_time = length / (speed / 3.6)
+            if graph.has_edge(u, v) and graph[u][v]['travel_time'] <= travel_time: # Tra gli archi paralleli mantiene il più veloce
+                continue
+            graph.add_edge(u, v, length=length, speed_kph=speed, travel_time=travel_time, name=tags.get('name'))
+    for node in graph.nodes:
+        graph.nodes[node]['y'], graph.nodes[node]['x'] = coordinates[node]
+    if len(graph) == 0:
+        return graph
+    return graph.subgraph(max(nx.connected_components(graph), key=len)).copy()
+
+def load_cached_graphs(cache = 'cache', names = None):
+    """
+    Carica i grafi di tutte le risposte Overpass nella cache di osmnx.
+
+    Args:
+        cache (str, optional): La cartella della cache. Default è 'cache'.
+        names (list, optional): I nomi dei grafi da caricare, i primi 8 caratteri del nome del file. Default sono tutti.
+
+    Returns:
+        dict: Per ogni nome, il grafo, in ordine di nome.
+    """
+    graphs = {}
+    for path in sorted(glob.glob(os.path.join(cache, '*.json'))):
+        name = os.path.basename(path)[:8]
+        if names is not None and name not in names:
+            continue
+        graph = graph_from_overpass(path)
+        if graph is not None and len(graph) > 1:
+            graphs[name] = graph
+    return graphs
+
+def workload_pairs(graph, count, seed = 0, workloads = WORKLOADS):
+    """
+    Genera coppie origine/destinazione riproducibili per ogni fascia di distanza.
+
+    Args:
+        graph (networkx.Graph): Il grafo da cui scegliere i nodi.
+        count (int): Il numero di coppie per fascia.
+        seed (int, optional): Il seme del generatore casuale. Default è 0.
+        workloads (dict, optional): Le fasce di distanza in linea d'aria in km. Default è WORKLOADS.
+
+    Returns:
+        dict: Per ogni fascia, la lista delle coppie; le fasce senza coppie nel grafo, ad esempio troppo lunghe, restano vuote o incomplete.
+    """
+    rng = random.Random(seed)
+    nodes = sorted(graph.nodes)
+    pairs = {name: [] for name in workloads}
+    for _ in range(count * len(workloads) * 200): # Limite ai tentativi, per le fasce che il grafo non può riempire
+        if all(len(bucket) >= count for bucket in pairs.values()):
+            break
+        start, goal = rng.sample(nodes, 2)
+        distance = h.euclidean_distance(start, goal, graph)
+        for name, (low, high) in workloads.items():
+            if low <= distance < high and len(pairs[name]) < count:
+                pairs[name].append((start, goal))
+    return pairs
+
+def measure(queries, run):
+    """
+    Esegue delle richieste misurando latenza, nodi espansi e picco di memoria.
+
+    La latenza è misurata in un primo passaggio senza tracemalloc, che rallenta l'allocazione; il picco di memoria in un secondo passaggio.
+
+    Args:
+        queries (list): Le richieste.
+        run (function): La funzione che esegue una richiesta e restituisce i nodi espansi, o None se la richiesta non ha soluzione.
+
+    Returns:
+        dict: Numero di richieste e di fallimenti, latenza (media e percentili 50, 90 e 99) in secondi, nodi espansi medi e picco di memoria massimo in KiB.
+    """
+    latencies, expanded, failures = [], [], 0
+    for query in queries:
+        t = time.perf_counter()
+        result = run(query)
+        latencies.append(time.perf_counter() - t)
+        if result is None:
+            failures += 1
+        else:
+            expanded.append(result)
+    peak = 0
+    tracemalloc.start()
+    try:
+        for query in queries:
+            tracemalloc.reset_peak()
+            run(query)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    if not latencies:
+        return {'queries': 0, 'failures': 0}
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {'queries': len(queries), 'failures': failures, 'mean': statistics.mean(latencies), 'p50': percentiles[49], 'p90': percentiles[89],
+            'p99': percentiles[98], 'expanded': statistics.mean(expanded) if expanded else None, 'peak_memory_kb': peak / 1024}
+
+def run_suite(graphs, pairs = 10, seed = 0, heuristics = DEFAULT_HEURISTICS, vehicle = "Fiat 500e", temperature = 20):
+    """
+    Esegue il benchmark `suite` sui grafi dati.
+
+    Args:
+        graphs (dict): I grafi per nome, come restituiti da `load_cached_graphs`.
+        pairs (int, optional): Il numero di coppie per fascia di distanza. Default è 10.
+        seed (int, optional): Il seme delle stazioni di ricarica e delle coppie. Default è 0.
+        heuristics (list, optional): I nomi delle euristiche di HEURISTICS da confrontare con AStar. Default è DEFAULT_HEURISTICS.
+        vehicle (str, optional): Il modello del veicolo dei viaggi completi. Default è "Fiat 500e".
+        temperature (float, optional): La temperatura ambiente dei viaggi completi. Default è 20.
+
+    Returns:
+        list: Una riga per grafo, algoritmo e carico di lavoro, con i campi di `measure`.
+    """
+    results = []
+    for name, graph in graphs.items():
+        place_charging_stations(graph, int(len(graph) * 0.1), seed) # Stesse stazioni a ogni esecuzione
+        compile_graph(graph) # Compilazione e registro delle stazioni fuori dalle misure
+        station_registry(graph)
+        for workload, queries in workload_pairs(graph, pairs, seed).items():
+            for heuristic in heuristics:
+                def run_astar(query, algorithm = AStar(graph, HEURISTICS[heuristic])):
+                    solution = algorithm.solve(PathFinding(graph, *query))
+                    return algorithm.expanded if solution is not None else None
+                results.append({'graph': name, 'algorithm': f'astar_{heuristic}', 'workload': workload, **measure(queries, run_astar)})
+            for level, fraction in BATTERY_LEVELS.items():
+                def run_trip(query):
+                    electric_vehicle = make_vehicle(vehicle, 20)
+                    electric_vehicle.leg_cache = LegCache(0) # Misura le ricerche, non la cache dei tratti
+                    electric_vehicle.battery = electric_vehicle.battery_capacity * fraction
+                    electric_vehicle.trace = SearchTrace()
+                    try:
+                        electric_vehicle.adaptive_search(graph, *query, temperature)
+                    except Exception: # Nessuna stazione raggiungibile
+                        return None
+                    return electric_vehicle.trace.summary().get('expanded', 0)
+                results.append({'graph': name, 'algorithm': 'adaptive_search', 'workload': f'{workload}_{level}', **measure(queries, run_trip)})
+    return results
+
+def compare_baseline(results, baseline, tolerance = 0.5, latency = None):
+    """
+    Confronta i risultati con un riferimento precedente.
+
+    I nodi espansi, deterministici, non possono aumentare. Le latenze vengono confrontate solo se richiesto: con 'relative' la latenza
+    mediana di ogni riga viene divisa per la latenza mediana media di REFERENCE_ALGORITHM sullo stesso grafo, sia nei risultati sia nel
+    riferimento, così il confronto non dipende dalla velocità della macchina; i grafi senza righe di riferimento vengono saltati.
+
+    Args:
+        results (list): I risultati di `run_suite`.
+        baseline (list): I risultati di riferimento.
+        tolerance (float, optional): Il peggioramento relativo ammesso della latenza mediana. Default è 0.5.
+        latency (str, optional): None per non confrontare le latenze, 'relative' o 'absolute'. Default è None.
+
+    Returns:
+        list: I peggioramenti, come testo, uno per riga e campo.
+
+    Raises:
+        ValueError: Se `latency` non è None, 'relative' o 'absolute'.
+    """
+    if latency not in (None, 'relative', 'absolute'):
+        raise ValueError(f"Confronto delle latenze non valido: {latency}")
+    reference = {(row['graph'], row['algorithm'], row['workload']): row for row in baseline}
+    scales, old_scales = _latency_scales(results), _latency_scales(baseline)
+    regressions = []
+    for row in results:
+        old = reference.get((row['graph'], row['algorithm'], row['workload']))
+        if old is None or not row['queries'] or not old['queries']:
+            continue
+        label = f"{row['graph']} {row['algorithm']} {row['workload']}"
+        if latency == 'absolute' and row['p50'] > old['p50'] * (1 + tolerance):
+            regressions.append(f"{label}: p50 {old['p50']:.4f} -> {row['p50']:.4f} s")
+        elif latency == 'relative' and row['graph'] in scales and row['graph'] in old_scales:
+            ratio, old_ratio = row['p50'] / scales[row['graph']], old['p50'] / old_scales[row['graph']]
+            if ratio > old_ratio * (1 + tolerance):
+                regressions.append(f"{label}: p50 relativa a {REFERENCE_ALGORITHM} {old_ratio:.2f} -> {ratio:.2f}")
+        if row['expanded'] is not None and old['expanded'] is not None and row['expanded'] > old['expanded'] + 1e-9:
+            regressions.append(f"{label}: nodi espansi {old['expanded']:.1f} -> {row['expanded']:.1f}")
+    return regressions
+
+def _latency_scales(rows):
+    """
+    Restituisce per ogni grafo la latenza mediana media di REFERENCE_ALGORITHM, usata per normalizzare le latenze.
+    """
+    latencies = {}
+    for row in rows:
+        if row['algorithm'] == REFERENCE_ALGORITHM and row['queries'] and row['p50'] > 0:
+            latencies.setdefault(row['graph'], []).append(row['p50'])
+    return {graph: statistics.mean(values) for graph, values in latencies.items()}
+
+def main(argv = None):
+    """
+    Esegue i benchmark da riga di comando.
+
+    Args:
+        argv (list, optional): Gli argomenti da riga di comando. Default sono quelli del processo.
+
+    Returns:
+        int: Il codice di uscita, 1 se un budget viene superato o se `suite` peggiora rispetto al riferimento.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark degli algoritmi di ricerca di EVOPT-Maps")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    astar_parser = subparsers.add_parser('astar', help="Confronta l'A* attuale con quello precedente")
+    astar_parser.add_argument('--place', required=True, help="La città, letta dall'archivio dei grafi o scaricata")
+    astar_parser.add_argument('--pairs', type=int, default=50, help="Il numero di coppie origine/destinazione")
+    astar_parser.add_argument('--seed', type=int, default=0, help="Il seme delle coppie origine/destinazione")
+    astar_parser.add_argument('--output', help="File JSON in cui salvare i risultati per coppia")
+    startup_parser = subparsers.add_parser('startup', help="Misura il tempo di avvio di `python -m evopt route`")
+    startup_parser.add_argument('--place', required=True, help="La città, già presente nell'archivio dei grafi")
+    startup_parser.add_argument('--runs', type=int, default=3, help="Il numero di esecuzioni")
+    startup_parser.add_argument('--store', default='graph_store', help="La cartella dell'archivio dei grafi")
+    startup_parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET, help="Il tempo massimo di importazione in secondi")
+    startup_parser.add_argument('--route-budget', type=float, default=ROUTE_BUDGET, help="Il tempo massimo del calcolo del percorso in secondi")
+    suite_parser = subparsers.add_parser('suite', help="Latenza, nodi espansi e memoria sui grafi della cache, senza rete")
+    suite_parser.add_argument('--cache', default='cache', help="La cartella della cache di osmnx")
+    suite_parser.add_argument('--graphs', nargs='+', help="I grafi da usare, i primi 8 caratteri del file della cache, default tutti")
+    suite_parser.add_argument('--pairs', type=int, default=10, help="Il numero di coppie per fascia di distanza")
+    suite_parser.add_argument('--seed', type=int, default=0, help="Il seme delle stazioni di ricarica e delle coppie")
+    suite_parser.add_argument('--heuristics', nargs='+', default=list(DEFAULT_HEURISTICS), choices=list(HEURISTICS), help="Le euristiche di AStar")
+    suite_parser.add_argument('--baseline', help="File JSON di riferimento con cui confrontare i risultati")
+    suite_parser.add_argument('--save-baseline', help="File JSON in cui salvare i risultati come riferimento")
+    suite_parser.add_argument('--latency', choices=['relative', 'absolute'],
+                              help=f"Confronta anche le latenze mediane: normalizzate con {REFERENCE_ALGORITHM} o in secondi. Default solo i nodi espansi")
+    suite_parser.add_argument('--tolerance', type=float, default=0.5, help="Il peggioramento relativo ammesso della latenza mediana")
+    haversine_parser = subparsers.add_parser('haversine', help="Distanze al secondo dei nuclei haversine rispetto alla versione precedente")
+    haversine_parser.add_argument('--points', type=int, default=100000, help="Il numero di punti casuali")
+    haversine_parser.add_argument('--anchors', type=int, default=100, help="Il numero di punti confrontati con tutti dalle versioni vettoriali")
+    haversine_parser.add_argument('--seed', type=int, default=0, help="Il seme dei punti casuali")
+    args = parser.parse_args(argv)
+
+    if args.command == 'astar':
+        graph = load_osm_graph(args.place)
+        results = compare_astar(graph, random_pairs(graph, args.pairs, args.seed))
+        print(json.dumps(summarize_astar(results), indent=2))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+    elif args.command == 'startup':
+        result = measure_startup(args.place, args.runs, args.store)
+        print(json.dumps(result, indent=2))
+        if result['import_time'] > args.import_budget or result['route_time'] > args.route_budget or result['heavy_modules']:
+            print("Budget di avvio superato", file=sys.stderr)
+            return 1
+    elif args.command == 'suite':
+        graphs = load_cached_graphs(args.cache, args.graphs)
+        if not graphs:
+            print(f"Nessuna risposta Overpass in {args.cache}", file=sys.stderr)
+            return 1
+        results = run_suite(graphs, args.pairs, args.seed, args.heuristics)
+        for row in results:
+            if row['queries']:
+                print("{graph} {algorithm:<34} {workload:<12} p50 {p50:.4f} s  p90 {p90:.4f} s  p99 {p99:.4f} s  espansi {expanded}  memoria {peak_memory_kb:.0f} KiB  falliti {failures}".format(
+                    **{**row, 'expanded': 'n/d' if row['expanded'] is None else f"{row['expanded']:.0f}"}))
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_baseline(results, json.load(f), args.tolerance, args.latency)
+            for regression in regressions:
+                print(regression, file=sys.stderr)
+            if regressions:
+                return 1
+    elif args.command == 'haversine':
+        for row in compare_haversine(args.points, args.anchors, args.seed):
+            print("{kernel:<20} {distances:>10} distanze  {time:.4f} s  {throughput:>14,.0f} distanze/s  x{speedup:.1f}  errore massimo {max_error:.1e} km".format(**row))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
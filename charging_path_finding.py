@@ -0,0 +1,189 @@
+from heapq import heappush, heappop
+from compiled_graph import compile_graph
+from charging_stations import station_registry
+from heuristics import default_goal_tables
+from search_problem import SearchProblem
+"""
+Modulo charging_path_finding.py
+
+Questo modulo contiene la classe ChargingPathFinding, un problema di ricerca del percorso che tiene conto dello stato di carica della batteria.
+
+Lo stato è una coppia (indice del nodo, energia nella batteria in kWh); l'energia non viene discretizzata, così la dominanza tra stati dello
+stesso nodo confronta la carica effettiva e non scarta un percorso con più carica a favore di uno più veloce. Oltre l'energia necessaria
+a completare il viaggio lungo il percorso più veloce verso l'obiettivo la carica in più non serve, per cui la dominanza la limita a questo
+valore (`useful_battery`). Per limitare il numero di stati, ogni nodo viene espanso al più `max_labels` volte (vedi `ChargingAStar`).
+Le azioni sono di due tipi:
+
+- percorrere un arco, possibile solo se l'energia rimanente non scende sotto il livello minimo;
+- ricaricare in una stazione disponibile fino a uno dei livelli discreti della batteria (multipli di `battery_capacity / levels`).
+
+Il costo di ogni azione è il tempo in secondi: il tempo di percorrenza degli archi, e per le ricariche il tempo fisso della sosta più il tempo
+di ricarica alla potenza della stazione.
+Risolto con `ChargingAStar`, il problema restituisce in una sola ricerca il percorso completo con le soste di ricarica, senza ripetere
+la ricerca dopo ogni ricarica come `ElectricVehicle.adaptive_search`.
+
+Esempio di utilizzo:
+
+```python
+from ASTAR import ChargingAStar
+from charging_path_finding import ChargingPathFinding
+
+problem = ChargingPathFinding(G, start, goal, battery = 60, ambient_temperature = 20)
+solution = ChargingAStar().solve(problem) # Azioni (u, v) e ('charge', stazione, kWh)
+```
+"""
+
+CHARGE = 'charge' # Primo elemento delle azioni di ricarica
+
+class ChargingPathFinding(SearchProblem):
+    """
+    Problema di ricerca del percorso con vincoli sullo stato di carica e azioni di ricarica.
+
+    Le azioni di guida sono coppie `(u, v)` di ID dei nodi, come in PathFinding; le azioni di ricarica sono terne `('charge', stazione, kWh)`.
+
+    Args:
+        graph (networkx.Graph): Il grafo su cui eseguire la ricerca, con le stazioni di ricarica.
+        init (int): L'ID del nodo iniziale.
+        goal (int): L'ID del nodo obiettivo.
+        battery (float): L'energia nella batteria alla partenza in kWh.
+        battery_capacity (float, optional): La capacità della batteria in kWh. Default è 100.
+        min_battery (float, optional): Il livello minimo di batteria da mantenere in kWh. Default è 20.
+        electric_constant (float, optional): La costante elettrica del veicolo. Default è 0.06.
+        ambient_temperature (float, optional): La temperatura ambiente. Default è 20.
+        levels (int, optional): Il numero di livelli discreti della batteria a cui è possibile ricaricare. Default è 20.
+        charging_power (float, optional): La potenza delle stazioni di ricarica in kW. Default è 22.
+        stop_time (float, optional): Il tempo fisso di ogni sosta di ricarica in secondi, che evita soste brevi e frequenti. Default è 300.
+        stations (list, optional): Gli ID delle stazioni utilizzabili. Default sono le stazioni disponibili nel registro del grafo.
+        max_labels (int, optional): Il numero massimo di espansioni di ogni nodo, con energie diverse. Default è `5 * (levels + 1)`,
+            che sui grafi del benchmark non viene mai raggiunto.
+    """
+    def __init__(self, graph, init, goal, battery, battery_capacity = 100, min_battery = 20, electric_constant = 0.06, ambient_temperature = 20,
+                 levels = 20, charging_power = 22, stop_time = 300, stations = None, max_labels = None):
+        compiled = compile_graph(graph)
+        super().__init__((compiled.index[init], battery), compiled.index[goal], graph)
+        self.compiled_graph = compiled
+        self.battery_capacity = battery_capacity
+        self.min_battery = min_battery
+        self.levels = levels
+        self.step = battery_capacity / levels # Energia tra due livelli di ricarica
+        self.charging_power = charging_power
+        self.stop_time = stop_time
+        self.max_labels = max_labels if max_labels is not None else 5 * (levels + 1)
+        self.offsets, self.targets, self.travel_time = compiled.as_lists('travel_time')
+        self.energy = (compiled.weights('energy') * electric_constant / ambient_temperature).tolist() # Energia consumata da ogni arco in kWh
+        if stations is None:
+            registry = station_registry(graph)
+            self.stations = set(registry.indices[registry.available].tolist())
+        else:
+            self.stations = {compiled.index[station] for station in stations}
+        reverse_energy = [e * electric_constant / ambient_temperature for e in compiled.reverse_lists('energy')[2]]
+        self.fastest_time, self.fastest_energy = _fastest_to_goal(compiled, self.goal, reverse_energy)
+        _, goal_costs = default_goal_tables().table(graph, goal, 'energy')
+        self.min_energy = (goal_costs * electric_constant / ambient_temperature).tolist() # Energia minima verso l'obiettivo in kWh
+
+    def getSuccessors(self, state):
+        """
+        Restituisce i successori di uno stato.
+
+        Args:
+            state (tuple): La coppia (indice del nodo, energia nella batteria).
+
+        Returns:
+            list: Una lista di tuple (azione, successore, costo, tempo), con costo e tempo in secondi.
+        """
+        u, battery = state
+        node_list = self.compiled_graph.node_list
+        successors = []
+        for e in range(self.offsets[u], self.offsets[u + 1]): # Archi uscenti percorribili con la batteria rimanente
+            remaining = battery - self.energy[e]
+            if remaining >= self.min_battery:
+                v = self.targets[e]
+                time = self.travel_time[e]
+                successors.append(((node_list[u], node_list[v]), (v, remaining), time, time))
+        if u in self.stations: # Ricarica fino a ciascuno dei livelli superiori all'energia attuale
+            for level in range(int(battery / self.step) + 1, self.levels + 1):
+                charged = level * self.step - battery
+                time = self.stop_time + charged / self.charging_power * 3600
+                successors.append(((CHARGE, node_list[u], charged), (u, level * self.step), time, time))
+        return successors
+
+    def isGoal(self, state):
+        """
+        Verifica se uno stato è l'obiettivo, con qualsiasi livello di batteria.
+
+        Args:
+            state (tuple): La coppia (indice del nodo, energia nella batteria).
+
+        Returns:
+            bool: True se il nodo dello stato è l'obiettivo, altrimenti False.
+        """
+        return state[0] == self.goal
+
+    def heuristic(self, state):
+        """
+        Restituisce il tempo minimo per raggiungere l'obiettivo, comprese le ricariche necessarie.
+
+        È il tempo di percorrenza esatto del percorso più veloce, calcolato con una ricerca di Dijkstra all'indietro dall'obiettivo, più,
+        se l'energia nella batteria è minore di `min_battery` più l'energia minima verso l'obiettivo, una sosta e il tempo per ricaricare
+        l'energia mancante. Ogni percorso deve ricaricare almeno questa energia, e guidare o ricaricare non riduce l'euristica più del costo
+        dell'azione, quindi è ammissibile e consistente.
+
+        Args:
+            state (tuple): La coppia (indice del nodo, energia nella batteria).
+
+        Returns:
+            float: Il tempo minimo in secondi, infinito se l'obiettivo non è raggiungibile.
+        """
+        u, battery = state
+        missing = self.min_battery + self.min_energy[u] - battery # Energia da ricaricare prima di arrivare
+        if missing > 0:
+            return self.fastest_time[u] + self.stop_time + missing / self.charging_power * 3600
+        return self.fastest_time[u]
+
+    def useful_battery(self, state):
+        """
+        Restituisce l'energia di uno stato usata da ChargingAStar per la dominanza tra stati dello stesso nodo.
+
+        Con almeno `min_battery` più l'energia del percorso più veloce verso l'obiettivo, lo stato completa il viaggio nel tempo minimo
+        senza ricariche: più carica non può migliorare il percorso, per cui l'energia viene limitata a questo valore.
+
+        Args:
+            state (tuple): La coppia (indice del nodo, energia nella batteria).
+
+        Returns:
+            float: L'energia nella batteria in kWh, al più quella sufficiente a raggiungere l'obiettivo lungo il percorso più veloce.
+        """
+        u, battery = state
+        return min(battery, self.min_battery + self.fastest_energy[u])
+
+def _fastest_to_goal(compiled_graph, goal, reverse_energy):
+    """
+    Calcola con una ricerca di Dijkstra all'indietro il tempo minimo da ogni indice all'obiettivo e l'energia consumata lungo quel percorso.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato.
+        goal (int): L'indice dell'obiettivo.
+        reverse_energy (list): L'energia in kWh di ogni arco, nell'ordine di `CompiledGraph.reverse_lists`.
+
+    Returns:
+        tuple: Le liste dei tempi in secondi (infinito se l'obiettivo non è raggiungibile) e delle energie in kWh, per indice.
+    """
+    offsets, sources, weights = compiled_graph.reverse_lists('travel_time')
+    times = [float('inf')] * len(compiled_graph.node_list)
+    energy = [float('inf')] * len(times)
+    settled = [False] * len(times)
+    times[goal], energy[goal] = 0.0, 0.0
+    frontier = [(0.0, goal)]
+    while frontier:
+        time, v = heappop(frontier)
+        if settled[v]: # Voce obsoleta
+            continue
+        settled[v] = True
+        for e in range(offsets[v], offsets[v + 1]):
+            u = sources[e]
+            new_time = time + weights[e]
+            if new_time < times[u]:
+                times[u] = new_time
+                energy[u] = energy[v] + reverse_energy[e]
+                heappush(frontier, (new_time, u))
+    return times, energy
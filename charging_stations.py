@@ -0,0 +1,222 @@
+import random
+import numpy as np
+from weakref import WeakKeyDictionary
+from compiled_graph import compile_graph
+from heuristics import haversine_array
+"""
+Modulo charging_stations.py
+
+Questo modulo fornisce la classe StationRegistry, un registro delle stazioni di ricarica di un grafo.
+
+Il registro contiene le coordinate di tutte le stazioni in array NumPy e una maschera delle stazioni disponibili, aggiornata quando una stazione
+viene rimossa dal servizio. In questo modo la scelta di una stazione non richiede di scorrere tutti i nodi del grafo: le distanze vengono calcolate
+in modo vettoriale sulle posizioni del registro.
+
+Le stazioni usate durante un viaggio sono invece tracciate in una StationAvailability, una maschera posseduta dalla singola richiesta,
+così il grafo e il registro non vengono modificati dalle ricerche e possono servire più richieste.
+
+Esempio di utilizzo:
+
+```python
+from charging_stations import place_charging_stations, station_registry
+from electric_vehicle import ElectricVehicle
+
+place_charging_stations(G, 100) # Imposta 100 nodi casuali come stazioni di ricarica
+registry = station_registry(G) # Registro delle stazioni del grafo (costruito una sola volta)
+availability = registry.availability() # Disponibilità delle stazioni per una richiesta
+station, path, energy, time = ElectricVehicle().nearest_charging_station(G, start, goal, None, 20, availability) # Scelta sulla rete stradale
+availability.disable(station) # La stazione non è più disponibile per questa richiesta
+```
+"""
+
+class StationRegistry:
+    """
+    Registro delle stazioni di ricarica di un grafo.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato che contiene le stazioni.
+        stations (list): Gli ID dei nodi che sono stazioni di ricarica.
+    """
+    def __init__(self, compiled_graph, stations):
+        self.compiled_graph = compiled_graph
+        self.stations = np.asarray(stations)
+        self.station_list = self.stations.tolist()
+        self.position = {station: k for k, station in enumerate(self.station_list)} # ID della stazione -> posizione nel registro
+        self.indices = np.array([compiled_graph.index[station] for station in self.station_list], dtype=np.int64) # Indici dei nodi nel grafo compilato
+        self.lat = compiled_graph.lat[self.indices]
+        self.lon = compiled_graph.lon[self.indices]
+        self.lat_rad = np.radians(self.lat)
+        self.lon_rad = np.radians(self.lon)
+        self.cos_lat = np.cos(self.lat_rad)
+        self.available = np.ones(len(self.station_list), dtype=bool) # Maschera delle stazioni disponibili
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Costruisce il registro a partire dall'attributo 'charging_station' dei nodi del grafo.
+
+        Args:
+            graph (networkx.Graph): Il grafo che contiene le stazioni.
+
+        Returns:
+            StationRegistry: Il registro delle stazioni.
+        """
+        stations = [node for node, is_station in graph.nodes(data='charging_station', default=False) if is_station]
+        return cls(compile_graph(graph), stations)
+
+    def __len__(self):
+        return len(self.station_list)
+
+    def __contains__(self, station):
+        return station in self.position and bool(self.available[self.position[station]])
+
+    def disable(self, station):
+        """
+        Segna una stazione come non disponibile per tutte le richieste, ad esempio perchè fuori servizio.
+
+        Per le stazioni usate durante un viaggio si usa invece `StationAvailability.disable`.
+
+        Args:
+            station (int): L'ID del nodo della stazione.
+        """
+        self.available[self.position[station]] = False
+
+    def enable(self, station):
+        """
+        Segna una stazione come di nuovo disponibile per tutte le richieste.
+
+        Args:
+            station (int): L'ID del nodo della stazione.
+        """
+        self.available[self.position[station]] = True
+
+    def available_stations(self):
+        """
+        Restituisce le stazioni disponibili.
+
+        Returns:
+            list: Gli ID dei nodi delle stazioni disponibili.
+        """
+        return self.stations[self.available].tolist()
+
+    def distances(self, node, positions = None):
+        """
+        Calcola la distanza haversine tra un nodo e le stazioni del registro.
+
+        Args:
+            node (int): L'ID del nodo.
+            positions (array, optional): Le posizioni nel registro delle stazioni da considerare. Default sono tutte le stazioni.
+
+        Returns:
+            numpy.ndarray: La distanza di ogni stazione dal nodo in chilometri.
+        """
+        i = self.compiled_graph.index[node]
+        lat_rad, lon_rad, cos_lat = self.compiled_graph.radians() # Radianti precalcolati dei nodi
+        positions = slice(None) if positions is None else positions
+        return haversine_array(lat_rad[i], lon_rad[i], cos_lat[i], self.lat_rad[positions], self.lon_rad[positions], self.cos_lat[positions])
+
+    def availability(self):
+        """
+        Crea una disponibilità delle stazioni per una singola richiesta, a partire dalle stazioni disponibili nel registro.
+
+        Returns:
+            StationAvailability: La disponibilità delle stazioni, modificabile senza toccare il registro o il grafo.
+        """
+        return StationAvailability(self)
+
+class StationAvailability:
+    """
+    Disponibilità delle stazioni di ricarica per una singola richiesta.
+
+    È una maschera di bit sulle posizioni del registro, copiata dalle stazioni disponibili nel registro e posseduta dalla richiesta:
+    le stazioni usate durante un viaggio vengono disabilitate solo qui, così lo stesso grafo e lo stesso registro possono servire
+    più richieste, anche contemporaneamente da thread o processi diversi.
+
+    Args:
+        registry (StationRegistry): Il registro delle stazioni del grafo.
+    """
+    def __init__(self, registry):
+        self.registry = registry
+        self.mask = registry.available.copy() # Maschera delle stazioni disponibili per la richiesta
+
+    def __len__(self):
+        return int(self.mask.sum())
+
+    def __contains__(self, station):
+        position = self.registry.position.get(station)
+        return position is not None and bool(self.mask[position])
+
+    def disable(self, station):
+        """
+        Segna una stazione come non disponibile per la richiesta.
+
+        Args:
+            station (int): L'ID del nodo della stazione.
+        """
+        self.mask[self.registry.position[station]] = False
+
+    def enable(self, station):
+        """
+        Segna una stazione come di nuovo disponibile per la richiesta.
+
+        Args:
+            station (int): L'ID del nodo della stazione.
+        """
+        self.mask[self.registry.position[station]] = True
+
+    def available_stations(self):
+        """
+        Restituisce le stazioni disponibili per la richiesta.
+
+        Returns:
+            list: Gli ID dei nodi delle stazioni disponibili.
+        """
+        return self.registry.stations[self.mask].tolist()
+
+    def used_stations(self):
+        """
+        Restituisce le stazioni disponibili nel registro ma disabilitate dalla richiesta.
+
+        Returns:
+            list: Gli ID dei nodi delle stazioni usate.
+        """
+        return self.registry.stations[self.registry.available & ~self.mask].tolist()
+
+_registries = WeakKeyDictionary() # Registri già costruiti, rilasciati insieme al grafo
+
+def station_registry(graph):
+    """
+    Restituisce il registro delle stazioni di ricarica di un grafo, costruendolo alla prima richiesta.
+
+    Le stazioni vanno impostate con `place_charging_stations`. Le stazioni usate durante un viaggio vanno disabilitate in una `StationAvailability`
+    della richiesta, non nel registro, che resta condiviso tra le richieste.
+
+    Args:
+        graph (networkx.Graph): Il grafo che contiene le stazioni.
+
+    Returns:
+        StationRegistry: Il registro delle stazioni.
+    """
+    registry = _registries.get(graph)
+    if registry is None:
+        registry = StationRegistry.from_graph(graph)
+        _registries[graph] = registry
+    return registry
+
+def place_charging_stations(graph, num_charging_stations, seed = None):
+    """
+    Imposta un numero di nodi casuali del grafo come stazioni di ricarica.
+
+    Args:
+        graph (networkx.Graph): Il grafo in cui aggiungere le stazioni.
+        num_charging_stations (int): Il numero di stazioni di ricarica da aggiungere.
+        seed (int, optional): Il seme del generatore casuale, per ottenere sempre le stesse stazioni. Default è None.
+
+    Returns:
+        list: Gli ID dei nodi impostati come stazioni di ricarica.
+    """
+    charging_stations = random.Random(seed).sample(list(graph.nodes), num_charging_stations)
+    for node in charging_stations:
+        graph.nodes[node]['charging_station'] = True
+    _registries.pop(graph, None) # Il registro verrà ricostruito con le nuove stazioni
+    return charging_stations
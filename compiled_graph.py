@@ -0,0 +1,315 @@
+import itertools
+import networkx as nx
+import numpy as np
+from weakref import WeakKeyDictionary
+from heuristics import haversine_radians
+"""
+Modulo compiled_graph.py
+
+Questo modulo fornisce la classe CompiledGraph, una rappresentazione compatta (CSR) di un grafo stradale NetworkX.
+
+Il grafo viene compilato una sola volta: ogni nodo riceve un indice intero e gli archi uscenti di ogni nodo sono memorizzati in modo contiguo
+negli array `targets`, delimitati dagli offset in `offsets`. Gli attributi degli archi (lunghezza, velocità, tempo di percorrenza e coefficiente
+energetico) e le coordinate dei nodi sono memorizzati in array NumPy, così gli algoritmi di ricerca possono lavorare solo su indici interi
+senza accedere ai dizionari di NetworkX.
+
+Esempio di utilizzo:
+
+```python
+from compiled_graph import compile_graph
+
+compiled = compile_graph(G) # Compila il grafo (una sola volta per grafo)
+i = compiled.index[node] # ID del nodo -> indice
+node = compiled.node_list[i] # indice -> ID del nodo
+```
+"""
+
+# Valori di default degli attributi degli archi, gli stessi usati da SearchProblem.getSuccessors
+DEFAULT_LENGTH = 100 # Distanza in metri
+DEFAULT_SPEED = 50 # Velocità in km/h
+DEFAULT_TRAVEL_TIME = 10 # Tempo di percorrenza in secondi
+
+_versions = itertools.count() # Numeri di versione dei grafi compilati
+
+class CompiledGraph:
+    """
+    Rappresentazione CSR di un grafo stradale.
+
+    Gli archi uscenti dal nodo di indice `i` occupano le posizioni da `offsets[i]` a `offsets[i + 1]` (esclusa) degli array degli archi.
+    Il coefficiente energetico di un arco è `(length / 1000) * speed_kph`, lo stesso costo usato da SearchProblem.getSuccessors:
+    l'energia consumata da un veicolo si ottiene moltiplicandolo per `electric_constant / temperatura`.
+
+    Args:
+        nodes (array): Gli ID dei nodi, nell'ordine degli indici.
+        offsets (array): Gli offset CSR, lunghi `len(nodes) + 1`.
+        targets (array): L'indice del nodo di arrivo di ogni arco.
+        length (array): La lunghezza di ogni arco in metri.
+        speed_kph (array): La velocità di ogni arco in km/h.
+        travel_time (array): Il tempo di percorrenza di ogni arco in secondi.
+        lat (array): La latitudine di ogni nodo.
+        lon (array): La longitudine di ogni nodo.
+        directed (bool, optional): Se True, il grafo di origine è diretto. Default è False.
+    """
+    def __init__(self, nodes, offsets, targets, length, speed_kph, travel_time, lat, lon, directed = False):
+        self.nodes = np.asarray(nodes)
+        self.node_list = self.nodes.tolist() # ID dei nodi come oggetti Python, per costruire le azioni
+        self.index = {node: i for i, node in enumerate(self.node_list)} # ID del nodo -> indice
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.length = np.asarray(length, dtype=np.float64)
+        self.speed_kph = np.asarray(speed_kph, dtype=np.float64)
+        self.travel_time = np.asarray(travel_time, dtype=np.float64)
+        self.energy = (self.length / 1000) * self.speed_kph # d(km) * v(km/h), senza costante elettrica e temperatura
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.directed = directed
+        self.version = next(_versions) # Diverso per ogni grafo compilato, identifica il grafo nelle cache (ad esempio leg_cache)
+        self._lists = {}
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Compila un grafo NetworkX nella rappresentazione CSR.
+
+        Per i multigrafi, tra archi paralleli viene mantenuto quello più corto.
+
+        Args:
+            graph (networkx.Graph): Il grafo da compilare, ad esempio quello restituito da `generate_osm_graph`.
+
+        Returns:
+            CompiledGraph: Il grafo compilato.
+        """
+        nodes = list(graph.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        offsets = [0]
+        targets, length, speed_kph, travel_time = [], [], [], []
+        for node in nodes:
+            for neighbor, edge_data in graph.adj[node].items():
+                if graph.is_multigraph(): # Tra gli archi paralleli sceglie il più corto
+                    edge_data = min(edge_data.values(), key=lambda data: data.get('length', DEFAULT_LENGTH))
+                targets.append(index[neighbor])
+                length.append(edge_data.get('length', DEFAULT_LENGTH))
+                speed_kph.append(edge_data.get('speed_kph', DEFAULT_SPEED))
+                travel_time.append(edge_data.get('travel_time', DEFAULT_TRAVEL_TIME))
+            offsets.append(len(targets))
+        lat = [graph.nodes[node]['y'] for node in nodes]
+        lon = [graph.nodes[node]['x'] for node in nodes]
+        return cls(nodes, offsets, targets, length, speed_kph, travel_time, lat, lon, graph.is_directed())
+
+    def to_graph(self):
+        """
+        Ricostruisce un grafo NetworkX a partire dagli array del grafo compilato.
+
+        Il grafo contiene solo gli attributi usati dalla ricerca (coordinate dei nodi, lunghezza, velocità e tempo di percorrenza degli archi)
+        e viene associato a questo grafo compilato, così `compile_graph` non deve ricompilarlo.
+
+        Returns:
+            networkx.Graph: Il grafo ricostruito, diretto se il grafo di origine era diretto.
+        """
+        graph = nx.DiGraph() if self.directed else nx.Graph()
+        node_list = self.node_list
+        graph.add_nodes_from((node, {'y': y, 'x': x}) for node, y, x in zip(node_list, self.lat.tolist(), self.lon.tolist()))
+        sources = np.repeat(np.arange(len(node_list)), np.diff(self.offsets)).tolist()
+        graph.add_edges_from(
+            (node_list[u], node_list[v], {'length': length, 'speed_kph': speed, 'travel_time': travel_time})
+            for u, v, length, speed, travel_time in zip(sources, self.targets.tolist(), self.length.tolist(), self.speed_kph.tolist(), self.travel_time.tolist())
+        )
+        _compiled_graphs[graph] = self
+        return graph
+
+    def __len__(self):
+        return len(self.node_list)
+
+    @property
+    def edge_count(self):
+        """
+        int: Il numero di archi nella rappresentazione CSR (ogni arco non diretto compare due volte).
+        """
+        return len(self.targets)
+
+    def weights(self, weight = 'energy'):
+        """
+        Restituisce l'array dei pesi degli archi per una metrica di costo.
+
+        Args:
+            weight (str, optional): Il nome della metrica: 'energy', 'travel_time' o 'length'. Default è 'energy'.
+
+        Returns:
+            numpy.ndarray: Il peso di ogni arco.
+
+        Raises:
+            ValueError: Se la metrica non esiste.
+        """
+        if weight not in ('energy', 'travel_time', 'length'):
+            raise ValueError(f"Metrica di costo sconosciuta: {weight}")
+        return getattr(self, weight)
+
+    def as_lists(self, weight = 'energy'):
+        """
+        Restituisce offset, archi e pesi come liste Python.
+
+        L'accesso a singoli elementi di una lista è molto più veloce che su un array NumPy, per cui gli algoritmi di ricerca
+        iterano su queste liste. Le liste vengono create una sola volta per metrica e riutilizzate.
+
+        Args:
+            weight (str, optional): La metrica di costo. Default è 'energy'.
+
+        Returns:
+            tuple: Le liste (offsets, targets, weights).
+        """
+        if weight not in self._lists:
+            if 'csr' not in self._lists:
+                self._lists['csr'] = (self.offsets.tolist(), self.targets.tolist())
+            offsets, targets = self._lists['csr']
+            self._lists[weight] = (offsets, targets, self.weights(weight).tolist())
+        return self._lists[weight]
+
+    def reverse_lists(self, weight = 'energy'):
+        """
+        Restituisce offset, archi e pesi del grafo inverso come liste Python, per le ricerche all'indietro da un obiettivo.
+
+        Gli archi del nodo di indice `i` nel grafo inverso sono gli archi entranti in `i`, con il nodo di partenza al posto di quello di arrivo.
+        Su un grafo non diretto il grafo inverso coincide con il grafo, per cui vengono restituite le liste di `as_lists`.
+
+        Args:
+            weight (str, optional): La metrica di costo. Default è 'energy'.
+
+        Returns:
+            tuple: Le liste (offsets, sources, weights).
+        """
+        if not self.directed:
+            return self.as_lists(weight)
+        key = f"reverse_{weight}"
+        if key not in self._lists:
+            n = len(self.node_list)
+            sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.offsets))
+            order = np.argsort(self.targets, kind='stable') # Archi raggruppati per nodo di arrivo
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=n), out=offsets[1:])
+            self._lists[key] = (offsets.tolist(), sources[order].tolist(), self.weights(weight)[order].tolist())
+        return self._lists[key]
+
+    def radians(self):
+        """
+        Restituisce latitudine, longitudine in radianti e coseno della latitudine di ogni nodo, come liste Python.
+
+        Returns:
+            tuple: Le liste (lat_rad, lon_rad, cos_lat).
+        """
+        if 'radians' not in self._lists:
+            lat_rad = np.radians(self.lat)
+            self._lists['radians'] = (lat_rad.tolist(), np.radians(self.lon).tolist(), np.cos(lat_rad).tolist())
+        return self._lists['radians']
+
+    def distance(self, i, j):
+        """
+        Calcola la distanza haversine tra due nodi.
+
+        Args:
+            i (int): L'indice del primo nodo.
+            j (int): L'indice del secondo nodo.
+
+        Returns:
+            float: La distanza tra i due nodi in chilometri.
+        """
+        lat_rad, lon_rad, cos_lat = self.radians()
+        return haversine_radians(lat_rad[i], lon_rad[i], cos_lat[i], lat_rad[j], lon_rad[j], cos_lat[j])
+
+    def edge_index(self, u, v):
+        """
+        Restituisce la posizione CSR dell'arco tra due nodi.
+
+        Args:
+            u (int): L'indice del nodo di partenza.
+            v (int): L'indice del nodo di arrivo.
+
+        Returns:
+            int: La posizione dell'arco negli array degli archi.
+
+        Raises:
+            KeyError: Se l'arco non esiste.
+        """
+        offsets, targets = self.as_lists()[:2]
+        for e in range(offsets[u], offsets[u + 1]):
+            if targets[e] == v:
+                return e
+        raise KeyError((self.node_list[u], self.node_list[v]))
+
+    def edge_indices(self, u, v):
+        """
+        Restituisce le posizioni CSR di molti archi alla volta, versione vettoriale di `edge_index`.
+
+        Gli archi sono cercati con una ricerca binaria sulle chiavi `u * numero di nodi + v` ordinate, calcolate una sola volta per grafo.
+
+        Args:
+            u (array): Gli indici dei nodi di partenza.
+            v (array): Gli indici dei nodi di arrivo.
+
+        Returns:
+            numpy.ndarray: La posizione di ogni arco negli array degli archi.
+
+        Raises:
+            KeyError: Se un arco non esiste.
+        """
+        if 'edge_keys' not in self._lists:
+            sources = np.repeat(np.arange(len(self.node_list), dtype=np.int64), np.diff(self.offsets))
+            keys = sources * len(self.node_list) + self.targets
+            order = np.argsort(keys, kind='stable')
+            self._lists['edge_keys'] = (keys[order], order)
+        sorted_keys, order = self._lists['edge_keys']
+        keys = np.asarray(u, dtype=np.int64) * len(self.node_list) + np.asarray(v, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        missing = sorted_keys[positions] != keys
+        if missing.any():
+            k = missing.nonzero()[0][0]
+            raise KeyError((self.node_list[int(np.ravel(u)[k])], self.node_list[int(np.ravel(v)[k])]))
+        return order[positions]
+
+    def actions(self, path):
+        """
+        Converte una sequenza di indici di nodi nella lista di azioni `(u, v)` con gli ID dei nodi.
+
+        Args:
+            path (list): Gli indici dei nodi del percorso, dal primo all'ultimo.
+
+        Returns:
+            list: La lista di azioni, nello stesso formato restituito da AStar.
+        """
+        node_list = self.node_list
+        return [(node_list[u], node_list[v]) for u, v in zip(path[:-1], path[1:])]
+
+def haversine_heuristic(node_a, node_b, compiled_graph):
+    """
+    Euristica haversine su indici di un grafo compilato.
+
+    È l'equivalente di `heuristics.euclidean_distance` per gli algoritmi che lavorano su indici interi.
+
+    Args:
+        node_a (int): L'indice del primo nodo.
+        node_b (int): L'indice del secondo nodo.
+        compiled_graph (CompiledGraph): Il grafo compilato.
+
+    Returns:
+        float: La distanza tra i due nodi in chilometri.
+    """
+    return compiled_graph.distance(node_a, node_b)
+
+_compiled_graphs = WeakKeyDictionary() # Grafi già compilati, rilasciati insieme al grafo NetworkX
+
+def compile_graph(graph):
+    """
+    Restituisce il grafo compilato associato a un grafo NetworkX, compilandolo alla prima richiesta.
+
+    Il grafo compilato è una fotografia della topologia e degli attributi degli archi: il grafo non deve essere modificato dopo la compilazione.
+
+    Args:
+        graph (networkx.Graph): Il grafo da compilare.
+
+    Returns:
+        CompiledGraph: Il grafo compilato.
+    """
+    compiled = _compiled_graphs.get(graph)
+    if compiled is None:
+        compiled = CompiledGraph.from_graph(graph)
+        _compiled_graphs[graph] = compiled
+    return compiled
@@ -0,0 +1,312 @@
+from heapq import heappush, heappop
+import numpy as np
+from search_algorithm import SearchAlgorithm
+"""
+Modulo contraction_hierarchies.py
+
+Questo modulo fornisce una preelaborazione Contraction Hierarchies (CH) di un grafo compilato e un algoritmo di ricerca che la utilizza.
+
+La preelaborazione contrae i nodi uno alla volta, in ordine di importanza crescente: quando un nodo viene contratto, per ogni coppia di suoi vicini
+il cui cammino minimo passa per il nodo viene aggiunta una scorciatoia (shortcut). Ogni nodo conserva solo gli archi verso nodi più importanti
+(grafo "verso l'alto"), per cui una ricerca tra due nodi esplora poche centinaia di nodi anche su una città intera.
+La preelaborazione richiede tempo, ma va fatta una sola volta per grafo e può essere salvata nell'archivio dei grafi insieme al grafo.
+
+Esempio di utilizzo:
+
+```python
+from contraction_hierarchies import ContractionHierarchy, ContractionHierarchiesSearch
+
+hierarchy = ContractionHierarchy.build(compile_graph(G)) # Preelaborazione (una sola volta)
+hierarchy.save(store, "Brescia") # Salva la preelaborazione insieme al grafo
+search = ContractionHierarchiesSearch(hierarchy)
+solution = search.solve(PathFinding(G, start, goal)) # Lista di azioni (u, v)
+```
+"""
+
+class ContractionHierarchy:
+    """
+    Preelaborazione Contraction Hierarchies di un grafo compilato non diretto.
+
+    Il grafo verso l'alto è memorizzato in formato CSR: gli archi del nodo di indice `i` verso nodi di rango maggiore occupano le posizioni da
+    `up_offsets[i]` a `up_offsets[i + 1]` (esclusa). Per ogni arco, `up_middle` contiene il nodo contratto che la scorciatoia sostituisce,
+    o -1 se l'arco è un arco originale del grafo.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato.
+        rank (array): Il rango (ordine di contrazione) di ogni nodo.
+        up_offsets (array): Gli offset CSR del grafo verso l'alto.
+        up_targets (array): L'indice del nodo di arrivo di ogni arco verso l'alto.
+        up_weights (array): Il peso di ogni arco verso l'alto.
+        up_middle (array): Il nodo intermedio di ogni scorciatoia, -1 per gli archi originali.
+        weight (str, optional): La metrica di costo della preelaborazione. Default è 'energy'.
+    """
+    def __init__(self, compiled_graph, rank, up_offsets, up_targets, up_weights, up_middle, weight = 'energy'):
+        self.compiled_graph = compiled_graph
+        self.weight = weight
+        self.rank = np.asarray(rank)
+        self.up_offsets = np.asarray(up_offsets)
+        self.up_targets = np.asarray(up_targets)
+        self.up_weights = np.asarray(up_weights)
+        self.up_middle = np.asarray(up_middle)
+        self._lists = (self.up_offsets.tolist(), self.up_targets.tolist(), self.up_weights.tolist(), self.up_middle.tolist())
+        self._rank = self.rank.tolist()
+
+    @classmethod
+    def build(cls, compiled_graph, weight = 'energy', settle_limit = 60):
+        """
+        Esegue la preelaborazione Contraction Hierarchies.
+
+        L'ordine di contrazione segue la differenza tra le scorciatoie che la contrazione di un nodo aggiungerebbe e gli archi che rimuoverebbe,
+        più il numero di vicini già contratti; le priorità vengono aggiornate in modo pigro. Le ricerche di testimoni (witness search), che verificano
+        se esiste un cammino alternativo a una scorciatoia, sono limitate a `settle_limit` nodi: un limite basso aggiunge qualche scorciatoia
+        superflua ma non compromette la correttezza.
+
+        Args:
+            compiled_graph (CompiledGraph): Il grafo compilato, non diretto.
+            weight (str, optional): La metrica di costo degli archi. Default è 'energy'.
+            settle_limit (int, optional): Il numero massimo di nodi esplorati da ogni ricerca di testimoni. Default è 60.
+
+        Returns:
+            ContractionHierarchy: La preelaborazione.
+
+        Raises:
+            ValueError: Se il grafo è diretto.
+        """
+        if compiled_graph.directed:
+            raise ValueError("Le Contraction Hierarchies sono supportate solo su grafi non diretti")
+        offsets, targets, weights = compiled_graph.as_lists(weight)
+        n = len(compiled_graph)
+        adjacency = [{} for _ in range(n)] # Vicini non ancora contratti: vicino -> (peso, nodo intermedio)
+        for u in range(n):
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                if v != u and (v not in adjacency[u] or weights[e] < adjacency[u][v][0]):
+                    adjacency[u][v] = (weights[e], -1)
+        deleted = [0] * n # Numero di vicini già contratti
+        rank = [0] * n
+        up_edges = [None] * n # Archi verso l'alto di ogni nodo, fissati al momento della contrazione
+
+        def priority(v):
+            return len(_shortcuts(adjacency, v, settle_limit)) - len(adjacency[v]) + deleted[v]
+
+        queue = [(priority(v), v) for v in range(n)]
+        queue.sort()
+        order = 0
+        while queue:
+            _, v = heappop(queue)
+            new_priority = priority(v)
+            if queue and new_priority > queue[0][0]: # Priorità aggiornata in modo pigro: il nodo non è più il meno importante
+                heappush(queue, (new_priority, v))
+                continue
+            rank[v] = order
+            order += 1
+            up_edges[v] = [(u, w, middle) for u, (w, middle) in adjacency[v].items()]
+            for u, x, cost in _shortcuts(adjacency, v, settle_limit): # Aggiunge le scorciatoie tra i vicini
+                if x not in adjacency[u] or cost < adjacency[u][x][0]:
+                    adjacency[u][x] = (cost, v)
+                    adjacency[x][u] = (cost, v)
+            for u in adjacency[v]: # Rimuove il nodo contratto dal grafo
+                del adjacency[u][v]
+                deleted[u] += 1
+            adjacency[v] = {}
+
+        up_offsets = [0]
+        up_targets, up_weights, up_middle = [], [], []
+        for v in range(n):
+            for u, w, middle in up_edges[v]:
+                up_targets.append(u)
+                up_weights.append(w)
+                up_middle.append(middle)
+            up_offsets.append(len(up_targets))
+        return cls(compiled_graph, np.array(rank, dtype=np.int64), np.array(up_offsets, dtype=np.int64), np.array(up_targets, dtype=np.int64),
+                   np.array(up_weights, dtype=np.float64), np.array(up_middle, dtype=np.int64), weight)
+
+    def save(self, store, place, network_type = 'drive'):
+        """
+        Salva la preelaborazione nell'archivio dei grafi, insieme al grafo della località.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+        """
+        arrays = {'rank': self.rank, 'up_offsets': self.up_offsets, 'up_targets': self.up_targets, 'up_weights': self.up_weights, 'up_middle': self.up_middle}
+        store.save_arrays(place, f"ch_{self.weight}", arrays, network_type)
+
+    @classmethod
+    def load(cls, store, place, compiled_graph, weight = 'energy', network_type = 'drive'):
+        """
+        Carica la preelaborazione dall'archivio dei grafi.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            compiled_graph (CompiledGraph): Il grafo compilato della località.
+            weight (str, optional): La metrica di costo della preelaborazione. Default è 'energy'.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            ContractionHierarchy: La preelaborazione, o None se non è presente nell'archivio.
+        """
+        arrays = store.load_arrays(place, f"ch_{weight}", network_type)
+        if arrays is None:
+            return None
+        return cls(compiled_graph, weight=weight, **arrays)
+
+    def query(self, source, target):
+        """
+        Calcola il cammino minimo tra due nodi con una ricerca bidirezionale sul grafo verso l'alto.
+
+        Args:
+            source (int): L'indice del nodo di partenza.
+            target (int): L'indice del nodo di arrivo.
+
+        Returns:
+            tuple: Il costo del cammino minimo e la lista degli indici dei nodi del cammino, oppure (infinito, None) se il cammino non esiste.
+        """
+        cost, meeting, parents = self._search(source, target)
+        if meeting is None:
+            return cost, None
+        up_path = [meeting] # Cammino sul grafo verso l'alto, con le scorciatoie
+        while parents[0][up_path[-1]] is not None:
+            up_path.append(parents[0][up_path[-1]])
+        up_path.reverse()
+        while parents[1][up_path[-1]] is not None:
+            up_path.append(parents[1][up_path[-1]])
+        path = [up_path[0]]
+        for u, v in zip(up_path[:-1], up_path[1:]):
+            path.extend(self._unpack(u, v))
+        return cost, path
+
+    def query_cost(self, source, target):
+        """
+        Calcola solo il costo del cammino minimo tra due nodi, senza ricostruirlo.
+
+        Args:
+            source (int): L'indice del nodo di partenza.
+            target (int): L'indice del nodo di arrivo.
+
+        Returns:
+            float: Il costo del cammino minimo, o infinito se il cammino non esiste.
+        """
+        return self._search(source, target)[0]
+
+    def _search(self, source, target):
+        offsets, targets, weights, _ = self._lists
+        dist = ({source: 0.0}, {target: 0.0})
+        parents = ({source: None}, {target: None})
+        settled = (set(), set())
+        frontier = ([(0.0, source)], [(0.0, target)])
+        best_cost = 0.0 if source == target else float('inf')
+        meeting = source if source == target else None
+        while frontier[0] or frontier[1]:
+            d = 0 if frontier[0] and (not frontier[1] or frontier[0][0][0] <= frontier[1][0][0]) else 1
+            cost, u = heappop(frontier[d])
+            if cost >= best_cost: # Questa direzione non può più migliorare il cammino
+                frontier[d].clear()
+                continue
+            if u in settled[d]:
+                continue
+            settled[d].add(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                new_cost = cost + weights[e]
+                if new_cost < dist[d].get(v, float('inf')):
+                    dist[d][v] = new_cost
+                    parents[d][v] = u
+                    heappush(frontier[d], (new_cost, v))
+                    if v in dist[1 - d] and new_cost + dist[1 - d][v] < best_cost: # Le due ricerche si incontrano in v
+                        best_cost = new_cost + dist[1 - d][v]
+                        meeting = v
+        return best_cost, meeting, parents
+
+    def _unpack(self, u, v):
+        """
+        Espande l'arco (u, v) del grafo verso l'alto negli archi originali, restituendo i nodi dopo u.
+        """
+        offsets, targets, _, middles = self._lists
+        rank = self._rank
+        nodes = []
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            low, high = (a, b) if rank[a] < rank[b] else (b, a) # L'arco è memorizzato nel nodo di rango minore
+            middle = -1
+            for e in range(offsets[low], offsets[low + 1]):
+                if targets[e] == high:
+                    middle = middles[e]
+                    break
+            if middle == -1:
+                nodes.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return nodes
+
+def _shortcuts(adjacency, v, settle_limit):
+    """
+    Restituisce le scorciatoie (u, x, costo) necessarie per contrarre il nodo v.
+    """
+    neighbors = list(adjacency[v].items())
+    shortcuts = []
+    for k, (u, (w_u, _)) in enumerate(neighbors[:-1]):
+        others = neighbors[k + 1:]
+        max_cost = w_u + max(w_x for _, (w_x, _) in others)
+        dist = _witness_search(adjacency, u, v, max_cost, settle_limit)
+        for x, (w_x, _) in others:
+            if dist.get(x, float('inf')) > w_u + w_x: # Nessun cammino alternativo: serve una scorciatoia
+                shortcuts.append((u, x, w_u + w_x))
+    return shortcuts
+
+def _witness_search(adjacency, source, excluded, max_cost, settle_limit):
+    """
+    Ricerca di Dijkstra limitata da `source` che evita il nodo `excluded`.
+    """
+    dist = {source: 0.0}
+    frontier = [(0.0, source)]
+    settled = 0
+    while frontier and settled < settle_limit:
+        cost, u = heappop(frontier)
+        if cost > dist[u]:
+            continue
+        if cost > max_cost:
+            break
+        settled += 1
+        for v, (w, _) in adjacency[u].items():
+            if v == excluded:
+                continue
+            new_cost = cost + w
+            if new_cost < dist.get(v, float('inf')):
+                dist[v] = new_cost
+                heappush(frontier, (new_cost, v))
+    return dist
+
+class ContractionHierarchiesSearch(SearchAlgorithm):
+    """
+    Algoritmo di ricerca che risponde alle richieste punto-punto con una preelaborazione Contraction Hierarchies.
+
+    La soluzione ha lo stesso formato di quella di AStar: le scorciatoie vengono espanse negli archi originali, per cui può essere usata
+    direttamente da `draw_solution_on_map` e `calculate_energy_consumed`.
+
+    Args:
+        hierarchy (ContractionHierarchy): La preelaborazione del grafo.
+        view (bool, optional): Se True, visualizza l'output dell'algoritmo. Default è False.
+    """
+    def __init__(self, hierarchy, view = False):
+        self.hierarchy = hierarchy
+        super().__init__(view)
+
+    def solve(self, problem):
+        """
+        Risolve il problema utilizzando la preelaborazione.
+
+        Args:
+            problem (object): Il problema da risolvere. Lo stato iniziale e l'obiettivo sono ID di nodi del grafo.
+
+        Returns:
+            list: La soluzione al problema come lista di azioni `(u, v)`, se esiste. Altrimenti, None.
+        """
+        compiled = self.hierarchy.compiled_graph
+        self.reset_expanded()
+        _, path = self.hierarchy.query(compiled.index[problem.init], compiled.index[problem.goal])
+        return compiled.actions(path) if path is not None else None
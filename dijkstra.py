@@ -0,0 +1,193 @@
+from heapq import heappush, heappop
+import numpy as np
+"""
+Modulo dijkstra.py
+
+Questo modulo fornisce una ricerca di Dijkstra uno-a-molti su un grafo compilato, limitata da un budget di costo.
+
+A differenza di A*, che trova il percorso verso un solo obiettivo, la ricerca esplora tutti i nodi raggiungibili con un costo non superiore al budget
+e restituisce in una sola passata il costo esatto (e il tempo di percorrenza) verso ognuno di essi. È utile quando bisogna confrontare molti obiettivi,
+ad esempio tutte le stazioni di ricarica raggiungibili con la batteria residua. `distances_to` esegue invece la ricerca all'indietro da un obiettivo
+e restituisce il costo esatto da ogni nodo verso l'obiettivo, in un array indicizzato come il grafo compilato.
+
+Esempio di utilizzo:
+
+```python
+from dijkstra import bounded_dijkstra, distances_to
+
+tree = bounded_dijkstra(compile_graph(G), start, budget = 5000) # Tutti i nodi raggiungibili con costo energetico <= 5000
+if station in tree:
+    energy, time = tree.cost(station), tree.time(station)
+    solution = tree.path(station) # Lista di azioni (u, v)
+costs = distances_to(compile_graph(G), goal, weight = 'travel_time') # costs[i]: tempo minimo dal nodo di indice i a goal
+```
+"""
+
+class ShortestPathTree:
+    """
+    Albero dei cammini minimi restituito da `bounded_dijkstra`.
+
+    Contiene, per ogni nodo raggiunto entro il budget, il costo minimo dalla sorgente, il tempo di percorrenza lungo quel cammino e il nodo genitore.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato su cui è stata eseguita la ricerca.
+        source (int): L'indice del nodo sorgente.
+        costs (dict): Il costo minimo di ogni indice raggiunto.
+        times (dict): Il tempo di percorrenza in secondi lungo il cammino minimo di ogni indice raggiunto.
+        parent (dict): Il genitore di ogni indice raggiunto, None per la sorgente.
+    """
+    def __init__(self, compiled_graph, source, costs, times, parent):
+        self.compiled_graph = compiled_graph
+        self.source = source
+        self.costs = costs
+        self.times = times
+        self.parent = parent
+
+    def __len__(self):
+        return len(self.costs)
+
+    def __contains__(self, node):
+        return self.compiled_graph.index.get(node) in self.costs
+
+    def cost(self, node):
+        """
+        Restituisce il costo minimo per raggiungere un nodo.
+
+        Args:
+            node (int): L'ID del nodo.
+
+        Returns:
+            float: Il costo minimo, o infinito se il nodo non è stato raggiunto.
+        """
+        return self.costs.get(self.compiled_graph.index[node], float('inf'))
+
+    def time(self, node):
+        """
+        Restituisce il tempo di percorrenza lungo il cammino minimo verso un nodo.
+
+        Args:
+            node (int): L'ID del nodo.
+
+        Returns:
+            float: Il tempo in secondi, o infinito se il nodo non è stato raggiunto.
+        """
+        return self.times.get(self.compiled_graph.index[node], float('inf'))
+
+    def cost_array(self, indices):
+        """
+        Restituisce il costo minimo per raggiungere ciascuno degli indici dati.
+
+        Args:
+            indices (array): Gli indici dei nodi nel grafo compilato.
+
+        Returns:
+            numpy.ndarray: Il costo minimo di ogni indice, infinito per quelli non raggiunti.
+        """
+        costs = self.costs
+        return np.array([costs.get(i, np.inf) for i in np.asarray(indices).tolist()], dtype=np.float64)
+
+    def path(self, node):
+        """
+        Ricostruisce il cammino minimo dalla sorgente a un nodo.
+
+        Args:
+            node (int): L'ID del nodo.
+
+        Returns:
+            list: La lista di azioni `(u, v)` dalla sorgente al nodo, o None se il nodo non è stato raggiunto.
+        """
+        i = self.compiled_graph.index[node]
+        if i not in self.costs:
+            return None
+        path = [i]
+        while self.parent[path[-1]] is not None:
+            path.append(self.parent[path[-1]])
+        path.reverse()
+        return self.compiled_graph.actions(path)
+
+def bounded_dijkstra(compiled_graph, source, budget = float('inf'), weight = 'energy', targets = None, barriers = None):
+    """
+    Esegue una ricerca di Dijkstra da un nodo, fermandosi quando il costo supera il budget.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato su cui eseguire la ricerca.
+        source (int): L'ID del nodo sorgente.
+        budget (float, optional): Il costo massimo dei nodi da raggiungere. Default è infinito.
+        weight (str, optional): La metrica di costo degli archi. Default è 'energy'.
+        targets (list, optional): Gli ID dei nodi di interesse: la ricerca si ferma appena li ha raggiunti tutti. Default è None.
+        barriers (list, optional): Gli ID dei nodi che vengono raggiunti ma non attraversati, ad esempio le altre stazioni di ricarica. Default è None.
+
+    Returns:
+        ShortestPathTree: L'albero dei cammini minimi verso tutti i nodi raggiunti entro il budget.
+    """
+    offsets, edge_targets, weights = compiled_graph.as_lists(weight)
+    travel_times = compiled_graph.as_lists('travel_time')[2]
+    s = compiled_graph.index[source]
+    remaining = {compiled_graph.index[target] for target in targets} if targets is not None else None
+    blocked = {compiled_graph.index[barrier] for barrier in barriers} - {s} if barriers is not None else ()
+    costs, times = {}, {} # Costi e tempi definitivi
+    best = {s: 0.0} # Costo migliore noto per ogni indice generato
+    best_time = {s: 0.0}
+    parent = {s: None}
+    frontier = [(0.0, s)]
+
+    while frontier:
+        cost, u = heappop(frontier)
+        if u in costs: # Voce obsoleta
+            continue
+        costs[u] = cost
+        times[u] = best_time[u]
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining: # Tutti i nodi di interesse sono stati raggiunti
+                break
+        if u in blocked: # Raggiunto ma non attraversato
+            continue
+        for e in range(offsets[u], offsets[u + 1]):
+            v = edge_targets[e]
+            if v in costs:
+                continue
+            new_cost = cost + weights[e]
+            if new_cost <= budget and new_cost < best.get(v, float('inf')):
+                best[v] = new_cost
+                best_time[v] = times[u] + travel_times[e]
+                parent[v] = u
+                heappush(frontier, (new_cost, v))
+
+    return ShortestPathTree(compiled_graph, s, costs, times, parent)
+
+def distances_to(compiled_graph, target, weight = 'energy'):
+    """
+    Calcola il costo minimo da ogni nodo verso un nodo obiettivo, con una ricerca di Dijkstra all'indietro sull'intero grafo.
+
+    La ricerca parte dall'obiettivo e segue gli archi in senso inverso (`CompiledGraph.reverse_lists`); su un grafo non diretto equivale
+    a `bounded_dijkstra` dall'obiettivo senza budget.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato su cui eseguire la ricerca.
+        target (int): L'ID del nodo obiettivo.
+        weight (str, optional): La metrica di costo degli archi. Default è 'energy'.
+
+    Returns:
+        numpy.ndarray: Il costo minimo da ogni indice all'obiettivo, infinito per gli indici da cui l'obiettivo non è raggiungibile.
+    """
+    offsets, sources, weights = compiled_graph.reverse_lists(weight)
+    t = compiled_graph.index[target]
+    costs = [float('inf')] * len(compiled_graph.node_list) # Costo migliore noto, definitivo per gli indici estratti
+    settled = [False] * len(costs)
+    costs[t] = 0.0
+    frontier = [(0.0, t)]
+
+    while frontier:
+        cost, v = heappop(frontier)
+        if settled[v]: # Voce obsoleta
+            continue
+        settled[v] = True
+        for e in range(offsets[v], offsets[v + 1]):
+            u = sources[e]
+            new_cost = cost + weights[e]
+            if new_cost < costs[u]:
+                costs[u] = new_cost
+                heappush(frontier, (new_cost, u))
+
+    return np.array(costs)
@@ -1,6 +1,15 @@
+import warnings
 import heuristics as h
-from ASTAR import AStar
+from ASTAR import ChargingAStar, CompiledAStar
+from charging_path_finding import CHARGE, ChargingPathFinding
+from compiled_graph import compile_graph
+from dijkstra import bounded_dijkstra
+from leg_cache import default_leg_cache
 from path_finding import PathFinding
+from charging_stations import station_registry
+from route_metrics import route_metrics
+from station_matrix import station_matrix
+from time import perf_counter
 """
 Questo modulo definisce la classe ElectricVehicle, che rappresenta un veicolo elettrico in un sistema di navigazione.
 
@@ -8,11 +17,37 @@ La classe ElectricVehicle tiene traccia delle informazioni relative al veicolo,
 
 Il modulo fornisce anche metodi per calcolare l'energia consumata per un dato percorso, aggiornare il percorso del veicolo e il tempo di viaggio, e calcolare l'energia necessaria per ricaricare il veicolo.
 
-Questo modulo dipende dai moduli 'heuristics', 'ASTAR' e 'path_finding' per funzionare correttamente.
+Questo modulo dipende dai moduli 'heuristics', 'ASTAR', 'charging_path_finding', 'compiled_graph', 'dijkstra', 'leg_cache', 'path_finding', 'charging_stations', 'route_metrics' e 'station_matrix' per funzionare correttamente.
 
 Classes:
     ElectricVehicle: Rappresenta un veicolo elettrico in un sistema di navigazione.
+
+Variabili:
+    electric_vehicle_data (dict): Un dizionario che mappa i nomi dei modelli di veicoli elettrici alle loro specifiche.
 """
+# electric constant = (energia[kW] * temperatura[°C]) / (distanza[km] * velocità[km/h]) # la temperatura è un problema, me ne sono accorto un po' tardi
+electric_vehicle_data = {
+    "Tesla Model 3 Standard Range Plus": {
+        "battery_capacity_kWh": 54,
+        "electric_constant": 0.05
+    },
+    "MINI Electric": {
+        "battery_capacity_kWh": 32.6,
+        "electric_constant": 0.055
+    },
+    "Renault Twizy": {
+        "battery_capacity_kWh": 6.1,
+        "electric_constant": 0.1
+    },
+    "Renault Twingo Electric": {
+        "battery_capacity_kWh": 22,
+        "electric_constant": 0.06
+    },
+    "Fiat 500e": {
+        "battery_capacity_kWh": 42,
+        "electric_constant": 0.055
+    }
+}
 
 class ElectricVehicle:
     """
@@ -25,8 +60,14 @@ class ElectricVehicle:
         electric_constant (float, optional): La costante elettrica del veicolo. Default è 0.06.
         energy_recharged (list, optional): Una lista delle energie ricaricate. Default è una lista vuota.
         travel_time (int, optional): Il tempo di viaggio totale. Default è 0.
+        algorithm (function, optional): Una funzione che riceve il grafo e restituisce l'algoritmo di ricerca (SearchAlgorithm) da usare per ogni tratto,
+            ad esempio `lambda graph: BidirectionalAStar(graph, h.euclidean_distance)`. Default è CompiledAStar sul grafo compilato.
+        trace (SearchTrace, optional): La traccia in cui registrare i contatori di ogni ricerca, vedi il modulo `profiling`. Default è None, nessuna traccia.
+        leg_cache (LegCache, optional): La cache dei tratti già risolti, vedi il modulo `leg_cache`; `LegCache(0)` non memorizza nulla.
+            Default è la cache condivisa del processo.
     """
-    def __init__(self, battery_capacity = 100, battery = 100, min_battery = 20, electric_constant = 0.06, energy_recharged = None, travel_time = 0):
+    def __init__(self, battery_capacity = 100, battery = 100, min_battery = 20, electric_constant = 0.06, energy_recharged = None, travel_time = 0, algorithm = None,
+                 trace = None, leg_cache = None):
         self.battery_capacity = battery_capacity
         self.battery = battery
         self.min_battery = min_battery
@@ -34,28 +75,58 @@ class ElectricVehicle:
         self.recharge = 0
         self.energy_recharged = energy_recharged if energy_recharged is not None else []
         self.travel_time = travel_time
+        self.algorithm = algorithm
+        self.availability = None # Stazioni disponibili per l'ultima richiesta
+        self.trace = trace
+        self.leg_cache = leg_cache if leg_cache is not None else default_leg_cache()
+        self.last_search = None # Algoritmo dell'ultima ricerca, con i suoi contatori
 
     def calculate_energy_consumed(self, solution, graph, ambient_temperature):
         """
         Calcola l'energia consumata in kWh e il tempo complessivo per un dato percorso.
 
+        Gli attributi degli archi sono letti dagli array del grafo compilato con `route_metrics`, con gli stessi valori di default usati dalla ricerca.
+
         Args:
             solution (list): Il percorso da calcolare. Ogni elemento è una coppia di nodi.
             graph (Graph): Il grafo che rappresenta il percorso.
             ambient_temperature (float): La temperatura ambiente.
 
         Returns:
-            tuple: L'energia consumata (float) e il tempo impiegato (int).
-        """
-        energy_consumed = time = 0
-        for i, j in solution:
-            edge = graph.edges[i, j]
-            distance = edge.get('length', 10)
-            speed = edge.get('speed_kph', 50)
-            energy_consumed += self.electric_constant * (distance / 1000) * speed / ambient_temperature
-            time += edge.get('travel_time', 10)
-        return energy_consumed, time
+            tuple: L'energia consumata (float) e il tempo impiegato (float).
+        """
+        metrics = route_metrics(graph, solution) # Somme vettoriali sugli archi del grafo compilato
+        return metrics.energy(self.electric_constant, ambient_temperature), metrics.total_time
     
+    def solve_leg(self, graph, start, goal):
+        """
+        Trova il percorso di un singolo tratto con l'algoritmo di ricerca del veicolo.
+
+        Con l'algoritmo predefinito il tratto viene cercato prima nella cache dei tratti (`self.leg_cache`); se è già in cache, `self.last_search` è None.
+
+        Args:
+            graph (Graph): Il grafo che rappresenta il percorso.
+            start (int): Il nodo di partenza.
+            goal (int): Il nodo di arrivo.
+
+        Returns:
+            list: Il percorso come lista di coppie di nodi, o None se non esiste.
+        """
+        problem = PathFinding(graph, start, goal) # Inizializza il problema di ricerca
+        if self.algorithm is not None:
+            self.last_search = self.algorithm(graph)
+            return self.last_search.solve(problem)
+        compiled = compile_graph(graph)
+        solution = self.leg_cache.get(compiled, start, goal) # Tratto già risolto su questo grafo
+        if solution is not None:
+            self.last_search = None
+            return solution
+        self.last_search = CompiledAStar(compiled) # Algoritmo di ricerca A* sul grafo compilato, senza l'insieme degli stati espansi
+        solution = self.last_search.solve(problem)
+        if solution is not None:
+            self.leg_cache.put(compiled, start, goal, solution)
+        return solution
+
     def update_path(self, solution, energy_consumed, time):
         """
         Aggiorna il percorso, il tempo di viaggio e il livello della batteria del veicolo.
@@ -97,107 +168,68 @@ class ElectricVehicle:
         else:
             return self.battery_capacity - self.battery
 
-    def nearest_charging_station(self, graph, start, goal, solution, ambient_temperature):
+    def nearest_charging_station(self, graph, start, goal, solution, ambient_temperature, availability = None):
         """
-        Trova la stazione di ricarica più vicina che può essere raggiunta con l'energia rimanente nella batteria.
+        Trova la stazione di ricarica più vicina all'obiettivo che può essere raggiunta con l'energia rimanente nella batteria.
 
-        Questo metodo considera tutte le stazioni di ricarica nel grafo e restituisce quella più vicina che può essere raggiunta con l'energia rimanente.
+        Questo metodo esegue una sola ricerca di Dijkstra da `start`, limitata al 90% dell'energia rimanente, che calcola il costo esatto
+        sulla rete stradale verso tutte le stazioni raggiungibili. Il costo esatto da ogni stazione all'obiettivo viene letto dalla tabella
+        dei costi verso `goal` di `heuristics.default_goal_tables()`, calcolata una sola volta per obiettivo: le soste successive dello stesso
+        viaggio, e gli altri viaggi verso lo stesso obiettivo, non ripetono la ricerca. Tra le stazioni raggiungibili sceglie quella con
+        il costo minore verso l'obiettivo, purchè minore di quello del nodo di partenza, così ogni ricarica fa avanzare il veicolo.
 
         Args:
             graph (Graph): Il grafo che rappresenta il percorso.
             start (int): Il nodo di partenza.
             goal (int): Il nodo di arrivo.
-            solution (list): Il percorso attuale.
+            solution (list): Deprecato e non usato, va passato None: la stazione viene scelta con le ricerche di Dijkstra. Verrà rimosso.
             ambient_temperature (float): La temperatura ambiente.
+            availability (StationAvailability, optional): Le stazioni disponibili per la richiesta. Default sono le stazioni disponibili nel registro.
 
         Returns:
-            int: Il nodo della stazione di ricarica più vicina che può essere raggiunta con l'energia rimanente.
+            tuple: Il nodo della stazione scelta, il percorso per raggiungerla, l'energia consumata e il tempo impiegato, oppure quattro None se nessuna stazione è raggiungibile.
         """
-        # Ottieni tutte le stazioni di ricarica
-        charging_stations = [node for node in graph.nodes() if graph.nodes[node].get('charging_station', False)]
-        percent = 1.0 # Parte dal 100%
-        while percent > 0.2:
-            percent -= 0.1 # Riduce del 10% ad ogni iterazione
-            distanza_minima = float('inf')
-            best_station = None
-            new_start = start
-            nodo_raggio = goal
-            sw = False
-            distance = speed = energy_consumed = distance_radius = raggio = speed_tot = count = 0
-            for i, j in solution: # Calcola l'energia consumata nel percorso migliore
-                edge = graph.edges[i, j]
-                distance = edge.get('length', 10)
-                if not sw:
-                    speed = edge.get('speed_kph', 50)
-                    speed_tot += speed
-                    count += 1
-                    energy_consumed += self.electric_constant * (distance / 1000) * speed / ambient_temperature
-                    if energy_consumed >= self.battery * percent: # Fino a quando l'energia non raggiunge la % richiesta
-                        new_start = j # Aggiorna il nuovo nodo di partenza
-                        raggio = abs(self.battery - energy_consumed) * ambient_temperature / (self.electric_constant * speed * speed_tot / count)
-                        sw = True
-                if sw: # Calcola la distanza dal nuovo nodo di partenza al nodo in solution massimo nell'ampiezza del raggio
-                    distance_radius += distance / 1000
-                    if distance_radius >= raggio:
-                        nodo_raggio = j
-                        break
-
-        # while percent > 0.2:
-        #     percent -= 0.1 # Riduce del 10% ad ogni iterazione
-        #     distanza_minima = float('inf')
-        #     best_station = None
-        #     new_start = start
-        #     distance = speed = energy_consumed = speed_tot = count = 0
-        #     for i, j in solution: # Calcola l'energia consumata nel percorso migliore
-        #         edge = graph.edges[i, j]
-        #         distance = edge.get('length', 10)
-        #         speed = edge.get('speed_kph', 50)
-        #         speed_tot += speed
-        #         count += 1
-        #         energy_consumed += self.electric_constant * (distance / 1000) * speed / ambient_temperature
-        #         if energy_consumed >= self.battery * percent: # Fino a quando l'energia non raggiunge la % richiesta
-        #             new_start = j # Aggiorna il nuovo nodo di partenza
-        #             break
-        #     raggio = abs(self.battery - energy_consumed) * ambient_temperature / (self.electric_constant * speed_tot / count)
-
-            for station in charging_stations: # Trova la stazione di ricarica migliore
-                start_dist = h.euclidean_distance(new_start, station, graph) # come differenza tra il nuovo nodo di partenza e la stazione
-                # goal_dist = h.euclidean_distance(goal, station, graph)
-                goal_dist = h.euclidean_distance(nodo_raggio, station, graph) # e il nodo in solution massimo nell'ampiezza del raggio e la stazione
-                if start_dist > raggio: # Se la stazione è fuori dal raggio (troppo distante), continua
-                    continue
-                if start_dist + goal_dist < distanza_minima:
-                    distanza_minima = start_dist + goal_dist
-                    best_station = station
-            if best_station is None:
-                continue
-
-            problem = PathFinding(graph, start, best_station)
-            astar = AStar(graph, h.euclidean_distance, view=True)
-            solution_charging = astar.solve(problem)
-            if solution_charging is None:
-                continue
-            time = 0
-            energy_consumed, time = self.calculate_energy_consumed(solution_charging, graph, ambient_temperature)
-            if energy_consumed >= self.battery:
-                continue
-            return best_station, solution_charging, energy_consumed, time
-        return None, None, None, None
-
-    def adaptive_search(self, graph, start, goal, ambient_temperature):
+        if solution is not None:
+            warnings.warn("Il parametro 'solution' di nearest_charging_station è deprecato e non viene usato", DeprecationWarning, stacklevel=2)
+        registry = station_registry(graph) # Registro delle stazioni di ricarica del grafo
+        if len(registry) == 0:
+            return None, None, None, None
+        compiled = compile_graph(graph)
+        scale = self.electric_constant / ambient_temperature # Converte il coefficiente energetico degli archi in kWh
+        budget = self.battery * 0.9 / scale # Margine di sicurezza del 10% sulla batteria rimanente
+        tree = bounded_dijkstra(compiled, start, budget) # Costi esatti verso tutti i nodi raggiungibili con la batteria
+        _, goal_table = h.default_goal_tables().table(graph, goal, 'energy') # Costi esatti verso l'obiettivo, una ricerca per obiettivo
+        costs = tree.cost_array(registry.indices)
+        goal_costs = goal_table[registry.indices]
+        # Stazioni disponibili, raggiungibili e più vicine all'obiettivo rispetto al nodo di partenza
+        available = registry.available if availability is None else availability.mask
+        reachable = available & (costs <= budget) & (goal_costs < goal_table[compiled.index[start]])
+        if not reachable.any():
+            return None, None, None, None
+        positions = reachable.nonzero()[0]
+        best_station = registry.station_list[positions[goal_costs[positions].argmin()]] # Stazione più vicina all'obiettivo sulla rete stradale
+        path = tree.path(best_station)
+        self.leg_cache.put(compiled, start, best_station, path) # Percorso ottimo verso la stazione, riutilizzabile da solve_leg
+        return best_station, path, tree.cost(best_station) * scale, tree.time(best_station)
+
+    def adaptive_search(self, graph, start, goal, ambient_temperature, availability = None):
         """
         Trova la stazione di ricarica più vicina che può essere raggiunta con l'energia rimanente nella batteria.
 
         Questo metodo esamina tutte le stazioni di ricarica nel grafo e restituisce il nodo della stazione di ricarica più vicina che può essere raggiunta con l'energia rimanente nella batteria. Se non esiste una stazione di ricarica raggiungibile, il metodo solleva un'eccezione.
 
         Il metodo modifica l'attributo `self.energy_recharged` per riflettere l'energia ricaricata alla stazione di ricarica.
+        Le stazioni usate vengono disabilitate solo nella disponibilità della richiesta (`self.availability`): il grafo non viene modificato
+        e può essere riutilizzato per altre richieste.
+        Se il veicolo ha una traccia (`self.trace`), per ogni tratto viene registrato un evento 'leg' con i contatori della ricerca e i tempi
+        di ricerca del percorso e di scelta della stazione.
 
         Args:
             graph (Graph): Il grafo che rappresenta il percorso. Deve contenere informazioni sulle stazioni di ricarica.
             start (int): Il nodo di partenza.
             goal (int): Il nodo di arrivo.
-            solution (list): Il percorso attuale. Ogni elemento è una coppia di nodi.
             ambient_temperature (float): La temperatura ambiente in gradi Celsius.
+            availability (StationAvailability, optional): Le stazioni disponibili per la richiesta. Default è una nuova disponibilità dal registro del grafo.
 
         Returns:
             int: Il nodo della stazione di ricarica più vicina che può essere raggiunta con l'energia rimanente.
@@ -209,10 +241,12 @@ class ElectricVehicle:
             Modifica `self.energy_recharged` per riflettere l'energia ricaricata alla stazione di ricarica.
         """
         self.path = []
+        self.availability = availability if availability is not None else station_registry(graph).availability() # Stazioni disponibili per la richiesta
+        leg = 0
         while True:
-            problem = PathFinding(graph, start, goal) # Inizializza il problema di ricerca
-            astar = AStar(graph, h.euclidean_distance, view = True) # Inizializza l'algoritmo di ricerca A*
-            solution = astar.solve(problem)
+            search_start = perf_counter()
+            solution = self.solve_leg(graph, start, goal)
+            search_time = perf_counter() - search_start
             if solution is None:
                 raise Exception("Percorso completo non trovato")
         
@@ -224,10 +258,16 @@ class ElectricVehicle:
             if energy_consumed < self.battery - self.min_battery:
                 # Aggiungi il percorso alla soluzione
                 self.update_path(solution, energy_consumed, time)
+                if self.trace is not None:
+                    self.trace.search('leg', self.last_search, search_time, leg = leg, start = start, goal = goal, station = None, station_time = 0.0)
                 return self.path
                 
             # Altrimenti, cerca la stazione di ricarica migliore
-            charging_station_start, solution, energy_consumed, time = self.nearest_charging_station(graph, start, goal, solution, ambient_temperature)
+            station_start = perf_counter()
+            charging_station_start, solution, energy_consumed, time = self.nearest_charging_station(graph, start, goal, None, ambient_temperature, self.availability)
+            if self.trace is not None:
+                self.trace.search('leg', self.last_search, search_time, leg = leg, start = start, goal = goal, station = charging_station_start,
+                                  station_time = perf_counter() - station_start)
             if charging_station_start is None:
                 raise Exception("Stazione di ricarica non trovata")
             if solution is None:
@@ -240,10 +280,122 @@ class ElectricVehicle:
             recharge_needed = self.calculate_recharge_needed(charging_station_start, goal, graph, ambient_temperature, energy_start_goal - energy_consumed)
             self.energy_recharged.append(recharge_needed)
             self.travel_time += (recharge_needed) / 22 * 3600
-            self.battery = recharge_needed   
+            self.battery = min(self.battery + recharge_needed, self.battery_capacity) # La ricarica si somma all'energia rimanente
             self.recharge += 1
-            graph.nodes[charging_station_start]['charging_station'] = False
+            self.availability.disable(charging_station_start)
 
             # Continua la ricerca
             start = charging_station_start
-            
\ No newline at end of file
+            leg += 1
+            
+    def station_search(self, graph, start, goal, ambient_temperature, matrix = None, availability = None):
+        """
+        Trova il percorso completo scegliendo tutte le soste sulla matrice precalcolata dei costi tra le stazioni di ricarica.
+
+        A differenza di `adaptive_search`, che sceglie la stazione successiva in modo greedy dopo ogni tratto, le soste vengono scelte insieme
+        con `StationMatrix.plan` (minimo numero di soste, poi minima energia): sulla rete stradale vengono esplorati solo il primo e l'ultimo tratto.
+        I percorsi dei tratti vengono poi ricostruiti con `solve_leg`, che riutilizza la cache dei tratti. La ricarica a ogni sosta segue
+        `calculate_recharge_needed` con l'energia del tratto successivo, come in `adaptive_search`.
+        Se il veicolo ha una traccia (`self.trace`), viene registrato un evento 'station_plan' con le soste e il tempo di pianificazione.
+
+        Args:
+            graph (Graph): Il grafo che rappresenta il percorso. Deve contenere informazioni sulle stazioni di ricarica.
+            start (int): Il nodo di partenza.
+            goal (int): Il nodo di arrivo.
+            ambient_temperature (float): La temperatura ambiente in gradi Celsius.
+            matrix (StationMatrix, optional): La matrice delle stazioni. Default è quella del grafo già preparata con `station_matrix`.
+            availability (StationAvailability, optional): Le stazioni disponibili per la richiesta. Default è una nuova disponibilità dal registro del grafo.
+
+        Returns:
+            list: Il percorso come lista di coppie di nodi.
+
+        Raises:
+            ValueError: Se la matrice non è indicata e non è stata preparata per il grafo: non viene costruita durante la richiesta.
+            Exception: Se non esiste un percorso che raggiunga l'obiettivo con le stazioni disponibili.
+
+        Side Effects:
+            Aggiorna il livello della batteria, il tempo di viaggio, le ricariche e `self.energy_recharged`, e disabilita le stazioni usate in `self.availability`.
+        """
+        self.availability = availability if availability is not None else station_registry(graph).availability() # Stazioni disponibili per la richiesta
+        scale = self.electric_constant / ambient_temperature # Converte il coefficiente energetico in kWh
+        full_range = (self.battery_capacity - self.min_battery) / scale # Autonomia con la batteria ricaricata
+        matrix = matrix if matrix is not None else station_matrix(graph, full_range, build = False)
+        if matrix is None:
+            raise ValueError("Matrice delle stazioni non disponibile: va preparata con station_matrix prima delle richieste")
+        plan_start = perf_counter()
+        plan = matrix.plan(start, goal, (self.battery - self.min_battery) / scale, full_range, self.availability)
+        if self.trace is not None:
+            self.trace.record('station_plan', start = start, goal = goal, stops = plan[0] if plan is not None else None, plan_time = perf_counter() - plan_start)
+        if plan is None:
+            raise Exception("Percorso completo non trovato")
+
+        stops, leg_energy, _ = plan
+        self.path = []
+        nodes = [start] + stops + [goal]
+        for leg, (u, v) in enumerate(zip(nodes[:-1], nodes[1:])):
+            solution = self.solve_leg(graph, u, v)
+            if solution is None:
+                raise Exception("Percorso stazione non trovato")
+            self.update_path(solution, *self.calculate_energy_consumed(solution, graph, ambient_temperature))
+            if leg == len(stops): # Arrivo
+                break
+            recharge_needed = self.calculate_recharge_needed(v, nodes[leg + 2], graph, ambient_temperature, leg_energy[leg + 1] * scale)
+            self.energy_recharged.append(recharge_needed)
+            self.travel_time += (recharge_needed) / 22 * 3600
+            self.battery = min(self.battery + recharge_needed, self.battery_capacity)
+            self.recharge += 1
+            self.availability.disable(v)
+        return self.path
+
+    def charging_search(self, graph, start, goal, ambient_temperature, levels = 20, availability = None):
+        """
+        Trova il percorso completo con le soste di ricarica in una sola ricerca, tenendo conto dello stato di carica.
+
+        A differenza di `adaptive_search`, che ripete la ricerca dopo ogni ricarica scegliendo le stazioni in modo greedy, questo metodo risolve
+        un problema ChargingPathFinding con ChargingAStar: stazioni e quantità di energia ricaricata sono scelte insieme al percorso, minimizzando
+        il tempo totale di viaggio e di ricarica.
+
+        Args:
+            graph (Graph): Il grafo che rappresenta il percorso. Deve contenere informazioni sulle stazioni di ricarica.
+            start (int): Il nodo di partenza.
+            goal (int): Il nodo di arrivo.
+            ambient_temperature (float): La temperatura ambiente in gradi Celsius.
+            levels (int, optional): Il numero di livelli discreti della batteria a cui è possibile ricaricare. Default è 20.
+            availability (StationAvailability, optional): Le stazioni disponibili per la richiesta. Default è una nuova disponibilità dal registro del grafo.
+
+        Returns:
+            list: Il percorso come lista di coppie di nodi.
+
+        Raises:
+            Exception: Se non esiste un percorso che raggiunga l'obiettivo con le stazioni disponibili.
+
+        Side Effects:
+            Aggiorna il livello della batteria, il tempo di viaggio, le ricariche e `self.energy_recharged`, e disabilita le stazioni usate in `self.availability`.
+        """
+        self.availability = availability if availability is not None else station_registry(graph).availability() # Stazioni disponibili per la richiesta
+        problem = ChargingPathFinding(graph, start, goal, self.battery, self.battery_capacity, self.min_battery, self.electric_constant, ambient_temperature, levels,
+                                      stations = self.availability.available_stations())
+        self.last_search = ChargingAStar()
+        search_start = perf_counter()
+        solution = self.last_search.solve(problem)
+        if self.trace is not None:
+            self.trace.search('charging_search', self.last_search, perf_counter() - search_start, start = start, goal = goal, found = solution is not None)
+        if solution is None:
+            raise Exception("Percorso completo non trovato")
+
+        self.path = []
+        leg = [] # Azioni di guida dall'ultima ricarica
+        for action in solution:
+            if action[0] != CHARGE:
+                leg.append(action)
+                continue
+            _, station, recharge_needed = action
+            self.update_path(leg, *self.calculate_energy_consumed(leg, graph, ambient_temperature))
+            leg = []
+            self.energy_recharged.append(recharge_needed)
+            self.travel_time += problem.stop_time + recharge_needed / problem.charging_power * 3600
+            self.battery = min(self.battery + recharge_needed, self.battery_capacity)
+            self.recharge += 1
+            self.availability.disable(station)
+        self.update_path(leg, *self.calculate_energy_consumed(leg, graph, ambient_temperature))
+        return self.path
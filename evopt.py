@@ -0,0 +1,342 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import nullcontext
+import numpy as np
+from batch_routing import compare_vehicles, load_graph, make_vehicle
+from charging_stations import place_charging_stations
+from electric_vehicle import electric_vehicle_data
+from geocoding import CachedGeocoder, OfflineGeocoder, default_geocoder
+from graph_store import GraphStore, load_osm_graph
+from map_rendering import render_solution
+from profiling import SearchTrace
+from route_metrics import route_metrics
+from spatial_index import node_index
+from station_matrix import station_matrix
+"""
+Modulo evopt.py
+
+Questo modulo è il punto di ingresso senza interfaccia grafica di EVOPT-Maps, utilizzabile come libreria o da riga di comando.
+
+Espone la pipeline di calcolo del percorso (caricamento del grafo, ricerca del nodo più vicino, ricerca del percorso con ricariche,
+stampa e disegno della soluzione) senza importare Tkinter. Le librerie di visualizzazione (folium) e di geocoding (geopy) vengono importate
+solo quando servono (il disegno della mappa è nel modulo `map_rendering`), così l'avvio di un calcolo su un grafo già presente nell'archivio resta rapido. Gli indirizzi sono risolti con il modulo
+`geocoding`, con una cache persistente, oppure senza rete con i nomi delle strade del grafo (`--offline`).
+
+Esempio di utilizzo da riga di comando:
+
+```bash
+python3 -m evopt route --place Brescia --start 45.5416,10.2118 --end 45.5646,10.2318 --vehicle "Fiat 500e"
+python3 -m evopt route --place Brescia --start "Piazza della Loggia" --end "Castello di Brescia" --map path.html
+python3 -m evopt compare --place Brescia --start 45.5416,10.2118 --end 45.5646,10.2318 --temperature 5
+```
+
+Esempio di utilizzo come libreria:
+
+```python
+from evopt import route
+
+result = route("Brescia", (45.5416, 10.2118), (45.5646, 10.2318), vehicle = "Fiat 500e")
+```
+"""
+
+def generate_osm_graph(location, num_charging_stations = 0, store = None, seed = None):
+    """
+    Genera un grafo stradale da OpenStreetMap.
+
+    Questa funzione scarica i dati della rete stradale da OpenStreetMap e li converte in un grafo NetworkX. Aggiunge anche le velocità degli archi,
+    i tempi di percorrenza e le lunghezze degli archi al grafo. Se non viene specificato un numero di stazioni di ricarica, il 10% dei nodi viene impostato come stazioni di ricarica.
+    Il grafo elaborato viene salvato nell'archivio dei grafi, così le richieste successive sulla stessa località non lo riscaricano.
+
+    Args:
+        location (str): La località da cui scaricare i dati della rete stradale.
+        num_charging_stations (int, optional): Il numero di stazioni di ricarica da aggiungere al grafo. Default a None.
+        store (GraphStore, optional): L'archivio dei grafi da usare. Default è l'archivio nella cartella 'graph_store'.
+        seed (int, optional): Il seme per la scelta delle stazioni di ricarica, per ottenere sempre le stesse. Default è None.
+
+    Returns:
+        ox.Graph: Il grafo della rete stradale.
+        list: Una lista degli indici delle stazioni di ricarica nel grafo.
+    """
+    # Genera un grafo da OpenStreetMap, o lo legge dall'archivio se è già stato elaborato
+    G = load_osm_graph(location, store = store)
+
+    if num_charging_stations is None or num_charging_stations <= 0: # Imposta il 10% dei nodi come stazioni di ricarica se non viene specificato il numero
+        num_charging_stations = int(len(G) * 0.1)
+    charging_stations = place_charging_stations(G, num_charging_stations, seed)
+    return G, charging_stations
+
+def nearest_existing_node(G, lat, lon):
+    """
+    Trova il nodo più vicino nel grafo rispetto a un punto di riferimento specificato.
+
+    Questa funzione utilizza l'indice spaziale dei nodi del grafo, costruito una sola volta per grafo, per trovare il nodo più vicino
+    rispetto a un punto di riferimento specificato in termini di latitudine e longitudine.
+
+    Args:
+        G (networkx.Graph): Il grafo in cui cercare il nodo.
+        lat (float): La latitudine del punto di riferimento.
+        lon (float): La longitudine del punto di riferimento.
+
+    Returns:
+        int: L'indice del nodo più vicino nel grafo.
+    """
+    return node_index(G).nearest(lat, lon)
+
+# Funzione per verificare che il luogo inserito esista
+def get_coordinates(geocoder, location):
+    """
+    Ottiene le coordinate geografiche di una località utilizzando un geocodificatore.
+
+    Il geocodificatore predefinito (`geocoding.default_geocoder`) usa una cache persistente, per cui una località già cercata non richiede
+    di nuovo la rete, e ripete le richieste a Nominatim in caso di timeout. Se la località non esiste, la funzione restituisce None.
+
+    Args:
+        geocoder (object): Il geocodificatore, ad esempio `geocoding.CachedGeocoder`, o un geolocalizzatore di geopy.
+        location (str): La località di cui ottenere le coordinate.
+
+    Returns:
+        tuple: Latitudine e longitudine della località, o None se la località non esiste o il servizio non risponde.
+    """
+    location = location.capitalize()
+    try:
+        result = geocoder.geocode(location)
+    except Exception as e: # Servizio non raggiungibile dopo tutti i tentativi
+        print("Errore del geolocalizzatore ({}). Per favore, riprova.".format(e))
+        return None
+    if result is None:
+        print("Il luogo inserito non esiste. Per favore, riprova.")
+        return None
+    if hasattr(result, 'latitude'): # Oggetto Location di geopy
+        return result.latitude, result.longitude
+    return tuple(result)
+
+def print_solution(G, solution, electric_vehicle):
+    """
+    Stampa la soluzione di un percorso e le informazioni relative al veicolo elettrico.
+
+    Questa funzione stampa la soluzione di un percorso, il numero di azioni nel percorso, le informazioni sulla batteria del veicolo elettrico, il numero di volte che il veicolo è stato ricaricato, l'energia ricaricata, il tempo di viaggio e la distanza percorsa.
+
+    Args:
+        G (networkx.Graph): Il grafo in cui è stato trovato il percorso.
+        solution (list): La soluzione del percorso, come lista di azioni.
+        electric_vehicle (ElectricVehicle): Il veicolo elettrico utilizzato per il percorso.
+    """
+    distance = route_metrics(G, solution).total_distance
+    print("Soluzione:", solution)
+    print("Percorso trovato con", len(solution), "azioni")
+    print("Batteria rimanente: {:.2f} kWh, Macchina ricaricata {} volte, Energia ricaricata: {} kWh".format(electric_vehicle.battery, electric_vehicle.recharge, electric_vehicle.energy_recharged))    
+    print("Tempo trascorso: {:.2f} ore. Distanza percorsa: {:.2f} km".format(electric_vehicle.travel_time / 3600, distance / 1000))
+
+def print_comparison(comparison, as_json = False):
+    """
+    Stampa il confronto tra veicoli restituito da `batch_routing.compare_vehicles`, una riga per veicolo.
+
+    Args:
+        comparison (dict): Il confronto in forma colonnare.
+        as_json (bool, optional): Se True, stampa una riga JSON per veicolo, senza il percorso. Default è False.
+    """
+    columns = [column for column in comparison if column != 'path']
+    for row in zip(*(comparison[column] for column in columns)):
+        row = dict(zip(columns, row))
+        if as_json:
+            print(json.dumps(row))
+        elif row['error'] is not None:
+            print("{}: {}".format(row['vehicle'], row['error']))
+        else:
+            print("{}: energia {:.2f} kWh, batteria all'arrivo {:.2f} kWh, ricariche {}, tempo {:.2f} ore".format(
+                row['vehicle'], row['energy'], row['battery'], row['recharges'], row['time'] / 3600))
+
+def parse_location(location, geocoder = None):
+    """
+    Converte una località in coordinate: accetta una coppia "latitudine,longitudine" o un indirizzo da geolocalizzare.
+
+    Args:
+        location (str or tuple): La coppia di coordinate, come tupla o come testo "lat,lon", oppure un indirizzo.
+        geocoder (object, optional): Il geocodificatore per gli indirizzi. Default è `geocoding.default_geocoder()`, Nominatim con cache.
+
+    Returns:
+        tuple: Latitudine e longitudine, o None se l'indirizzo non esiste.
+    """
+    if not isinstance(location, str):
+        return float(location[0]), float(location[1])
+    try:
+        lat, lon = (float(value) for value in location.split(','))
+        return lat, lon
+    except ValueError:
+        pass
+    return get_coordinates(geocoder if geocoder is not None else default_geocoder(), location)
+
+def prepare_trip(location_city, start, end, num_charging_stations = 0, seed = 0, store = None, geocoder = None):
+    """
+    Carica il grafo di una località e trova i nodi di partenza e di arrivo di un viaggio.
+
+    Args:
+        location_city (str): La città o il paese del grafo.
+        start (str or tuple): La località di partenza, come in `parse_location`.
+        end (str or tuple): La località di arrivo, come in `parse_location`.
+        num_charging_stations (int, optional): Il numero di stazioni di ricarica. Se 0, il 10% dei nodi. Default è 0.
+        seed (int, optional): Il seme per la scelta delle stazioni di ricarica. Default è 0.
+        store (GraphStore, optional): L'archivio dei grafi da usare. Default è l'archivio nella cartella 'graph_store'.
+        geocoder (object, optional): Il geocodificatore per gli indirizzi, come in `parse_location`. Default è Nominatim con cache.
+
+    Returns:
+        tuple: Il grafo con le stazioni di ricarica e gli ID dei nodi di partenza e di arrivo.
+
+    Raises:
+        ValueError: Se una località non esiste.
+    """
+    start_coordinates, end_coordinates = parse_location(start, geocoder), parse_location(end, geocoder)
+    if start_coordinates is None or end_coordinates is None:
+        raise ValueError("Il luogo inserito non esiste")
+    G = load_graph(location_city, num_charging_stations, seed, store)
+    return G, nearest_existing_node(G, *start_coordinates), nearest_existing_node(G, *end_coordinates)
+
+def route(location_city, start, end, vehicle = "Tesla Model 3 Standard Range Plus", battery_at_goal_percent = 20, temperature = 20,
+          num_charging_stations = 0, seed = 0, search = 'adaptive', store = None, geocoder = None, trace = None):
+    """
+    Calcola un percorso con ricariche tra due località, senza interfaccia grafica.
+
+    Args:
+        location_city (str): La città o il paese del grafo.
+        start (str or tuple): La località di partenza, come in `parse_location`.
+        end (str or tuple): La località di arrivo, come in `parse_location`.
+        vehicle (str or dict, optional): Il modello del veicolo, come in `batch_routing.make_vehicle`. Default è "Tesla Model 3 Standard Range Plus".
+        battery_at_goal_percent (float, optional): La percentuale minima di batteria da mantenere. Default è 20.
+        temperature (float, optional): La temperatura ambiente in gradi Celsius. Default è 20.
+        num_charging_stations (int, optional): Il numero di stazioni di ricarica. Se 0, il 10% dei nodi. Default è 0.
+        seed (int, optional): Il seme per la scelta delle stazioni di ricarica. Default è 0.
+        search (str, optional): 'adaptive' per `ElectricVehicle.adaptive_search`, 'charging' per `ElectricVehicle.charging_search`,
+            'stations' per `ElectricVehicle.station_search`, con la matrice delle stazioni letta dall'archivio o calcolata e salvata. Default è 'adaptive'.
+        store (GraphStore, optional): L'archivio dei grafi da usare. Default è l'archivio nella cartella 'graph_store'.
+        geocoder (object, optional): Il geocodificatore per gli indirizzi, come in `parse_location`. Default è Nominatim con cache.
+        trace (SearchTrace, optional): La traccia in cui registrare i contatori delle ricerche, vedi il modulo `profiling`. Default è None.
+
+    Returns:
+        dict: Il grafo, i nodi di partenza e di arrivo, il percorso, il veicolo dopo il viaggio e il tempo di ricerca in secondi.
+
+    Raises:
+        ValueError: Se una località non esiste.
+        Exception: Se non esiste un percorso con le stazioni di ricarica disponibili.
+    """
+    G, start_node, end_node = prepare_trip(location_city, start, end, num_charging_stations, seed, store, geocoder)
+    electric_vehicle = make_vehicle(vehicle, battery_at_goal_percent)
+    electric_vehicle.trace = trace
+
+    start_time = time.perf_counter()
+    if search == 'charging':
+        solution = electric_vehicle.charging_search(G, start_node, end_node, max(temperature, 1))
+    elif search == 'stations':
+        matrix = station_matrix(G, store = store if store is not None else GraphStore(), place = location_city)
+        solution = electric_vehicle.station_search(G, start_node, end_node, max(temperature, 1), matrix)
+    else:
+        solution = electric_vehicle.adaptive_search(G, start_node, end_node, max(temperature, 1))
+    return {'graph': G, 'start_node': start_node, 'end_node': end_node, 'solution': solution, 'vehicle': electric_vehicle,
+            'search_time': time.perf_counter() - start_time}
+
+def compare(location_city, start, end, vehicles = None, battery_at_goal_percent = 20, temperature = 20, num_charging_stations = 0,
+            seed = 0, search = None, store = None, geocoder = None):
+    """
+    Confronta molti veicoli sullo stesso viaggio, con una sola ricerca del percorso per tutti i veicoli (vedi `batch_routing.compare_vehicles`).
+
+    Args:
+        location_city (str): La città o il paese del grafo.
+        start (str or tuple): La località di partenza, come in `parse_location`.
+        end (str or tuple): La località di arrivo, come in `parse_location`.
+        vehicles (list, optional): I modelli dei veicoli, come in `batch_routing.compare_vehicles`. Default sono tutti i modelli.
+        battery_at_goal_percent (float or list, optional): La percentuale minima di batteria da mantenere, una sola o una per veicolo. Default è 20.
+        temperature (float or list, optional): La temperatura ambiente in gradi Celsius, una sola o una per veicolo. Default è 20.
+        num_charging_stations (int, optional): Il numero di stazioni di ricarica. Se 0, il 10% dei nodi. Default è 0.
+        seed (int, optional): Il seme per la scelta delle stazioni di ricarica. Default è 0.
+        search (str, optional): Il metodo di ricerca con le ricariche per i veicoli che devono ricaricare, None per nessuna ricerca. Default è None.
+        store (GraphStore, optional): L'archivio dei grafi da usare. Default è l'archivio nella cartella 'graph_store'.
+        geocoder (object, optional): Il geocodificatore per gli indirizzi, come in `parse_location`. Default è Nominatim con cache.
+
+    Returns:
+        dict: Il grafo, i nodi di partenza e di arrivo, il confronto in forma colonnare e il tempo di calcolo in secondi.
+
+    Raises:
+        ValueError: Se una località non esiste.
+        Exception: Se non esiste un percorso tra partenza e arrivo.
+    """
+    G, start_node, end_node = prepare_trip(location_city, start, end, num_charging_stations, seed, store, geocoder)
+    start_time = time.perf_counter()
+    temperature = np.maximum(temperature, 1)
+    comparison = compare_vehicles(G, start_node, end_node, vehicles, temperature, battery_at_goal_percent, search)
+    return {'graph': G, 'start_node': start_node, 'end_node': end_node, 'comparison': comparison, 'search_time': time.perf_counter() - start_time}
+
+def main(argv = None):
+    """
+    Esegue EVOPT-Maps da riga di comando.
+
+    Args:
+        argv (list, optional): Gli argomenti da riga di comando. Default sono quelli del processo.
+
+    Returns:
+        int: Il codice di uscita, 0 se il percorso è stato trovato.
+    """
+    parser = argparse.ArgumentParser(prog="evopt", description="EVOPT-Maps senza interfaccia grafica")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False) # Argomenti comuni ai comandi
+    common.add_argument('--place', required=True, help="La città o il paese del grafo")
+    common.add_argument('--start', required=True, help="La partenza, come \"lat,lon\" o indirizzo")
+    common.add_argument('--end', required=True, help="L'arrivo, come \"lat,lon\" o indirizzo")
+    common.add_argument('--battery', type=float, default=20, help="La percentuale minima di batteria di arrivo")
+    common.add_argument('--temperature', type=float, default=20, help="La temperatura ambiente in gradi Celsius")
+    common.add_argument('--stations', type=int, default=0, help="Il numero di stazioni di ricarica, 0 per il 10%% dei nodi")
+    common.add_argument('--seed', type=int, default=0, help="Il seme per la scelta delle stazioni di ricarica")
+    common.add_argument('--search', default='adaptive', choices=['adaptive', 'charging', 'stations'], help="Il metodo di ricerca")
+    common.add_argument('--store', default='graph_store', help="La cartella dell'archivio dei grafi")
+    common.add_argument('--offline', action='store_true', help="Geolocalizza gli indirizzi con i nomi delle strade del grafo, senza rete")
+    common.add_argument('--json', action='store_true', help="Stampa un riepilogo in formato JSON")
+    route_parser = subparsers.add_parser('route', parents=[common], help="Calcola un percorso con ricariche")
+    route_parser.add_argument('--vehicle', default="Tesla Model 3 Standard Range Plus", choices=list(electric_vehicle_data), help="Il modello del veicolo")
+    route_parser.add_argument('--map', help="File HTML in cui disegnare la mappa del percorso")
+    route_parser.add_argument('--simplify', type=float, default=0, help="La tolleranza in metri per semplificare il percorso sulla mappa, 0 per nessuna")
+    route_parser.add_argument('--trace', help="File in cui aggiungere i contatori di ricerca di ogni tratto, in righe JSON")
+    route_parser.add_argument('--corridor', type=float, default=2.0, help="La distanza in km dal percorso delle stazioni disegnate sulla mappa")
+    compare_parser = subparsers.add_parser('compare', parents=[common], help="Confronta i modelli di veicolo sullo stesso viaggio")
+    compare_parser.add_argument('--vehicles', nargs='+', choices=list(electric_vehicle_data), help="I modelli da confrontare, default tutti")
+    compare_parser.add_argument('--plan', action='store_true', help="Calcola il percorso con le ricariche dei veicoli che devono ricaricare")
+    args = parser.parse_args(argv)
+
+    store = GraphStore(args.store)
+    geocoder = None
+    if args.offline:
+        backend = OfflineGeocoder.from_store(store, args.place)
+        if backend is None:
+            print(f"{args.place} non è nell'archivio dei grafi", file=sys.stderr)
+            return 1
+        geocoder = CachedGeocoder(backend)
+    try:
+        if args.command == 'compare':
+            result = compare(args.place, args.start, args.end, args.vehicles, args.battery, args.temperature, args.stations, args.seed,
+                             args.search if args.plan else None, store, geocoder)
+        else:
+            with SearchTrace(args.trace) if args.trace else nullcontext() as trace:
+                result = route(args.place, args.start, args.end, args.vehicle, args.battery, args.temperature, args.stations, args.seed, args.search,
+                               store, geocoder, trace)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.command == 'compare':
+        print_comparison(result['comparison'], args.json)
+        return 0
+    G, solution, electric_vehicle = result['graph'], result['solution'], result['vehicle']
+    if args.json:
+        print(json.dumps({'start_node': result['start_node'], 'end_node': result['end_node'], 'actions': len(solution),
+                          'battery': electric_vehicle.battery, 'recharges': electric_vehicle.recharge, 'energy_recharged': electric_vehicle.energy_recharged,
+                          'travel_time': electric_vehicle.travel_time, 'search_time': result['search_time']}))
+    else:
+        print("Tempo di ricerca:", result['search_time'], "secondi")
+        print_solution(G, solution, electric_vehicle)
+    if args.map:
+        charging_stations = [node for node, is_station in G.nodes(data='charging_station', default=False) if is_station]
+        stats = render_solution(G, solution, result['start_node'], result['end_node'], charging_stations, args.map,
+                                electric_vehicle.availability.used_stations(), args.simplify, args.corridor)
+        print(f"Mappa salvata in {args.map}: {stats['bytes']} byte in {stats['render_time']:.3f} secondi", file=sys.stderr if args.json else sys.stdout)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from compiled_graph import compile_graph
+"""
+Modulo geocoding.py
+
+Questo modulo fornisce la conversione di indirizzi in coordinate (geocoding), con una cache persistente e geocodificatori intercambiabili.
+
+- `GeocodeCache`: cache su file delle query già risolte (query normalizzata -> latitudine e longitudine), con scadenza e dimensione massima.
+  Anche le query senza risultato vengono memorizzate, così un indirizzo inesistente non viene richiesto di nuovo fino alla scadenza.
+- `NominatimGeocoder`: geocodificatore in rete basato su Nominatim (geopy), con limite di una richiesta al secondo e nuovi tentativi in caso di timeout.
+- `OfflineGeocoder`: geocodificatore senza rete, costruito dai nomi delle strade di un grafo già presente nell'archivio.
+- `CachedGeocoder`: combina un geocodificatore con la cache e risolve molti indirizzi alla volta.
+
+Esempio di utilizzo:
+
+```python
+from geocoding import CachedGeocoder, GeocodeCache, OfflineGeocoder, default_geocoder
+
+geocoder = default_geocoder() # Nominatim con cache persistente
+lat, lon = geocoder.geocode("Piazza della Loggia, Brescia")
+coordinates = geocoder.geocode_batch(addresses) # Una richiesta al secondo per gli indirizzi non in cache
+
+offline = CachedGeocoder(OfflineGeocoder.from_store(GraphStore(), "Brescia")) # Senza rete
+```
+"""
+
+MISS = object() # Valore restituito da GeocodeCache.get per le query non presenti o scadute
+
+def normalize_query(query):
+    """
+    Normalizza una query di geocoding, così query che differiscono solo per maiuscole, accenti o spazi hanno la stessa chiave.
+
+    Args:
+        query (str): La query.
+
+    Returns:
+        str: La query normalizzata.
+    """
+    query = unicodedata.normalize('NFKD', query)
+    query = ''.join(c for c in query if not unicodedata.combining(c)).casefold()
+    return ', '.join(' '.join(part.split()) for part in query.split(',') if part.strip())
+
+class GeocodeCache:
+    """
+    Cache delle query di geocoding, salvata in un file JSON.
+
+    Le voci più vecchie di `ttl` secondi sono considerate scadute; quando le voci superano `max_entries`, vengono eliminate quelle usate meno di recente.
+
+    Args:
+        path (str, optional): Il file della cache. Se None, la cache resta solo in memoria. Default è 'geocode_cache.json'.
+        ttl (float, optional): La durata di una voce in secondi. Default è 30 giorni.
+        max_entries (int, optional): Il numero massimo di voci. Default è 10000.
+    """
+    def __init__(self, path = 'geocode_cache.json', ttl = 30 * 24 * 3600, max_entries = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # Query normalizzata -> (coordinate o None, istante di inserimento), dalla meno recente
+        self.lock = threading.Lock()
+        if path is not None:
+            try:
+                with open(path) as f:
+                    for query, (coordinates, created) in json.load(f).items():
+                        self.entries[query] = (tuple(coordinates) if coordinates is not None else None, created)
+            except (OSError, ValueError, TypeError): # Cache assente o danneggiata
+                self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, query):
+        """
+        Restituisce il risultato memorizzato di una query.
+
+        Args:
+            query (str): La query.
+
+        Returns:
+            tuple: Latitudine e longitudine, None se la query non ha risultato, o MISS se la query non è presente o è scaduta.
+        """
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISS
+            if time.time() - entry[1] > self.ttl:
+                del self.entries[key]
+                return MISS
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, query, coordinates):
+        """
+        Memorizza il risultato di una query.
+
+        Args:
+            query (str): La query.
+            coordinates (tuple): Latitudine e longitudine, o None se la query non ha risultato.
+        """
+        key = normalize_query(query)
+        with self.lock:
+            self.entries[key] = (tuple(coordinates) if coordinates is not None else None, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        """
+        Salva la cache nel suo file, se ne ha uno. Il file viene scritto in un file temporaneo e poi rinominato.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            data = dict(self.entries)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+class NominatimGeocoder:
+    """
+    Geocodificatore in rete basato su Nominatim.
+
+    Le richieste sono distanziate di almeno `min_delay` secondi, come richiesto dalle regole d'uso di Nominatim, e vengono ripetute
+    fino a `retries` volte con attesa crescente in caso di timeout o servizio non disponibile.
+
+    Args:
+        user_agent (str, optional): Lo user agent delle richieste. Default è 'bsGeocoder'.
+        timeout (float, optional): Il timeout di una richiesta in secondi. Default è 5.
+        retries (int, optional): Il numero di nuovi tentativi. Default è 2.
+        backoff (float, optional): L'attesa prima del primo nuovo tentativo in secondi, raddoppiata a ogni tentativo. Default è 1.
+        min_delay (float, optional): L'intervallo minimo tra due richieste in secondi. Default è 1.
+    """
+    def __init__(self, user_agent = 'bsGeocoder', timeout = 5, retries = 2, backoff = 1.0, min_delay = 1.0):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.min_delay = min_delay
+        self.geolocator = None # Creato alla prima richiesta
+        self.last_request = 0.0
+        self.lock = threading.Lock()
+
+    def geocode(self, query):
+        """
+        Risolve una query con Nominatim.
+
+        Args:
+            query (str): La query.
+
+        Returns:
+            tuple: Latitudine e longitudine, o None se la query non ha risultato.
+
+        Raises:
+            geopy.exc.GeocoderServiceError: Se il servizio non risponde dopo tutti i tentativi.
+        """
+        from geopy.exc import GeocoderTimedOut, GeocoderUnavailable # Import ritardati: geopy serve solo per il geocoding in rete
+        if self.geolocator is None:
+            from geopy.geocoders import Nominatim
+            self.geolocator = Nominatim(user_agent=self.user_agent, timeout=self.timeout)
+        for attempt in range(self.retries + 1):
+            with self.lock: # Una richiesta alla volta, distanziate di min_delay
+                wait = self.last_request + self.min_delay - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    result = self.geolocator.geocode(query)
+                    return (result.latitude, result.longitude) if result is not None else None
+                except (GeocoderTimedOut, GeocoderUnavailable):
+                    if attempt == self.retries:
+                        raise
+                finally:
+                    self.last_request = time.monotonic()
+            time.sleep(self.backoff * 2**attempt)
+
+class OfflineGeocoder:
+    """
+    Geocodificatore senza rete, basato sui nomi delle strade di un grafo.
+
+    Una query viene confrontata con i nomi delle strade: prima l'intera query, poi la sua prima parte (prima della virgola, ad esempio la via
+    di un indirizzo "Via Roma, Brescia"), infine i nomi contenuti nella query. Il risultato è il nodo della strada più vicino al suo baricentro.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato.
+        names (dict): Per ogni nome di strada, gli indici dei nodi della strada, come restituito da `graph_store.street_names`.
+    """
+    def __init__(self, compiled_graph, names):
+        self.compiled_graph = compiled_graph
+        self.names = {}
+        for name, nodes in names.items():
+            self.names.setdefault(normalize_query(name), []).extend(nodes)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Costruisce il geocodificatore dall'attributo 'name' degli archi di un grafo.
+
+        Args:
+            graph (networkx.Graph): Il grafo.
+
+        Returns:
+            OfflineGeocoder: Il geocodificatore.
+        """
+        from graph_store import street_names
+        compiled = compile_graph(graph)
+        return cls(compiled, street_names(graph, compiled))
+
+    @classmethod
+    def from_store(cls, store, place, network_type = 'drive'):
+        """
+        Costruisce il geocodificatore dai nomi delle strade salvati nell'archivio dei grafi.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            OfflineGeocoder: Il geocodificatore, o None se la località non è nell'archivio.
+        """
+        names = store.load_names(place, network_type)
+        compiled = store.load(place, network_type) if names is not None else None
+        return cls(compiled, names) if compiled is not None else None
+
+    def geocode(self, query):
+        """
+        Risolve una query con i nomi delle strade.
+
+        Args:
+            query (str): La query.
+
+        Returns:
+            tuple: Latitudine e longitudine, o None se nessuna strada corrisponde.
+        """
+        query = normalize_query(query)
+        nodes = self.names.get(query) or self.names.get(query.split(',')[0])
+        if not nodes:
+            matches = [name for name in self.names if name in query]
+            if not matches:
+                return None
+            nodes = self.names[max(matches, key=len)] # Il nome più lungo è il più specifico
+        lat, lon = self.compiled_graph.lat[nodes], self.compiled_graph.lon[nodes]
+        i = ((lat - lat.mean())**2 + (lon - lon.mean())**2).argmin() # Nodo più vicino al baricentro della strada
+        return float(lat[i]), float(lon[i])
+
+class CachedGeocoder:
+    """
+    Geocodificatore con cache, davanti a un qualsiasi geocodificatore con il metodo `geocode(query)`.
+
+    Args:
+        backend (object): Il geocodificatore, ad esempio NominatimGeocoder o OfflineGeocoder.
+        cache (GeocodeCache, optional): La cache. Default è una cache solo in memoria.
+    """
+    def __init__(self, backend, cache = None):
+        self.backend = backend
+        self.cache = cache if cache is not None else GeocodeCache(None)
+
+    def geocode(self, query):
+        """
+        Risolve una query, usando la cache se possibile.
+
+        Args:
+            query (str): La query.
+
+        Returns:
+            tuple: Latitudine e longitudine, o None se la query non ha risultato.
+        """
+        coordinates = self.cache.get(query)
+        if coordinates is MISS:
+            coordinates = self.backend.geocode(query)
+            self.cache.put(query, coordinates)
+            self.cache.save()
+        return coordinates
+
+    def geocode_batch(self, queries):
+        """
+        Risolve molte query. Le query ripetute vengono risolte una sola volta e la cache viene salvata una sola volta alla fine;
+        il limite di frequenza delle richieste è applicato dal geocodificatore.
+
+        Args:
+            queries (list): Le query.
+
+        Returns:
+            list: Per ogni query, latitudine e longitudine, o None se la query non ha risultato.
+        """
+        resolved = {}
+        try:
+            for query in queries:
+                key = normalize_query(query)
+                if key in resolved:
+                    continue
+                coordinates = self.cache.get(query)
+                if coordinates is MISS:
+                    coordinates = self.backend.geocode(query)
+                    self.cache.put(query, coordinates)
+                resolved[key] = coordinates
+        finally:
+            self.cache.save() # Salva anche i risultati ottenuti prima di un errore
+        return [resolved[normalize_query(query)] for query in queries]
+
+_default_geocoder = None
+
+def default_geocoder():
+    """
+    Restituisce il geocodificatore predefinito: Nominatim con la cache persistente nel file 'geocode_cache.json'.
+
+    Returns:
+        CachedGeocoder: Il geocodificatore, creato alla prima richiesta.
+    """
+    global _default_geocoder
+    if _default_geocoder is None:
+        _default_geocoder = CachedGeocoder(NominatimGeocoder(), GeocodeCache())
+    return _default_geocoder
@@ -0,0 +1,360 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+from compiled_graph import CompiledGraph, compile_graph
+"""
+Modulo graph_store.py
+
+Questo modulo fornisce un archivio su disco dei grafi stradali già elaborati, così una città scaricata una volta non deve essere
+riscaricata e rielaborata (velocità, tempi di percorrenza, lunghezze, conversione in grafo non diretto) a ogni richiesta.
+
+Ogni grafo è identificato dal nome della località, dal tipo di rete e dalla versione dell'elaborazione (`PROCESSING_VERSION`), e viene salvato
+come insieme di file `.npy` con gli array del grafo compilato, che vengono caricati in memoria mappata (memory-mapped) in pochi millisecondi.
+L'archivio ha una dimensione massima: quando viene superata, vengono eliminati i grafi usati meno di recente.
+
+Esempio di utilizzo:
+
+```python
+from graph_store import GraphStore, load_osm_graph
+
+G = load_osm_graph("Brescia") # Scarica ed elabora il grafo solo la prima volta
+GraphStore().invalidate("Brescia") # Forza un nuovo download alla prossima richiesta
+```
+"""
+
+PROCESSING_VERSION = 2 # Da incrementare ogni volta che cambia l'elaborazione del grafo in build_osm_graph
+ARRAYS = ('nodes', 'offsets', 'targets', 'length', 'speed_kph', 'travel_time', 'lat', 'lon') # Array salvati per ogni grafo
+
+class GraphStore:
+    """
+    Archivio su disco dei grafi elaborati.
+
+    Ogni grafo occupa una sottocartella della cartella dell'archivio, con un file `.npy` per ogni array del grafo compilato, un file `meta.json`
+    con la descrizione del grafo e un file `names.json` con i nomi delle strade, usato per il geocoding senza rete. La data di modifica di `meta.json` viene aggiornata a ogni lettura ed è usata per eliminare i grafi meno recenti.
+
+    Args:
+        directory (str, optional): La cartella dell'archivio. Default è 'graph_store'.
+        max_bytes (int, optional): La dimensione massima dell'archivio in byte. Default è 1 GB.
+    """
+    def __init__(self, directory = 'graph_store', max_bytes = 1024**3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, place, network_type = 'drive'):
+        """
+        Calcola la chiave di un grafo nell'archivio.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            str: La chiave del grafo.
+        """
+        name = f"{' '.join(place.lower().split())}|{network_type}|{PROCESSING_VERSION}"
+        return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+    def path(self, place, network_type = 'drive'):
+        """
+        Restituisce la cartella in cui viene salvato un grafo.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            str: Il percorso della cartella del grafo.
+        """
+        return os.path.join(self.directory, self.key(place, network_type))
+
+    def contains(self, place, network_type = 'drive'):
+        """
+        Verifica se il grafo di una località è presente nell'archivio.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            bool: True se il grafo è presente, altrimenti False.
+        """
+        return os.path.exists(os.path.join(self.path(place, network_type), 'meta.json'))
+
+    def save(self, place, graph, network_type = 'drive'):
+        """
+        Salva un grafo elaborato nell'archivio.
+
+        Il grafo viene scritto in una cartella temporanea e poi rinominato, così una lettura concorrente non vede mai un grafo incompleto;
+        un eventuale grafo precedente viene spostato da parte prima dello scambio ed eliminato solo dopo.
+
+        Args:
+            place (str): Il nome della località.
+            graph (networkx.Graph): Il grafo elaborato da salvare.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            str: Il percorso della cartella del grafo.
+        """
+        compiled = compile_graph(graph)
+        path = self.path(place, network_type)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(compiled, name))
+        meta = {
+            'place': place,
+            'network_type': network_type,
+            'version': PROCESSING_VERSION,
+            'directed': compiled.directed,
+            'nodes': len(compiled),
+            'edges': compiled.edge_count,
+            'created': time.time()
+        }
+        with open(os.path.join(tmp_path, 'names.json'), 'w') as f:
+            json.dump(street_names(graph, compiled), f)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        old_path = f"{path}.{os.getpid()}.old"
+        try:
+            os.replace(path, old_path) # Sposta da parte un eventuale grafo precedente, che resta leggibile fino allo scambio
+        except FileNotFoundError:
+            old_path = None
+        os.replace(tmp_path, path)
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+        self.evict()
+        return path
+
+    def load(self, place, network_type = 'drive'):
+        """
+        Carica il grafo compilato di una località, se presente nell'archivio.
+
+        Gli array vengono mappati in memoria in sola lettura, senza copiarli.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            CompiledGraph: Il grafo compilato, o None se non è presente nell'archivio.
+        """
+        path = self.path(place, network_type)
+        meta_path = os.path.join(path, 'meta.json')
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+        except (OSError, ValueError): # Grafo assente, eliminato nel frattempo o danneggiato
+            return None
+        with contextlib.suppress(OSError): # Il grafo può essere stato sostituito o eliminato da un altro processo, ma gli array sono già mappati
+            os.utime(meta_path) # Segna il grafo come usato di recente
+        return CompiledGraph(directed=meta['directed'], **arrays)
+
+    def save_arrays(self, place, name, arrays, network_type = 'drive'):
+        """
+        Salva degli array ausiliari calcolati a partire da un grafo già presente nell'archivio.
+
+        Gli array (ad esempio una preelaborazione per la ricerca) vengono salvati nella cartella del grafo, per cui vengono eliminati insieme
+        al grafo e contano nella dimensione dell'archivio.
+
+        Args:
+            place (str): Il nome della località.
+            name (str): Il nome del gruppo di array.
+            arrays (dict): Gli array da salvare, per nome.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Raises:
+            KeyError: Se il grafo non è presente nell'archivio.
+        """
+        path = self.path(place, network_type)
+        if not self.contains(place, network_type):
+            raise KeyError(f"Grafo non presente nell'archivio: {place}")
+        for array_name, array in arrays.items():
+            tmp_file = os.path.join(path, f"{name}.{array_name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_file, array)
+            os.replace(tmp_file, os.path.join(path, f"{name}.{array_name}.npy"))
+        self.evict()
+
+    def load_arrays(self, place, name, network_type = 'drive'):
+        """
+        Carica gli array ausiliari salvati con `save_arrays`, in memoria mappata.
+
+        Args:
+            place (str): Il nome della località.
+            name (str): Il nome del gruppo di array.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            dict: Gli array per nome, o None se il gruppo non è presente nell'archivio.
+        """
+        path = self.path(place, network_type)
+        prefix = f"{name}."
+        try:
+            files = [file for file in os.listdir(path) if file.startswith(prefix) and file.endswith('.npy') and '.tmp' not in file]
+            arrays = {file[len(prefix):-len('.npy')]: np.load(os.path.join(path, file), mmap_mode='r') for file in files}
+        except (OSError, ValueError):
+            return None
+        return arrays or None
+
+    def load_names(self, place, network_type = 'drive'):
+        """
+        Carica i nomi delle strade di un grafo presente nell'archivio.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            dict: Per ogni nome di strada, gli indici dei nodi della strada nel grafo compilato, o None se il grafo non è nell'archivio.
+        """
+        try:
+            with open(os.path.join(self.path(place, network_type), 'names.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_graph(self, place, network_type = 'drive'):
+        """
+        Carica il grafo NetworkX di una località, se presente nell'archivio.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            networkx.Graph: Il grafo ricostruito, già associato al suo grafo compilato, o None se non è presente nell'archivio.
+        """
+        compiled = self.load(place, network_type)
+        return compiled.to_graph() if compiled is not None else None
+
+    def invalidate(self, place, network_type = 'drive'):
+        """
+        Elimina il grafo di una località dall'archivio.
+
+        Args:
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+        """
+        shutil.rmtree(self.path(place, network_type), ignore_errors=True)
+
+    def clear(self):
+        """
+        Elimina tutti i grafi dall'archivio.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def entries(self):
+        """
+        Restituisce i grafi presenti nell'archivio.
+
+        Returns:
+            list: Una lista di tuple (percorso, dimensione in byte, ultimo utilizzo), dal meno recente al più recente.
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            meta_path = os.path.join(path, 'meta.json')
+            if not os.path.exists(meta_path): # Cartella temporanea o incompleta
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+                entries.append((path, size, os.path.getmtime(meta_path)))
+            except OSError: # Cartella spostata o eliminata da un altro processo durante la scansione
+                continue
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def size(self):
+        """
+        Restituisce la dimensione complessiva dell'archivio.
+
+        Returns:
+            int: La dimensione in byte.
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Elimina i grafi usati meno di recente finchè l'archivio non rientra nella dimensione massima.
+
+        Returns:
+            int: Il numero di grafi eliminati.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries[:-1]: # Il grafo più recente non viene mai eliminato
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+        return evicted
+
+def street_names(graph, compiled_graph = None):
+    """
+    Raccoglie i nomi delle strade dall'attributo 'name' degli archi di un grafo.
+
+    Args:
+        graph (networkx.Graph): Il grafo, con i nomi degli archi come stringhe o liste di stringhe (grafi semplificati da osmnx).
+        compiled_graph (CompiledGraph, optional): Il grafo compilato che fornisce gli indici dei nodi. Default è quello del grafo.
+
+    Returns:
+        dict: Per ogni nome di strada, la lista ordinata degli indici dei nodi degli archi con quel nome.
+    """
+    index = (compiled_graph if compiled_graph is not None else compile_graph(graph)).index
+    names = {}
+    for u, v, name in graph.edges(data='name'):
+        for street in ([name] if isinstance(name, str) else name or []):
+            names.setdefault(street, set()).update((index[u], index[v]))
+    return {street: sorted(nodes) for street, nodes in names.items()}
+
+def build_osm_graph(location, network_type = 'drive'):
+    """
+    Scarica ed elabora il grafo stradale di una località da OpenStreetMap.
+
+    Aggiunge al grafo le velocità, i tempi di percorrenza e le lunghezze degli archi, e lo converte in un grafo non diretto.
+
+    Args:
+        location (str): La località da cui scaricare i dati della rete stradale.
+        network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+    Returns:
+        networkx.Graph: Il grafo della rete stradale.
+    """
+    import osmnx as ox # Importato solo quando serve scaricare un grafo
+    G = ox.graph_from_place(location, network_type = network_type)  # Scarica i dati della rete stradale da OSM
+    G = ox.routing.add_edge_speeds(G) # Aggiungi velocità agli archi in km/h 'speed_kph'
+    G = ox.routing.add_edge_travel_times(G) # Aggiungi tempi di percorrenza agli archi in secondi s 'travel_time'
+    G = ox.distance.add_edge_lengths(G) # Aggiungi lunghezze degli archi in metri m 'length'
+    G = ox.utils_graph.convert.to_digraph(G, weight = "travel_time") # Converte MultiDiGraph in DiGraph
+    return G.to_undirected() # Converte in un grafo non diretto
+
+def load_osm_graph(location, network_type = 'drive', store = None):
+    """
+    Restituisce il grafo elaborato di una località, leggendolo dall'archivio se presente.
+
+    Se il grafo non è nell'archivio, viene scaricato ed elaborato con `build_osm_graph` e poi salvato.
+
+    Args:
+        location (str): La località da cui scaricare i dati della rete stradale.
+        network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+        store (GraphStore, optional): L'archivio da usare. Default è l'archivio nella cartella 'graph_store'.
+
+    Returns:
+        networkx.Graph: Il grafo della rete stradale, sempre ricostruito dall'archivio con `GraphStore.load_graph`.
+    """
+    store = store if store is not None else GraphStore()
+    G = store.load_graph(location, network_type)
+    if G is None:
+        G = build_osm_graph(location, network_type)
+        store.save(location, G, network_type)
+        loaded = store.load_graph(location, network_type) # Come nelle richieste successive, con gli stessi attributi degli archi
+        G = loaded if loaded is not None else compile_graph(G).to_graph() # Grafo già eliminato da un archivio troppo piccolo
+    return G
@@ -1,12 +1,27 @@
 import math
-import osmnx as ox
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
 """
 Modulo heuristics.py
 
 Questo modulo fornisce diverse funzioni euristiche utilizzate per calcolare distanze e tempi tra nodi in un grafo. 
 Le funzioni includono il calcolo della distanza euclidea, un'euristica basata sul tempo, il percorso più breve utilizzando l'algoritmo di Dijkstra e la distanza haversine.
+
+Il percorso più breve (`shortest_destination`) viene letto da una tabella dei costi verso l'obiettivo, calcolata con una sola ricerca di Dijkstra
+all'indietro per obiettivo e conservata in una cache LRU (`GoalTables`): ogni valutazione dell'euristica è una lettura da un array,
+utile quando molti viaggi condividono la destinazione. Le tabelle usano la metrica di costo delle ricerche (il coefficiente energetico
+degli archi, come `SearchProblem.getSuccessors`), per cui l'euristica è il costo esatto verso l'obiettivo.
+
+La distanza haversine è calcolata da due nuclei con la stessa formula, su coordinate già convertite in radianti con il coseno della latitudine:
+`haversine_radians` per una sola coppia di punti, con il modulo math, e `haversine_array` per array NumPy, con il broadcasting (un punto
+contro molti, coppie di punti elemento per elemento, molti contro molti). `euclidean_distance` usa i radianti dei nodi precalcolati una sola
+volta per grafo (`node_radians`); `haversine_many` e `haversine_matrix` accettano coordinate in gradi.
 """
 
+EARTH_RADIUS = 6371.0 # Raggio della Terra in km
+
 def euclidean_distance(node_a, node_b, graph):
     """
     Calcola la distanza euclidea tra due nodi in un grafo.
@@ -19,9 +34,10 @@ def euclidean_distance(node_a, node_b, graph):
     Returns:
         float: La distanza euclidea tra i due nodi in chilometri.
     """
-    x1, y1 = graph.nodes[node_a]['x'], graph.nodes[node_a]['y'] # coordinate geografiche deciamli del nodo_a
-    x2, y2 = graph.nodes[node_b]['x'], graph.nodes[node_b]['y'] # coordinate geografiche deciamli del nodo_b
-    return haversine_distance(y1, x1, y2, x2)
+    radians = node_radians(graph) # Latitudine, longitudine in radianti e coseno della latitudine, per nodo
+    lat1, lon1, cos_lat1 = radians[node_a]
+    lat2, lon2, cos_lat2 = radians[node_b]
+    return haversine_radians(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2)
 
 def time_based_heuristic(node_a, node_b, graph):
     """
@@ -45,7 +61,13 @@ def time_based_heuristic(node_a, node_b, graph):
 
 def shortest_destination(node_a, node_b, graph):
     """
-    Trova il percorso più breve in termini di tempo tra due nodi utilizzando l'algoritmo di Dijkstra.
+    Restituisce il costo del percorso più breve tra due nodi nella metrica di costo di AStar, letto dalla tabella dei costi verso `node_b`.
+
+    Il costo è il coefficiente energetico degli archi (`d(km) * v(km/h)`, lo stesso di `SearchProblem.getSuccessors`) e non il tempo
+    in ore: come euristica di AStar è quindi esatta, e la ricerca espande solo i nodi dei percorsi minimi.
+
+    La tabella viene calcolata alla prima valutazione verso `node_b`, con una ricerca di Dijkstra all'indietro, e conservata nella cache
+    predefinita (`default_goal_tables()`): le valutazioni successive verso lo stesso obiettivo non eseguono ricerche.
 
     Args:
         node_a (int): L'ID del nodo di partenza.
@@ -53,14 +75,117 @@ def shortest_destination(node_a, node_b, graph):
         graph (networkx.Graph): Il grafo che contiene i nodi.
 
     Returns:
-        float: Il costo del percorso più breve tra i due nodi in ore.
+        float: Il coefficiente energetico del percorso più breve tra i due nodi, infinito se `node_b` non è raggiungibile.
     """
-    short = ox.routing.shortest_path(graph, node_a, node_b, weight='travel_time', cpus=1)
-    cost = sum(graph[i][j]['travel_time'] for i, j in zip(short[:-1], short[1:]))
-    # cost = 0
-    # for i in range(len(short) - 1):
-    #     cost += graph[short[i]][short[i+1]]['travel_time']
-    return cost / 3600
+    return default_goal_tables().cost(graph, node_a, node_b)
+
+class GoalTables:
+    """
+    Cache LRU delle tabelle dei costi verso un obiettivo.
+
+    Una tabella contiene il costo esatto da ogni nodo del grafo verso l'obiettivo, in un array indicizzato come il grafo compilato
+    (vedi `dijkstra.distances_to`). Le tabelle sono identificate da (versione del grafo compilato, obiettivo, metrica di costo).
+
+    Args:
+        max_tables (int, optional): Il numero massimo di tabelle in memoria. Default è 16.
+    """
+    def __init__(self, max_tables = 16):
+        self.max_tables = max_tables
+        self.tables = OrderedDict() # (versione, obiettivo, metrica) -> tabella, dalla meno recente
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last = None # Ultima tabella restituita, letta senza lock: (riferimento debole al grafo, obiettivo, metrica, grafo compilato, tabella)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def table(self, graph, goal, weight = 'energy'):
+        """
+        Restituisce la tabella dei costi verso un obiettivo, calcolandola se non è in cache.
+
+        Args:
+            graph (networkx.Graph): Il grafo che contiene i nodi.
+            goal (int): L'ID del nodo obiettivo.
+            weight (str, optional): La metrica di costo. Default è 'energy', il costo delle ricerche.
+
+        Returns:
+            tuple: Il grafo compilato e l'array dei costi verso l'obiettivo, per indice del nodo.
+        """
+        last = self.last
+        if last is not None and last[0]() is graph and last[1] == goal and last[2] == weight: # Stesso obiettivo della valutazione precedente
+            self.hits += 1
+            return last[3], last[4]
+        from compiled_graph import compile_graph # Import ritardati: il modulo compiled_graph importa questo modulo
+        from dijkstra import distances_to
+        compiled = compile_graph(graph)
+        key = (compiled.version, goal, weight)
+        with self.lock:
+            costs = self.tables.get(key)
+            if costs is not None:
+                self.tables.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if costs is None:
+            costs = distances_to(compiled, goal, weight)
+            with self.lock:
+                self.tables[key] = costs
+                while len(self.tables) > self.max_tables:
+                    self.tables.popitem(last=False)
+                    self.evictions += 1
+        self.last = (weakref.ref(graph), goal, weight, compiled, costs)
+        return compiled, costs
+
+    def cost(self, graph, node, goal, weight = 'energy'):
+        """
+        Restituisce il costo minimo da un nodo a un obiettivo.
+
+        Args:
+            graph (networkx.Graph): Il grafo che contiene i nodi.
+            node (int): L'ID del nodo.
+            goal (int): L'ID del nodo obiettivo.
+            weight (str, optional): La metrica di costo. Default è 'energy', il costo delle ricerche.
+
+        Returns:
+            float: Il costo minimo, infinito se l'obiettivo non è raggiungibile dal nodo.
+        """
+        compiled, costs = self.table(graph, goal, weight)
+        return float(costs[compiled.index[node]])
+
+    def clear(self):
+        """
+        Svuota la cache e azzera le statistiche.
+        """
+        with self.lock:
+            self.tables.clear()
+            self.last = None
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Restituisce le statistiche di utilizzo della cache.
+
+        Returns:
+            dict: Tabelle in memoria, richieste trovate e non trovate e tabelle eliminate.
+        """
+        with self.lock:
+            return {'tables': len(self.tables), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+_default_goal_tables = None
+
+def default_goal_tables():
+    """
+    Restituisce la cache delle tabelle dei costi predefinita, condivisa da tutte le ricerche del processo.
+
+    Returns:
+        GoalTables: La cache, creata alla prima richiesta.
+    """
+    global _default_goal_tables
+    if _default_goal_tables is None:
+        _default_goal_tables = GoalTables()
+    return _default_goal_tables
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
@@ -75,24 +200,119 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     Returns:
         float: La distanza haversine tra i due punti in chilometri.
     """
-    R = 6371.0 # Raggio della Terra in km
-
     # Conversione delle coordinate da gradi decimali a radianti
     lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
     lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
+    return haversine_radians(lat1_rad, math.radians(lon1), math.cos(lat1_rad), lat2_rad, math.radians(lon2), math.cos(lat2_rad))
+
+def haversine_radians(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2):
+    """
+    Calcola la distanza haversine tra due punti con coordinate già in radianti, con il modulo math.
+
+    È il percorso veloce per una sola coppia di punti, ad esempio in un'euristica: con i radianti e i coseni precalcolati servono solo due seni,
+    una radice e un arcoseno.
 
-    # Differenze di coordinate
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
+    Args:
+        lat1 (float): La latitudine del primo punto in radianti.
+        lon1 (float): La longitudine del primo punto in radianti.
+        cos_lat1 (float): Il coseno della latitudine del primo punto.
+        lat2 (float): La latitudine del secondo punto in radianti.
+        lon2 (float): La longitudine del secondo punto in radianti.
+        cos_lat2 (float): Il coseno della latitudine del secondo punto.
 
-    # Formula di Haversine
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    Returns:
+        float: La distanza tra i due punti in chilometri.
+    """
+    sin_dlat = math.sin((lat2 - lat1) / 2)
+    sin_dlon = math.sin((lon2 - lon1) / 2)
+    a = sin_dlat * sin_dlat + cos_lat1 * cos_lat2 * sin_dlon * sin_dlon # Prodotti invece di potenze e confronto invece di min(): più veloce su scalari
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a if a < 1.0 else 1.0))
+
+def haversine_array(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2):
+    """
+    Calcola la distanza haversine tra punti con coordinate già in radianti, con operazioni vettoriali NumPy.
+
+    Gli argomenti sono combinati con il broadcasting: uno scalare contro un array calcola le distanze di un punto da molti, due array della stessa
+    forma le distanze elemento per elemento, un array di forma (n, 1) contro uno di forma (m,) la matrice delle distanze (n, m).
+
+    Args:
+        lat1 (float or array): La latitudine dei primi punti in radianti.
+        lon1 (float or array): La longitudine dei primi punti in radianti.
+        cos_lat1 (float or array): Il coseno della latitudine dei primi punti.
+        lat2 (float or array): La latitudine dei secondi punti in radianti.
+        lon2 (float or array): La longitudine dei secondi punti in radianti.
+        cos_lat2 (float or array): Il coseno della latitudine dei secondi punti.
+
+    Returns:
+        numpy.ndarray: Le distanze in chilometri, nella forma del broadcasting degli argomenti.
+    """
+    a = np.sin((lat2 - lat1) / 2)**2 + cos_lat1 * cos_lat2 * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Calcola la distanza haversine tra un punto e molti punti.
+
+    Args:
+        lat (float): La latitudine del punto.
+        lon (float): La longitudine del punto.
+        lats (array): Le latitudini degli altri punti.
+        lons (array): Le longitudini degli altri punti.
+
+    Returns:
+        numpy.ndarray: La distanza di ogni punto dal primo in chilometri.
+    """
+    lat_rad = math.radians(lat)
+    lats_rad = np.radians(lats)
+    return haversine_array(lat_rad, math.radians(lon), math.cos(lat_rad), lats_rad, np.radians(lons), np.cos(lats_rad))
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """
+    Calcola la matrice delle distanze haversine tra due insiemi di punti.
+
+    Args:
+        lats1 (array): Le latitudini del primo insieme, di lunghezza n.
+        lons1 (array): Le longitudini del primo insieme.
+        lats2 (array): Le latitudini del secondo insieme, di lunghezza m.
+        lons2 (array): Le longitudini del secondo insieme.
+
+    Returns:
+        numpy.ndarray: La matrice (n, m) delle distanze in chilometri.
+    """
+    lats1_rad = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lats2_rad = np.radians(np.asarray(lats2, dtype=np.float64))
+    return haversine_array(lats1_rad, np.radians(np.asarray(lons1, dtype=np.float64))[:, None], np.cos(lats1_rad),
+                           lats2_rad, np.radians(np.asarray(lons2, dtype=np.float64)), np.cos(lats2_rad))
+
+_node_radians = weakref.WeakKeyDictionary() # Radianti dei nodi già calcolati, rilasciati insieme al grafo
+_last_radians = None # Ultimi radianti restituiti: (riferimento debole al grafo, radianti), letti senza cercare nel dizionario
+
+def node_radians(graph):
+    """
+    Restituisce latitudine, longitudine in radianti e coseno della latitudine di ogni nodo di un grafo, calcolati una sola volta per grafo.
+
+    I valori vengono ricalcolati se il numero di nodi del grafo cambia; le coordinate dei nodi non devono essere modificate.
+
+    Args:
+        graph (networkx.Graph): Il grafo, con le coordinate dei nodi negli attributi 'y' (latitudine) e 'x' (longitudine).
+
+    Returns:
+        dict: Per ogni ID di nodo, la tupla (lat_rad, lon_rad, cos_lat), da passare a `haversine_radians`.
+    """
+    global _last_radians
+    last = _last_radians
+    if last is not None and last[0]() is graph and len(last[1]) == len(graph): # Stesso grafo della chiamata precedente
+        return last[1]
+    radians = _node_radians.get(graph)
+    if radians is None or len(radians) != len(graph):
+        nodes = list(graph.nodes)
+        lat_rad = np.radians(np.fromiter((graph.nodes[node]['y'] for node in nodes), dtype=np.float64, count=len(nodes)))
+        lon_rad = np.radians(np.fromiter((graph.nodes[node]['x'] for node in nodes), dtype=np.float64, count=len(nodes)))
+        radians = dict(zip(nodes, zip(lat_rad.tolist(), lon_rad.tolist(), np.cos(lat_rad).tolist())))
+        _node_radians[graph] = radians
+    _last_radians = (weakref.ref(graph), radians)
+    return radians
 
-    return R * c # Distanza in km
-    
 def blind(start, goal) -> int:
     """
     Una funzione euristica cieca che restituisce sempre 0.
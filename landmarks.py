@@ -0,0 +1,160 @@
+import random
+import numpy as np
+from dijkstra import bounded_dijkstra
+"""
+Modulo landmarks.py
+
+Questo modulo fornisce l'euristica ALT (A*, Landmarks, Triangle inequality) basata su punti di riferimento (landmark).
+
+Per un piccolo insieme di landmark viene precalcolata, con una ricerca di Dijkstra, la distanza da ogni landmark a tutti i nodi del grafo,
+nella stessa metrica di costo usata dalla ricerca. Per la disuguaglianza triangolare, per ogni landmark L vale `d(a, b) >= |d(L, a) - d(L, b)|`
+su un grafo non diretto: il massimo di questi limiti è un'euristica ammissibile e consistente, molto più precisa della distanza haversine,
+che si calcola con pochi accessi ad array.
+
+Esempio di utilizzo:
+
+```python
+from landmarks import Landmarks
+
+landmarks = Landmarks.build(compile_graph(G), k = 8) # Preelaborazione (una sola volta)
+landmarks.save(store, "Brescia") # Salva le distanze insieme al grafo
+astar = AStar(G, landmarks.heuristic) # Euristica con la firma (node_a, node_b, graph)
+astar = CompiledAStar(compile_graph(G), landmarks.index_heuristic) # Euristica su indici
+```
+"""
+
+class Landmarks:
+    """
+    Tabelle delle distanze dai landmark per l'euristica ALT.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato, non diretto.
+        landmarks (array): Gli indici dei nodi scelti come landmark.
+        distances (array): Le distanze da ogni landmark a ogni nodo, di forma (numero di landmark, numero di nodi).
+        weight (str, optional): La metrica di costo delle distanze. Default è 'energy'.
+    """
+    def __init__(self, compiled_graph, landmarks, distances, weight = 'energy'):
+        self.compiled_graph = compiled_graph
+        self.weight = weight
+        self.landmarks = np.asarray(landmarks)
+        self.distances = np.asarray(distances)
+        self._rows = [tuple(row) for row in self.distances.T.tolist()] # Distanze di ogni nodo da tutti i landmark
+
+    @classmethod
+    def build(cls, compiled_graph, k = 8, weight = 'energy', seed = None):
+        """
+        Sceglie i landmark e calcola le tabelle delle distanze.
+
+        I landmark vengono scelti in modo da essere lontani tra loro (farthest selection): il primo è il nodo più lontano da un nodo casuale,
+        ogni successivo è il nodo con la massima distanza minima dai landmark già scelti. Servono k + 1 ricerche di Dijkstra sull'intero grafo.
+        I nodi non raggiungibili da un landmark hanno distanza 0, che mantiene l'euristica ammissibile.
+
+        Args:
+            compiled_graph (CompiledGraph): Il grafo compilato, non diretto.
+            k (int, optional): Il numero di landmark. Default è 8.
+            weight (str, optional): La metrica di costo delle distanze, la stessa usata dalla ricerca. Default è 'energy'.
+            seed (int, optional): Il seme per la scelta del nodo iniziale. Default è None.
+
+        Returns:
+            Landmarks: Le tabelle delle distanze.
+
+        Raises:
+            ValueError: Se il grafo è diretto.
+        """
+        if compiled_graph.directed:
+            raise ValueError("L'euristica ALT è supportata solo su grafi non diretti")
+        n = len(compiled_graph)
+        start = random.Random(seed).randrange(n)
+        distances = _distances_from(compiled_graph, start, weight)
+        landmarks = []
+        rows = []
+        nearest = np.full(n, np.inf) # Distanza minima di ogni nodo dai landmark scelti
+        for _ in range(min(k, n)):
+            landmark = int(np.argmax(nearest if landmarks else distances))
+            landmarks.append(landmark)
+            distances = _distances_from(compiled_graph, landmark, weight)
+            rows.append(distances)
+            nearest = np.minimum(nearest, distances)
+        return cls(compiled_graph, np.array(landmarks, dtype=np.int64), np.array(rows), weight)
+
+    def save(self, store, place, network_type = 'drive'):
+        """
+        Salva le tabelle nell'archivio dei grafi, insieme al grafo della località.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+        """
+        store.save_arrays(place, f"alt_{self.weight}", {'landmarks': self.landmarks, 'distances': self.distances}, network_type)
+
+    @classmethod
+    def load(cls, store, place, compiled_graph, weight = 'energy', network_type = 'drive'):
+        """
+        Carica le tabelle dall'archivio dei grafi.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            compiled_graph (CompiledGraph): Il grafo compilato della località.
+            weight (str, optional): La metrica di costo delle distanze. Default è 'energy'.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            Landmarks: Le tabelle delle distanze, o None se non sono presenti nell'archivio.
+        """
+        arrays = store.load_arrays(place, f"alt_{weight}", network_type)
+        if arrays is None:
+            return None
+        return cls(compiled_graph, weight=weight, **arrays)
+
+    def bound(self, i, j):
+        """
+        Calcola il limite inferiore ALT della distanza tra due nodi.
+
+        Args:
+            i (int): L'indice del primo nodo.
+            j (int): L'indice del secondo nodo.
+
+        Returns:
+            float: Il limite inferiore della distanza, nella metrica delle tabelle.
+        """
+        return max(abs(a - b) for a, b in zip(self._rows[i], self._rows[j]))
+
+    def index_heuristic(self, node_a, node_b, compiled_graph):
+        """
+        Euristica ALT su indici, da usare con CompiledAStar.
+
+        Args:
+            node_a (int): L'indice del primo nodo.
+            node_b (int): L'indice del secondo nodo.
+            compiled_graph (CompiledGraph): Il grafo compilato.
+
+        Returns:
+            float: Il limite inferiore della distanza tra i due nodi.
+        """
+        return self.bound(node_a, node_b)
+
+    def heuristic(self, node_a, node_b, graph):
+        """
+        Euristica ALT con la stessa firma delle funzioni del modulo heuristics, da usare con AStar.
+
+        Args:
+            node_a (int): L'ID del primo nodo.
+            node_b (int): L'ID del secondo nodo.
+            graph (networkx.Graph): Il grafo che contiene i nodi.
+
+        Returns:
+            float: Il limite inferiore della distanza tra i due nodi.
+        """
+        index = self.compiled_graph.index
+        return self.bound(index[node_a], index[node_b])
+
+def _distances_from(compiled_graph, source, weight):
+    """
+    Restituisce le distanze da un nodo a tutti i nodi, 0 per quelli non raggiungibili.
+    """
+    tree = bounded_dijkstra(compiled_graph, compiled_graph.node_list[source], weight = weight)
+    distances = np.zeros(len(compiled_graph))
+    distances[list(tree.costs.keys())] = list(tree.costs.values())
+    return distances
@@ -0,0 +1,162 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+"""
+Modulo leg_cache.py
+
+Questo modulo fornisce la classe LegCache, una cache LRU dei tratti di percorso già risolti, condivisa tra le ricerche sullo stesso grafo.
+
+Un tratto è identificato da (versione del grafo compilato, origine, destinazione, metrica di costo) e viene memorizzato in forma compatta:
+le posizioni CSR dei suoi archi (un array di interi a 32 bit) e i totali del coefficiente energetico e del tempo di percorrenza.
+La versione del grafo è `CompiledGraph.version`, diversa per ogni grafo compilato, per cui un grafo ricompilato non riusa i tratti di quello precedente.
+Sui grafi non diretti un tratto risolve anche il tratto inverso, con gli archi in ordine opposto.
+
+`ElectricVehicle.solve_leg` consulta la cache predefinita (`default_leg_cache()`) prima di eseguire A*, e `nearest_charging_station`
+vi inserisce il tratto verso la stazione scelta, calcolato da Dijkstra. Le statistiche di utilizzo sono restituite da `LegCache.stats`.
+
+Esempio di utilizzo:
+
+```python
+from leg_cache import default_leg_cache
+
+cache = default_leg_cache()
+solution = cache.get(compiled, start, goal) # Lista di azioni, o None se il tratto non è in cache
+cache.stats()['hit_rate']
+```
+"""
+
+class LegCache:
+    """
+    Cache LRU dei tratti di percorso risolti.
+
+    Args:
+        max_entries (int, optional): Il numero massimo di tratti memorizzati. Default è 4096.
+    """
+    def __init__(self, max_entries = 4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # (versione, origine, destinazione, metrica) -> (archi, energia, tempo), dal meno recente
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, compiled_graph, origin, destination, weight = 'energy'):
+        """
+        Cerca un tratto nella cache.
+
+        Args:
+            compiled_graph (CompiledGraph): Il grafo compilato.
+            origin (int): L'ID del nodo di origine.
+            destination (int): L'ID del nodo di destinazione.
+            weight (str, optional): La metrica di costo con cui è stato risolto il tratto. Default è 'energy'.
+
+        Returns:
+            tuple: Le posizioni CSR degli archi, il coefficiente energetico totale e il tempo totale, o None se il tratto non è in cache.
+        """
+        key = (compiled_graph.version, origin, destination, weight)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and not compiled_graph.directed: # Tratto inverso, percorribile al contrario
+                reverse = self.entries.get((compiled_graph.version, destination, origin, weight))
+                if reverse is not None:
+                    self.entries.move_to_end((compiled_graph.version, destination, origin, weight))
+                    entry = (self._reverse(compiled_graph, reverse[0], destination), reverse[1], reverse[2])
+            elif entry is not None:
+                self.entries.move_to_end(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get(self, compiled_graph, origin, destination, weight = 'energy'):
+        """
+        Cerca un tratto nella cache e lo restituisce come lista di azioni.
+
+        Args:
+            compiled_graph (CompiledGraph): Il grafo compilato.
+            origin (int): L'ID del nodo di origine.
+            destination (int): L'ID del nodo di destinazione.
+            weight (str, optional): La metrica di costo. Default è 'energy'.
+
+        Returns:
+            list: Le azioni `(u, v)` del tratto, nello stesso formato di AStar, o None se il tratto non è in cache.
+        """
+        entry = self.lookup(compiled_graph, origin, destination, weight)
+        if entry is None:
+            return None
+        path = [compiled_graph.index[origin]] + compiled_graph.targets[entry[0]].tolist()
+        return compiled_graph.actions(path)
+
+    def put(self, compiled_graph, origin, destination, solution, weight = 'energy'):
+        """
+        Memorizza un tratto risolto.
+
+        Args:
+            compiled_graph (CompiledGraph): Il grafo compilato.
+            origin (int): L'ID del nodo di origine.
+            destination (int): L'ID del nodo di destinazione.
+            solution (list): Le azioni `(u, v)` del tratto.
+            weight (str, optional): La metrica di costo con cui è stato risolto il tratto. Default è 'energy'.
+        """
+        index = compiled_graph.index
+        if solution:
+            u, v = np.array([(index[i], index[j]) for i, j in solution], dtype=np.int64).T
+            edges = compiled_graph.edge_indices(u, v).astype(np.int32)
+        else:
+            edges = np.zeros(0, dtype=np.int32)
+        entry = (edges, float(compiled_graph.energy[edges].sum()), float(compiled_graph.travel_time[edges].sum()))
+        key = (compiled_graph.version, origin, destination, weight)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Svuota la cache e azzera le statistiche.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Restituisce le statistiche di utilizzo della cache, senza attendere il lock: può essere chiamato dal ciclo di eventi del server.
+
+        I contatori letti durante un aggiornamento possono differire di una richiesta.
+
+        Returns:
+            dict: Tratti memorizzati, richieste trovate e non trovate, frazione di richieste trovate e tratti eliminati.
+        """
+        hits, misses = self.hits, self.misses
+        requests = hits + misses
+        return {'entries': len(self.entries), 'hits': hits, 'misses': misses, 'hit_rate': hits / requests if requests else 0.0,
+                'evictions': self.evictions}
+
+    def _reverse(self, compiled_graph, edges, origin):
+        """
+        Restituisce le posizioni CSR degli archi del tratto inverso di un grafo non diretto.
+        """
+        path = [compiled_graph.index[origin]] + compiled_graph.targets[edges].tolist()
+        path.reverse()
+        return compiled_graph.edge_indices(path[:-1], path[1:]).astype(np.int32)
+
+_default_leg_cache = None
+
+def default_leg_cache():
+    """
+    Restituisce la cache dei tratti predefinita, condivisa da tutte le ricerche del processo.
+
+    Returns:
+        LegCache: La cache, creata alla prima richiesta.
+    """
+    global _default_leg_cache
+    if _default_leg_cache is None:
+        _default_leg_cache = LegCache()
+    return _default_leg_cache
@@ -0,0 +1,178 @@
+import os
+import time
+import numpy as np
+from heuristics import EARTH_RADIUS
+from spatial_index import SpatialIndex
+"""
+Modulo map_rendering.py
+
+Questo modulo disegna la soluzione di un percorso su una mappa interattiva folium, mantenendo piccolo il file HTML anche sulle città grandi.
+
+- Ogni tratto del percorso (tra partenza, soste di ricarica e arrivo) è una sola polilinea con l'array delle coordinate, invece di una
+  polilinea per arco, e può essere semplificato con l'algoritmo di Ramer-Douglas-Peucker entro una tolleranza in metri.
+- Le stazioni di ricarica sono disegnate con un unico livello FastMarkerCluster, che riceve solo l'array delle coordinate, e sono limitate
+  a quelle entro un corridoio attorno al percorso.
+- `render_solution` salva la mappa e restituisce il tempo di disegno e la dimensione del file.
+
+La libreria folium viene importata solo quando si disegna una mappa.
+
+Esempio di utilizzo:
+
+```python
+from map_rendering import render_solution
+
+stats = render_solution(G, solution, start, end, stations, "path.html", stops = used_stations, tolerance = 5)
+print(stats['render_time'], stats['bytes'])
+```
+"""
+
+def route_legs(graph, solution, stops = None):
+    """
+    Divide il percorso in tratti, separati dalle soste di ricarica, e restituisce le coordinate dei nodi di ogni tratto.
+
+    Args:
+        graph (networkx.Graph): Il grafo in cui è stato trovato il percorso.
+        solution (list): La soluzione del percorso, come lista di coppie di nodi.
+        stops (list, optional): I nodi delle soste di ricarica. Default è nessuna sosta, un solo tratto.
+
+    Returns:
+        list: Per ogni tratto, un array NumPy di forma (numero di nodi, 2) con latitudine e longitudine.
+    """
+    if not solution:
+        return []
+    stops = set(stops or ())
+    nodes = graph.nodes
+    legs, leg = [], [solution[0][0]]
+    for u, v in solution:
+        leg.append(v)
+        if v in stops: # La sosta chiude il tratto e apre il successivo
+            legs.append(leg)
+            leg = [v]
+    if len(leg) > 1:
+        legs.append(leg)
+    return [np.array([(nodes[node]['y'], nodes[node]['x']) for node in leg]) for leg in legs]
+
+def simplify_line(points, tolerance):
+    """
+    Semplifica una linea con l'algoritmo di Ramer-Douglas-Peucker.
+
+    Le coordinate vengono proiettate localmente in metri (proiezione equirettangolare), sufficiente per la scala di una città.
+
+    Args:
+        points (numpy.ndarray): Le coordinate della linea, di forma (numero di punti, 2) con latitudine e longitudine.
+        tolerance (float): La distanza massima in metri tra la linea originale e quella semplificata. Se 0, la linea non viene semplificata.
+
+    Returns:
+        numpy.ndarray: Le coordinate dei punti mantenuti, con il primo e l'ultimo punto.
+    """
+    if tolerance <= 0 or len(points) < 3:
+        return points
+    lat0 = np.radians(points[:, 0].mean())
+    xy = np.radians(points[:, ::-1]) * EARTH_RADIUS * 1000 # Metri: (longitudine, latitudine)
+    xy[:, 0] *= np.cos(lat0)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack: # Versione iterativa, senza limiti di ricorsione sui percorsi lunghi
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = xy[last] - xy[first]
+        offsets = xy[first + 1:last] - xy[first]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        i = int(distances.argmax())
+        if distances[i] > tolerance:
+            middle = first + 1 + i
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return points[keep]
+
+def corridor_stations(graph, charging_stations, legs, corridor):
+    """
+    Seleziona le stazioni di ricarica entro un corridoio attorno al percorso.
+
+    Args:
+        graph (networkx.Graph): Il grafo che contiene le stazioni.
+        charging_stations (list): Gli ID dei nodi delle stazioni di ricarica.
+        legs (list): Le coordinate dei tratti del percorso, come restituite da `route_legs`.
+        corridor (float): La larghezza del corridoio in chilometri, da ogni lato del percorso. Se None, tutte le stazioni.
+
+    Returns:
+        numpy.ndarray: Le coordinate delle stazioni selezionate, di forma (numero di stazioni, 2).
+    """
+    nodes = graph.nodes
+    stations = np.array([(nodes[station]['y'], nodes[station]['x']) for station in charging_stations]).reshape(-1, 2)
+    if corridor is None or len(stations) == 0 or not legs:
+        return stations
+    points = np.concatenate(legs)
+    index = SpatialIndex(stations[:, 0], stations[:, 1])
+    selected = np.zeros(len(stations), dtype=bool)
+    for positions, _ in index.query_radius(points[:, 0], points[:, 1], corridor):
+        selected[positions] = True
+    return stations[selected]
+
+def draw_solution_on_map(graph, solution, start_node, end_node, charging_stations, stops = None, tolerance = 0, corridor = 2.0):
+    """
+    Disegna la soluzione del percorso su una mappa interattiva.
+
+    Ogni tratto del percorso è una sola polilinea; le stazioni di ricarica entro il corridoio sono raggruppate in un livello FastMarkerCluster
+    e le soste di ricarica hanno un marcatore dedicato.
+
+    Args:
+        graph (networkx.Graph): Il grafo in cui è stato trovato il percorso.
+        solution (list): La soluzione del percorso, come lista di coppie di nodi.
+        start_node (int): L'ID del nodo di partenza nel grafo.
+        end_node (int): L'ID del nodo di arrivo nel grafo.
+        charging_stations (list): Gli ID dei nodi delle stazioni di ricarica.
+        stops (list, optional): I nodi delle soste di ricarica, che dividono il percorso in tratti. Default è None.
+        tolerance (float, optional): La tolleranza di semplificazione delle polilinee in metri, 0 per non semplificarle. Default è 0.
+        corridor (float, optional): La larghezza in chilometri del corridoio delle stazioni disegnate, None per tutte. Default è 2.
+
+    Returns:
+        folium.Map: Una mappa interattiva con il percorso e i marcatori per partenza, arrivo, soste e stazioni di ricarica.
+    """
+    import folium # Import ritardati: la visualizzazione serve solo quando si disegna una mappa
+    from folium.plugins import FastMarkerCluster
+    nodes = graph.nodes
+    m = folium.Map(location=[nodes[start_node]['y'], nodes[start_node]['x']], tiles='CartoDB Positron', zoom_start=14)
+    legs = route_legs(graph, solution, stops)
+    colors = ('red', 'darkred')
+    for k, leg in enumerate(legs): # Una polilinea per tratto, con colori alternati
+        folium.PolyLine(locations=np.round(simplify_line(leg, tolerance), 6).tolist(), color=colors[k % 2], weight=2.5, opacity=1).add_to(m)
+    stations = corridor_stations(graph, charging_stations, legs, corridor)
+    if len(stations):
+        FastMarkerCluster(data=np.round(stations, 6).tolist(), name='Charging Stations').add_to(m)
+    for stop in stops or ():
+        folium.Marker(location=[nodes[stop]['y'], nodes[stop]['x']], popup=f'Charging Stop: {stop}', icon=folium.Icon(color='green', prefix='fa', icon='bolt')).add_to(m)
+    # Aggiungi marcatori per il nodo di partenza e di destinazione
+    folium.Marker(location=[nodes[start_node]['y'], nodes[start_node]['x']], popup='Start', icon=folium.Icon(color='blue', prefix='fa', icon='car')).add_to(m)
+    folium.Marker(location=[nodes[end_node]['y'], nodes[end_node]['x']], popup='End', icon=folium.Icon(color='red', prefix='fa', icon='map-pin')).add_to(m)
+    return m
+
+def render_solution(graph, solution, start_node, end_node, charging_stations, path, stops = None, tolerance = 0, corridor = 2.0):
+    """
+    Disegna la soluzione con `draw_solution_on_map`, salva la mappa in un file HTML e misura tempo e dimensione.
+
+    Args:
+        graph (networkx.Graph): Il grafo in cui è stato trovato il percorso.
+        solution (list): La soluzione del percorso, come lista di coppie di nodi.
+        start_node (int): L'ID del nodo di partenza nel grafo.
+        end_node (int): L'ID del nodo di arrivo nel grafo.
+        charging_stations (list): Gli ID dei nodi delle stazioni di ricarica.
+        path (str): Il file HTML in cui salvare la mappa.
+        stops (list, optional): I nodi delle soste di ricarica. Default è None.
+        tolerance (float, optional): La tolleranza di semplificazione delle polilinee in metri. Default è 0.
+        corridor (float, optional): La larghezza in chilometri del corridoio delle stazioni disegnate. Default è 2.
+
+    Returns:
+        dict: Il tempo di disegno e salvataggio in secondi e la dimensione del file in byte.
+    """
+    start = time.perf_counter()
+    m = draw_solution_on_map(graph, solution, start_node, end_node, charging_stations, stops, tolerance, corridor)
+    m.save(path)
+    return {'render_time': time.perf_counter() - start, 'bytes': os.path.getsize(path)}
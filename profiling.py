@@ -0,0 +1,109 @@
+import json
+import time
+"""
+Modulo profiling.py
+
+Questo modulo fornisce la classe SearchTrace, che raccoglie i contatori delle ricerche di un viaggio in una traccia leggibile da programma.
+
+Ogni evento è un dizionario con il nome dell'evento (`event`), l'istante in secondi dall'inizio della traccia (`t`) e i suoi campi;
+gli eventi vengono scritti come righe JSON (una per evento) su un file o su uno stream, oppure conservati in memoria nell'attributo `records`.
+`ElectricVehicle.adaptive_search` registra un evento 'leg' per ogni tratto, con i contatori della ricerca (nodi espansi, successori generati,
+valutazioni dell'euristica, dimensione massima della frontiera) e il tempo diviso tra ricerca del percorso e scelta della stazione;
+`ElectricVehicle.charging_search` registra un solo evento 'charging_search'.
+
+Senza traccia (`trace = None`, il default) i contatori restano negli attributi dell'algoritmo di ricerca e non viene registrato nulla.
+
+Esempio di utilizzo:
+
+```python
+from profiling import SearchTrace
+
+with SearchTrace("trace.jsonl") as trace:
+    electric_vehicle.trace = trace
+    electric_vehicle.adaptive_search(G, start, goal, 20)
+
+trace = SearchTrace() # In memoria
+electric_vehicle.trace = trace
+electric_vehicle.adaptive_search(G, start, goal, 20)
+trace.summary()['expanded'] # Nodi espansi in tutti i tratti
+```
+"""
+
+COUNTERS = ('expanded', 'generated', 'heuristic_calls', 'peak_frontier', 'search_time', 'station_time') # Campi sommati da SearchTrace.summary
+
+class SearchTrace:
+    """
+    Traccia degli eventi di ricerca, in righe JSON.
+
+    Args:
+        output (str or file, optional): Il file in cui scrivere la traccia, come percorso o come stream aperto in scrittura (ad esempio sys.stderr).
+            Se None, gli eventi vengono conservati in memoria in `records`. Default è None.
+    """
+    def __init__(self, output = None):
+        self.records = []
+        self.owned = isinstance(output, str) # Il file è stato aperto dalla traccia, che deve chiuderlo
+        self.stream = open(output, 'a') if self.owned else output
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, event, **fields):
+        """
+        Registra un evento.
+
+        Args:
+            event (str): Il nome dell'evento.
+            **fields: I campi dell'evento, serializzabili in JSON.
+
+        Returns:
+            dict: L'evento registrato.
+        """
+        record = {'event': event, 't': round(time.perf_counter() - self.start, 6), **fields}
+        if self.stream is None:
+            self.records.append(record)
+        else:
+            self.stream.write(json.dumps(record) + '\n')
+        return record
+
+    def search(self, event, algorithm, search_time, **fields):
+        """
+        Registra un evento con i contatori dell'ultima ricerca di un algoritmo.
+
+        Args:
+            event (str): Il nome dell'evento.
+            algorithm (SearchAlgorithm): L'algoritmo che ha eseguito la ricerca, o None se il risultato viene dalla cache dei tratti (contatori a zero).
+            search_time (float): Il tempo della ricerca in secondi.
+            **fields: Altri campi dell'evento.
+
+        Returns:
+            dict: L'evento registrato.
+        """
+        counters = algorithm.counters() if algorithm is not None else dict.fromkeys(COUNTERS[:4], 0)
+        return self.record(event, **counters, search_time = search_time, cached = algorithm is None, **fields)
+
+    def summary(self):
+        """
+        Somma i contatori degli eventi conservati in memoria; per la dimensione della frontiera restituisce il massimo.
+
+        Returns:
+            dict: Il numero di eventi (`events`) e i totali dei contatori di COUNTERS presenti negli eventi.
+        """
+        totals = {'events': len(self.records)}
+        for record in self.records:
+            for key in COUNTERS:
+                if key in record:
+                    totals[key] = max(totals.get(key, 0), record[key]) if key == 'peak_frontier' else totals.get(key, 0) + record[key]
+        return totals
+
+    def close(self):
+        """
+        Chiude il file della traccia, se è stato aperto dalla traccia; altrimenti svuota il buffer dello stream.
+        """
+        if self.owned:
+            self.stream.close()
+        elif self.stream is not None:
+            self.stream.flush()
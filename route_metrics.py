@@ -0,0 +1,169 @@
+import numpy as np
+from itertools import chain
+from compiled_graph import compile_graph
+"""
+Modulo route_metrics.py
+
+Questo modulo calcola energia, tempo e distanza di un percorso con operazioni vettoriali sugli array del grafo compilato.
+
+Il percorso, una lista di azioni `(u, v)`, viene convertito una sola volta nelle posizioni CSR dei suoi archi; le metriche sono poi somme
+cumulative NumPy, invece di cicli Python con `graph.edges[u, v]` su ogni arco. L'energia dipende dal veicolo solo per il fattore
+`electric_constant / temperatura`, per cui la stessa RouteMetrics serve per qualsiasi veicolo e temperatura, e `evaluate_vehicles` valuta molti veicoli insieme.
+
+Esempio di utilizzo:
+
+```python
+from route_metrics import evaluate_vehicles, route_metrics
+
+metrics = route_metrics(G, solution)
+energy = metrics.energy(electric_constant = 0.06, ambient_temperature = 20) # Energia totale in kWh
+k = metrics.first_exceeding(10, 0.06, 20) # Numero di archi percorribili prima di consumare più di 10 kWh
+table = evaluate_vehicles(metrics, capacities, constants, min_batteries, 20) # Un elemento per veicolo
+```
+"""
+
+class RouteMetrics:
+    """
+    Metriche di un percorso sul grafo compilato.
+
+    Gli attributi `energy_coefficient`, `time` e `distance` sono le somme cumulative lungo il percorso, lunghe quanto il percorso più uno:
+    l'elemento `k` è il valore dopo i primi `k` archi, quindi l'elemento 0 è sempre 0 e l'ultimo è il totale.
+
+    Args:
+        compiled_graph (CompiledGraph): Il grafo compilato.
+        solution (list): Il percorso, come lista di coppie di nodi.
+
+    Raises:
+        KeyError: Se un arco del percorso non esiste nel grafo.
+    """
+    def __init__(self, compiled_graph, solution):
+        self.compiled_graph = compiled_graph
+        if solution:
+            nodes = np.fromiter(map(compiled_graph.index.__getitem__, chain.from_iterable(solution)), dtype=np.int64, count=2 * len(solution))
+            self.edges = compiled_graph.edge_indices(nodes[0::2], nodes[1::2]) # Posizioni CSR degli archi del percorso
+        else:
+            self.edges = np.zeros(0, dtype=np.int64)
+        self.energy_coefficient = self._cumsum(compiled_graph.energy)
+        self.time = self._cumsum(compiled_graph.travel_time)
+        self.distance = self._cumsum(compiled_graph.length)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def _cumsum(self, weights):
+        """
+        Restituisce la somma cumulativa di un attributo degli archi lungo il percorso, con uno 0 iniziale.
+        """
+        cumulative = np.zeros(len(self.edges) + 1)
+        np.cumsum(weights[self.edges], out=cumulative[1:])
+        return cumulative
+
+    def cumulative_energy(self, electric_constant, ambient_temperature):
+        """
+        Restituisce l'energia consumata cumulativa lungo il percorso.
+
+        Args:
+            electric_constant (float): La costante elettrica del veicolo.
+            ambient_temperature (float): La temperatura ambiente.
+
+        Returns:
+            numpy.ndarray: L'energia in kWh dopo i primi `k` archi, per `k` da 0 alla lunghezza del percorso.
+        """
+        return self.energy_coefficient * (electric_constant / ambient_temperature)
+
+    def energy(self, electric_constant, ambient_temperature):
+        """
+        Restituisce l'energia consumata sull'intero percorso.
+
+        Args:
+            electric_constant (float): La costante elettrica del veicolo.
+            ambient_temperature (float): La temperatura ambiente.
+
+        Returns:
+            float: L'energia consumata in kWh.
+        """
+        return float(self.energy_coefficient[-1]) * electric_constant / ambient_temperature
+
+    @property
+    def total_time(self):
+        """
+        float: Il tempo di percorrenza dell'intero percorso in secondi.
+        """
+        return float(self.time[-1])
+
+    @property
+    def total_distance(self):
+        """
+        float: La lunghezza dell'intero percorso in metri.
+        """
+        return float(self.distance[-1])
+
+    def first_exceeding(self, energy, electric_constant, ambient_temperature, inclusive = False):
+        """
+        Trova il primo punto del percorso in cui l'energia consumata supera una soglia.
+
+        L'energia cumulativa non decresce lungo il percorso, per cui basta una ricerca binaria. Più soglie possono essere cercate insieme,
+        ad esempio le percentuali della batteria a cui tagliare il percorso.
+
+        Args:
+            energy (float or array): La soglia di energia in kWh, o un array di soglie.
+            electric_constant (float): La costante elettrica del veicolo.
+            ambient_temperature (float): La temperatura ambiente.
+            inclusive (bool, optional): Se True, conta anche il punto in cui l'energia consumata è uguale alla soglia, come la condizione
+                `energia < batteria utilizzabile` di ElectricVehicle.adaptive_search. Default è False.
+
+        Returns:
+            int or numpy.ndarray: Il numero di archi `k` tale che i primi `k` archi consumano più della soglia (o almeno la soglia,
+            se `inclusive`) e i primi `k - 1` no; la lunghezza del percorso più uno se la soglia non viene mai superata.
+        """
+        positions = np.searchsorted(self.energy_coefficient, np.asarray(energy) * ambient_temperature / electric_constant,
+                                    side='left' if inclusive else 'right')
+        return int(positions) if np.ndim(positions) == 0 else positions
+
+def route_metrics(graph, solution):
+    """
+    Calcola le metriche di un percorso sul grafo compilato associato a un grafo NetworkX.
+
+    Args:
+        graph (networkx.Graph): Il grafo in cui è stato trovato il percorso.
+        solution (list): Il percorso, come lista di coppie di nodi.
+
+    Returns:
+        RouteMetrics: Le metriche del percorso.
+    """
+    return RouteMetrics(compile_graph(graph), solution)
+
+def evaluate_vehicles(metrics, battery_capacity, electric_constant, min_battery, ambient_temperature, battery = None):
+    """
+    Valuta lo stesso percorso per molti veicoli in una sola passata vettoriale.
+
+    I parametri sono array (o scalari) con un elemento per veicolo, combinati con il broadcasting di NumPy. Il percorso viene percorso
+    senza ricariche: il numero di ricariche è il minimo necessario se il veicolo potesse ricaricare completamente in qualsiasi punto del
+    percorso, quindi un limite inferiore per `ElectricVehicle.adaptive_search`.
+
+    Args:
+        metrics (RouteMetrics): Le metriche del percorso.
+        battery_capacity (float or array): La capacità della batteria in kWh.
+        electric_constant (float or array): La costante elettrica del veicolo.
+        min_battery (float or array): Il livello minimo di batteria da mantenere in kWh.
+        ambient_temperature (float or array): La temperatura ambiente, limitata ad almeno 1 come in `evopt` e nell'interfaccia grafica.
+        battery (float or array, optional): Il livello della batteria alla partenza in kWh. Default è la batteria carica.
+
+    Returns:
+        dict: Un array per campo, con un elemento per veicolo: `energy` (energia consumata in kWh), `battery` (batteria all'arrivo senza ricariche),
+        `feasible` (True se il veicolo arriva senza scendere sotto `min_battery`), `recharges` (ricariche necessarie) e `first_stop`
+        (numero di archi dopo cui il veicolo raggiunge `min_battery`, la lunghezza del percorso più uno se non succede).
+    """
+    battery_capacity, electric_constant, min_battery, ambient_temperature = np.broadcast_arrays(
+        *(np.asarray(value, dtype=np.float64) for value in (battery_capacity, electric_constant, min_battery, ambient_temperature)))
+    ambient_temperature = np.maximum(ambient_temperature, 1) # Con temperature non positive il consumo sarebbe negativo o infinito
+    battery = battery_capacity if battery is None else np.broadcast_to(np.asarray(battery, dtype=np.float64), battery_capacity.shape)
+    energy = metrics.energy_coefficient[-1] * electric_constant / ambient_temperature
+    usable = battery - min_battery # Energia utilizzabile prima della prima ricarica
+    # Il veicolo arriva se l'energia consumata resta minore di quella utilizzabile, come in ElectricVehicle.adaptive_search:
+    # la stessa ricerca dà il punto in cui la raggiunge, così `feasible` e `first_stop` non possono essere in disaccordo
+    first_stop = np.asarray(metrics.first_exceeding(usable, electric_constant, ambient_temperature, inclusive = True))
+    feasible = first_stop > len(metrics)
+    recharges = np.ceil(np.maximum(energy - usable, 0) / np.maximum(battery_capacity - min_battery, 1e-9)) # Ricariche complete dopo la prima tratta
+    return {'energy': energy, 'battery': battery - energy, 'feasible': feasible,
+            'recharges': np.where(feasible, 0, np.maximum(recharges, 1)).astype(np.int64), 'first_stop': first_stop}
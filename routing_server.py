@@ -0,0 +1,373 @@
+import argparse
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from batch_routing import COLUMNS, route_trip
+from charging_stations import place_charging_stations, station_registry
+from electric_vehicle import electric_vehicle_data
+from compiled_graph import compile_graph
+from graph_store import GraphStore
+from leg_cache import default_leg_cache
+from spatial_index import node_index
+from station_matrix import station_matrix
+"""
+Modulo routing_server.py
+
+Questo modulo fornisce un server di calcolo dei percorsi sempre attivo, basato su asyncio, che risponde a richieste HTTP con risultati JSON.
+
+Il server mantiene in memoria i grafi elaborati di più località in un GraphPool con politica LRU, così le richieste successive sulla stessa località
+non pagano il caricamento del grafo, la compilazione e la costruzione degli indici. Funziona solo con i grafi già presenti nell'archivio locale
+(GraphStore), senza accesso alla rete. Il caricamento di una località avviene fuori dal lock del GraphPool, che protegge solo l'aggiornamento
+dei dizionari, e il ciclo di eventi non attende mai un lock.
+
+Le ricerche vengono eseguite in un pool di thread, così il ciclo di eventi resta reattivo; più ricerche possono usare lo stesso grafo
+contemporaneamente, perchè le stazioni usate da ogni viaggio sono tracciate solo nella disponibilità del viaggio. Le ricerche sono in Python
+puro e il GIL le serializza: i thread non calcolano più percorsi in parallelo, ma evitano che una ricerca lunga blocchi le altre richieste.
+Per sfruttare più core si avviano più processi del server, ognuno con il proprio GraphPool sullo stesso archivio.
+
+Endpoint:
+
+- `GET /health`: stato del server, località in memoria e statistiche della cache dei tratti.
+- `POST /route`: un viaggio, `{"place", "start", "end", "vehicle", "battery", "temperature", "search"}`.
+- `POST /batch`: più viaggi sulla stessa località, `{"place", "jobs": [{"start", "end", "vehicle", "battery", "temperature"}, ...], "search"}`.
+
+Partenza e arrivo sono coppie `[lat, lon]` oppure ID di nodi del grafo; `battery` è la percentuale minima di batteria da mantenere.
+
+Esempio di utilizzo:
+
+```bash
+python3 routing_server.py --port 8080 --preload Brescia
+curl -X POST localhost:8080/route -d '{"place": "Brescia", "start": [45.5416, 10.2118], "end": [45.5646, 10.2318]}'
+```
+"""
+
+DEFAULT_VEHICLE = "Tesla Model 3 Standard Range Plus"
+MAX_BODY = 16 * 1024**2 # Dimensione massima del corpo di una richiesta in byte
+
+class GraphPool:
+    """
+    Insieme dei grafi in memoria, con politica LRU.
+
+    I grafi vengono letti solo dall'archivio locale. Alla prima richiesta di una località il grafo viene caricato, vengono impostate le stazioni
+    di ricarica con un seme fisso (così sono le stesse a ogni riavvio) e vengono costruiti grafo compilato, registro delle stazioni, indice spaziale
+    e matrice delle stazioni (letta dall'archivio se presente).
+
+    Il caricamento avviene fuori dal lock: le richieste concorrenti della stessa località attendono lo stesso caricamento (un Future per località),
+    mentre le richieste delle località già in memoria non attendono.
+
+    Args:
+        store (GraphStore): L'archivio dei grafi.
+        max_graphs (int, optional): Il numero massimo di grafi in memoria. Default è 4.
+        num_charging_stations (int, optional): Il numero di stazioni di ricarica per grafo. Se 0, il 10% dei nodi. Default è 0.
+        seed (int, optional): Il seme per la scelta delle stazioni di ricarica. Default è 0.
+    """
+    def __init__(self, store, max_graphs = 4, num_charging_stations = 0, seed = 0):
+        self.store = store
+        self.max_graphs = max_graphs
+        self.num_charging_stations = num_charging_stations
+        self.seed = seed
+        self.graphs = OrderedDict() # Località -> grafo, dal meno recente al più recente
+        self.loading = {} # Località -> Future del caricamento in corso
+        self.lock = threading.Lock() # Protegge solo gli aggiornamenti di `graphs` e `loading`
+        self._places = () # Località in memoria, sostituita a ogni aggiornamento e letta senza lock
+
+    def __contains__(self, place):
+        return place in self.graphs
+
+    def places(self):
+        """
+        Restituisce le località in memoria, senza attendere il lock: può essere chiamato dal ciclo di eventi.
+
+        Returns:
+            list: Le località, dalla meno recente alla più recente.
+        """
+        return list(self._places)
+
+    def get(self, place):
+        """
+        Restituisce il grafo di una località, caricandolo dall'archivio se non è in memoria.
+
+        Args:
+            place (str): Il nome della località.
+
+        Returns:
+            networkx.Graph: Il grafo con le stazioni di ricarica.
+
+        Raises:
+            LookupError: Se la località non è nell'archivio.
+        """
+        with self.lock:
+            graph = self.graphs.get(place)
+            if graph is not None:
+                self.graphs.move_to_end(place)
+                self._places = tuple(self.graphs)
+                return graph
+            future = self.loading.get(place)
+            owner = future is None
+            if owner: # Primo a richiedere la località: la carica
+                future = self.loading[place] = Future()
+        if not owner: # Caricamento già in corso in un altro thread
+            return future.result()
+        try:
+            graph = self.load(place)
+        except BaseException as e:
+            with self.lock:
+                del self.loading[place]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.loading[place]
+            self.graphs[place] = graph
+            while len(self.graphs) > self.max_graphs: # Rilascia i grafi meno recenti
+                self.graphs.popitem(last=False)
+            self._places = tuple(self.graphs)
+        future.set_result(graph)
+        return graph
+
+    def load(self, place):
+        """
+        Carica il grafo di una località dall'archivio e costruisce le strutture usate dalle ricerche, senza aggiungerlo al pool.
+
+        Args:
+            place (str): Il nome della località.
+
+        Returns:
+            networkx.Graph: Il grafo con le stazioni di ricarica.
+
+        Raises:
+            LookupError: Se la località non è nell'archivio.
+        """
+        graph = self.store.load_graph(place)
+        if graph is None:
+            raise LookupError(f"{place} non è nell'archivio dei grafi")
+        num_charging_stations = self.num_charging_stations if self.num_charging_stations > 0 else int(len(graph) * 0.1)
+        place_charging_stations(graph, num_charging_stations, self.seed)
+        compile_graph(graph) # Costruisce subito le strutture usate dalle ricerche
+        station_registry(graph)
+        node_index(graph)
+        station_matrix(graph, store = self.store, place = place) # Per le ricerche 'stations', preparata con il grafo e non dalle ricerche
+        return graph
+
+class RoutingServer:
+    """
+    Server HTTP asyncio per il calcolo dei percorsi.
+
+    Args:
+        pool (GraphPool): I grafi in memoria.
+        workers (int, optional): Il numero di thread che eseguono le ricerche. Le ricerche sono serializzate dal GIL, per cui i thread
+            mantengono il server reattivo ma non aumentano il numero di percorsi calcolati al secondo. Default è 4.
+    """
+    def __init__(self, pool, workers = 4):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def resolve(self, graph, location):
+        """
+        Converte una partenza o un arrivo nell'ID del nodo del grafo.
+
+        Args:
+            graph (networkx.Graph): Il grafo della località.
+            location (list or int): Una coppia `[lat, lon]` o l'ID di un nodo.
+
+        Returns:
+            int: L'ID del nodo.
+
+        Raises:
+            ValueError: Se la località non è valida o il nodo non esiste.
+        """
+        if isinstance(location, (list, tuple)) and len(location) == 2:
+            return node_index(graph).nearest(float(location[0]), float(location[1]))
+        if location in graph:
+            return location
+        raise ValueError(f"Località non valida: {location!r}")
+
+    def job(self, graph, request):
+        """
+        Converte un viaggio della richiesta nel formato di `batch_routing.route_trip`.
+
+        Args:
+            graph (networkx.Graph): Il grafo della località.
+            request (dict): Il viaggio, con `start`, `end` e i campi facoltativi `vehicle`, `temperature` e `battery`.
+
+        Returns:
+            tuple: Il viaggio `(start, end, vehicle, temperature, min_battery_percent)`.
+
+        Raises:
+            ValueError: Se mancano partenza o arrivo o se il modello del veicolo non esiste.
+        """
+        if 'start' not in request or 'end' not in request:
+            raise ValueError("Partenza e arrivo sono obbligatori")
+        vehicle = request.get('vehicle', DEFAULT_VEHICLE)
+        if isinstance(vehicle, str) and vehicle not in electric_vehicle_data:
+            raise ValueError(f"Veicolo sconosciuto: {vehicle}")
+        return (self.resolve(graph, request['start']), self.resolve(graph, request['end']), vehicle,
+                max(float(request.get('temperature', 20)), 1), float(request.get('battery', 20)))
+
+    def route(self, request):
+        """
+        Calcola un viaggio. Eseguito in un thread del pool.
+
+        Args:
+            request (dict): Il corpo della richiesta `/route`.
+
+        Returns:
+            dict: Il risultato del viaggio, con il percorso come lista di ID dei nodi.
+        """
+        graph = self.pool.get(request['place'])
+        result = route_trip(graph, self.job(graph, request), request.get('search', 'adaptive'))
+        result['path'] = _nodes(result['path'])
+        return result
+
+    def batch(self, request):
+        """
+        Calcola più viaggi sulla stessa località. Eseguito in un thread del pool.
+
+        Args:
+            request (dict): Il corpo della richiesta `/batch`.
+
+        Returns:
+            dict: I risultati in forma colonnare, come `batch_routing.route_batch`, con i percorsi come liste di ID dei nodi.
+        """
+        if not isinstance(request.get('jobs'), list):
+            raise ValueError("La lista dei viaggi è obbligatoria")
+        graph = self.pool.get(request['place'])
+        search = request.get('search', 'adaptive')
+        rows = [route_trip(graph, self.job(graph, job), search) for job in request['jobs']]
+        for row in rows:
+            row['path'] = _nodes(row['path'])
+        return {column: [row[column] for row in rows] for column in COLUMNS}
+
+    async def dispatch(self, method, path, body):
+        """
+        Gestisce una richiesta e restituisce lo stato HTTP e il corpo della risposta.
+
+        Args:
+            method (str): Il metodo HTTP.
+            path (str): Il percorso della richiesta.
+            body (bytes): Il corpo della richiesta.
+
+        Returns:
+            tuple: Lo stato HTTP e il dizionario da restituire in JSON.
+        """
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'places': self.pool.places(), 'leg_cache': default_leg_cache().stats()}
+        handlers = {'/route': self.route, '/batch': self.batch}
+        if method != 'POST' or path not in handlers:
+            return 404, {'error': f"Endpoint non trovato: {method} {path}"}
+        try:
+            request = json.loads(body or b'{}')
+            if 'place' not in request:
+                raise ValueError("La località è obbligatoria")
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, handlers[path], request)
+        except (KeyError, IndexError, ValueError, TypeError) as e: # Campi mancanti o non validi, compresi gli errori di decodifica JSON
+            return 400, {'error': str(e)}
+        except LookupError as e: # Località non presente nell'archivio
+            return 404, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+        if path == '/route' and result['error'] is not None:
+            return 422, result
+        return 200, result
+
+    async def handle(self, reader, writer):
+        """
+        Gestisce una connessione: legge una richiesta HTTP/1.1, risponde e chiude la connessione.
+
+        Args:
+            reader (asyncio.StreamReader): Il flusso in lettura della connessione.
+            writer (asyncio.StreamWriter): Il flusso in scrittura della connessione.
+        """
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if len(request_line) < 2:
+                status, response = 400, {'error': "Richiesta non valida"}
+            elif length > MAX_BODY:
+                status, response = 413, {'error': "Richiesta troppo grande"}
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, response = await self.dispatch(request_line[0].upper(), request_line[1].split('?')[0], body)
+            payload = json.dumps(response, default=_json_default).encode()
+            writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # Connessione chiusa dal client o intestazioni non valide
+        finally:
+            writer.close()
+
+    async def serve(self, host = '127.0.0.1', port = 8080, unix_socket = None):
+        """
+        Avvia il server e risponde alle richieste fino all'interruzione.
+
+        Args:
+            host (str, optional): L'indirizzo su cui ascoltare. Default è '127.0.0.1'.
+            port (int, optional): La porta su cui ascoltare. Default è 8080.
+            unix_socket (str, optional): Il percorso di un socket Unix su cui ascoltare al posto di host e porta. Default è None.
+        """
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+def _nodes(solution):
+    """
+    Converte una lista di azioni `(u, v)` nella lista dei nodi del percorso, None se non c'è percorso.
+    """
+    if solution is None:
+        return None
+    if not solution:
+        return []
+    return [solution[0][0]] + [v for u, v in solution]
+
+def _json_default(value):
+    """
+    Converte in JSON gli scalari NumPy, come gli ID dei nodi restituiti dall'indice spaziale.
+    """
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Tipo non serializzabile: {type(value).__name__}")
+
+def main(argv = None):
+    """
+    Avvia il server di calcolo dei percorsi da riga di comando.
+
+    Args:
+        argv (list, optional): Gli argomenti da riga di comando. Default sono quelli del processo.
+    """
+    parser = argparse.ArgumentParser(description="Server di calcolo dei percorsi di EVOPT-Maps")
+    parser.add_argument('--host', default='127.0.0.1', help="L'indirizzo su cui ascoltare")
+    parser.add_argument('--port', type=int, default=8080, help="La porta su cui ascoltare")
+    parser.add_argument('--unix', help="Il percorso di un socket Unix su cui ascoltare al posto di host e porta")
+    parser.add_argument('--store', default='graph_store', help="La cartella dell'archivio dei grafi")
+    parser.add_argument('--max-graphs', type=int, default=4, help="Il numero massimo di grafi in memoria")
+    parser.add_argument('--workers', type=int, default=4, help="Il numero di thread per le ricerche")
+    parser.add_argument('--stations', type=int, default=0, help="Il numero di stazioni di ricarica per grafo, 0 per il 10%% dei nodi")
+    parser.add_argument('--seed', type=int, default=0, help="Il seme per la scelta delle stazioni di ricarica")
+    parser.add_argument('--preload', nargs='*', default=[], help="Le località da caricare all'avvio")
+    args = parser.parse_args(argv)
+
+    pool = GraphPool(GraphStore(args.store), args.max_graphs, args.stations, args.seed)
+    for place in args.preload:
+        pool.get(place)
+    server = RoutingServer(pool, args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
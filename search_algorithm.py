@@ -10,6 +10,8 @@ class Node:
         action (any, optional): L'azione che ha portato a questo stato. Default a None.
         g (int or float, optional): Il costo del percorso per arrivare a questo nodo. Default a 0.
     """
+    __slots__ = ('state', 'parent', 'action', 'g') # Niente __dict__ per nodo: meno memoria e allocazioni più veloci
+
     def __init__(self, state, parent = None, action = None, g = 0):
         self.state = state
         self.parent = parent
@@ -22,6 +24,10 @@ class SearchAlgorithm:
 
     Questa classe definisce l'interfaccia comune per tutti gli algoritmi di ricerca. Gli algoritmi specifici dovrebbero estendere questa classe e implementare il metodo `solve`.
 
+    Oltre ai nodi espansi, ogni ricerca registra alla fine il numero di successori generati, di valutazioni dell'euristica e la dimensione
+    massima della frontiera (`generated`, `heuristic_calls`, `peak_frontier`). I contatori sono variabili locali della ricerca,
+    copiate negli attributi solo al termine, per cui non rallentano il ciclo principale; `profiling.SearchTrace` li raccoglie per ogni tratto.
+
     Args:
         view (bool, optional): Se True, visualizza l'output dell'algoritmo. Default a False.
     """
@@ -29,6 +35,9 @@ class SearchAlgorithm:
         self.expanded = 0 # Numero di nodi espansi
         self.expanded_states = set() # Insieme degli stati espansi
         self.view = view # Visualizzazione
+        self.generated = 0 # Numero di successori generati
+        self.heuristic_calls = 0 # Numero di valutazioni dell'euristica
+        self.peak_frontier = 0 # Dimensione massima della frontiera
 
     def solve(self, problem):
         """
@@ -66,21 +75,45 @@ class SearchAlgorithm:
         if self.view:
             self.expanded_states = set()
         self.expanded = 0
+        self.generated = self.heuristic_calls = self.peak_frontier = 0
+
+    def update_counters(self, generated, heuristic_calls, peak_frontier):
+        """
+        Registra i contatori di una ricerca terminata.
+
+        Args:
+            generated (int): Il numero di successori generati.
+            heuristic_calls (int): Il numero di valutazioni dell'euristica.
+            peak_frontier (int): La dimensione massima della frontiera.
+        """
+        self.generated = generated
+        self.heuristic_calls = heuristic_calls
+        self.peak_frontier = peak_frontier
+
+    def counters(self):
+        """
+        Restituisce i contatori dell'ultima ricerca.
+
+        Returns:
+            dict: Nodi espansi, successori generati, valutazioni dell'euristica e dimensione massima della frontiera.
+        """
+        return {'expanded': self.expanded, 'generated': self.generated, 'heuristic_calls': self.heuristic_calls, 'peak_frontier': self.peak_frontier}
 
     def extract_solution(self, node):
         """
         Estrae la soluzione a partire da un nodo.
 
-        Questo metodo dovrebbe essere implementato dalle sottoclassi.
+        Risale i genitori fino al nodo iniziale raccogliendo le azioni, che vengono poi invertite: il costo è lineare nella lunghezza del percorso.
 
         Args:
             node (Node): Il nodo finale da cui estrarre la soluzione.
 
-        Raises:
-            NotImplementedError: Se il metodo non è stato implementato dalla sottoclasse.
+        Returns:
+            list: La lista di azioni dal nodo iniziale al nodo finale.
         """
         solution = []
         while node.parent is not None:
-            solution.insert(0, node.action)
+            solution.append(node.action)
             node = node.parent
+        solution.reverse()
         return solution
@@ -33,17 +33,16 @@ class SearchProblem:
             state (int): L'ID del nodo di cui ottenere i successori.
 
         Returns:
-            set: Un insieme di tuple, ognuna delle quali contiene un'azione, un successore, l'energia consumata per raggiungere il successore e il tempo impiegato.
+            list: Una lista di tuple, ognuna delle quali contiene un'azione, un successore, l'energia consumata per raggiungere il successore e il tempo impiegato.
         """
-        successors = set()
-        for neighbor in self.graph.neighbors(state):
-            edge_data = self.graph.edges[state, neighbor]
+        successors = []
+        for neighbor, edge_data in self.graph.adj[state].items(): # Vicini e dati degli archi in un solo accesso
             action = (state, neighbor)
             distance = edge_data.get('length', 100) # Distanza in metri
             speed = edge_data.get('speed_kph', 50)  # Velocità in km/h
             energy_consumed = (distance / 1000) * speed # d(km) * v(km/h) manca costante elettrica / temperatura
             time = edge_data.get('travel_time', 10) # Tempo di percorrenza in secondi
-            successors.add((action, neighbor, energy_consumed, time))
+            successors.append((action, neighbor, energy_consumed, time))
         return successors
     
     def isGoal(self, state):
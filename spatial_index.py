@@ -0,0 +1,110 @@
+import numpy as np
+from weakref import WeakKeyDictionary
+from compiled_graph import compile_graph
+from heuristics import EARTH_RADIUS
+"""
+Modulo spatial_index.py
+
+Questo modulo fornisce la classe SpatialIndex, un indice spaziale su coordinate geografiche basato su un BallTree con metrica haversine.
+
+L'indice viene costruito una sola volta e supporta ricerche dei k punti più vicini e ricerche entro un raggio per molte coordinate alla volta.
+La funzione `node_index` restituisce l'indice dei nodi di un grafo, costruito alla prima richiesta e poi riutilizzato.
+
+Esempio di utilizzo:
+
+```python
+from spatial_index import node_index
+
+index = node_index(G) # Indice dei nodi del grafo (costruito una sola volta)
+node = index.nearest(45.54, 10.22) # Nodo più vicino a un punto
+nodes, distances = index.query([45.54, 45.55], [10.22, 10.23], k=3) # 3 nodi più vicini a due punti
+```
+"""
+
+class SpatialIndex:
+    """
+    Indice spaziale su coordinate geografiche.
+
+    Le distanze sono calcolate con la formula haversine e restituite in chilometri.
+
+    Args:
+        lat (array): La latitudine di ogni punto.
+        lon (array): La longitudine di ogni punto.
+        ids (array, optional): L'identificativo restituito per ogni punto, ad esempio l'ID del nodo. Default è la posizione del punto.
+        leaf_size (int, optional): La dimensione delle foglie del BallTree. Default è 40.
+    """
+    def __init__(self, lat, lon, ids = None, leaf_size = 40):
+        from sklearn.neighbors import BallTree # Import ritardato: scikit-learn serve solo quando si costruisce un indice
+        self.ids = np.arange(len(lat)) if ids is None else np.asarray(ids)
+        self.tree = BallTree(np.radians(np.column_stack([lat, lon])), leaf_size=leaf_size, metric='haversine')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, lats, lons, k = 1):
+        """
+        Trova i k punti più vicini a ciascuna delle coordinate date.
+
+        Args:
+            lats (array): Le latitudini delle coordinate da cercare.
+            lons (array): Le longitudini delle coordinate da cercare.
+            k (int, optional): Il numero di punti da restituire per ogni coordinata. Default è 1.
+
+        Returns:
+            tuple: Gli identificativi dei punti più vicini e le loro distanze in chilometri, entrambi di forma (numero di coordinate, k).
+        """
+        distances, positions = self.tree.query(self._radians(lats, lons), k=k)
+        return self.ids[positions], distances * EARTH_RADIUS
+
+    def query_radius(self, lats, lons, radius):
+        """
+        Trova i punti entro un raggio da ciascuna delle coordinate date.
+
+        Args:
+            lats (array): Le latitudini delle coordinate da cercare.
+            lons (array): Le longitudini delle coordinate da cercare.
+            radius (float or array): Il raggio in chilometri, uno solo o uno per coordinata.
+
+        Returns:
+            list: Per ogni coordinata, una tupla con gli identificativi dei punti entro il raggio e le loro distanze in chilometri, dal più vicino.
+        """
+        positions, distances = self.tree.query_radius(self._radians(lats, lons), r=np.asarray(radius) / EARTH_RADIUS, return_distance=True, sort_results=True)
+        return [(self.ids[p], d * EARTH_RADIUS) for p, d in zip(positions, distances)]
+
+    def nearest(self, lat, lon):
+        """
+        Trova il punto più vicino a una coordinata.
+
+        Args:
+            lat (float): La latitudine della coordinata.
+            lon (float): La longitudine della coordinata.
+
+        Returns:
+            object: L'identificativo del punto più vicino.
+        """
+        ids, _ = self.query([lat], [lon], k=1)
+        return ids[0][0].item()
+
+    def _radians(self, lats, lons):
+        return np.radians(np.column_stack([np.atleast_1d(lats), np.atleast_1d(lons)]))
+
+_node_indexes = WeakKeyDictionary() # Indici già costruiti, rilasciati insieme al grafo compilato
+
+def node_index(graph):
+    """
+    Restituisce l'indice spaziale dei nodi di un grafo, costruendolo alla prima richiesta.
+
+    L'indice è associato al grafo compilato, per cui viene condiviso da tutte le richieste sullo stesso grafo.
+
+    Args:
+        graph (networkx.Graph): Il grafo di cui indicizzare i nodi.
+
+    Returns:
+        SpatialIndex: L'indice dei nodi, che restituisce gli ID dei nodi.
+    """
+    compiled = compile_graph(graph)
+    index = _node_indexes.get(compiled)
+    if index is None:
+        index = SpatialIndex(compiled.lat, compiled.lon, compiled.nodes)
+        _node_indexes[compiled] = index
+    return index
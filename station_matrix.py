@@ -0,0 +1,260 @@
+from heapq import heappush, heappop
+from weakref import WeakKeyDictionary
+import numpy as np
+from charging_stations import station_registry
+from dijkstra import bounded_dijkstra
+"""
+Modulo station_matrix.py
+
+Questo modulo fornisce la classe StationMatrix, un grafo sparso precalcolato del costo energetico e del tempo di percorrenza tra le stazioni
+di ricarica adiacenti: due stazioni sono collegate solo se il cammino minimo tra loro non attraversa altre stazioni.
+
+I cammini minimi tra stazioni lontane si scompongono nelle stazioni che attraversano, per cui i collegamenti tra stazioni adiacenti bastano
+a ricostruire esattamente il costo tra qualsiasi coppia di stazioni, con poche decine di collegamenti per stazione invece di uno per ogni coppia.
+La preelaborazione esegue da ogni stazione una ricerca di Dijkstra che non attraversa le altre stazioni, quindi limitata alle stazioni vicine,
+e può essere salvata nell'archivio dei grafi insieme al grafo.
+
+Con la matrice, la scelta delle soste di un viaggio lungo diventa una piccola ricerca sul grafo delle stazioni: sulla rete stradale vengono
+calcolati al momento della richiesta solo il primo tratto (dalla partenza alle stazioni raggiungibili) e l'ultimo (dalle stazioni all'arrivo),
+invece di una ricerca A* e di una scelta greedy della stazione per ogni sosta come in `ElectricVehicle.adaptive_search`.
+
+I costi sono coefficienti energetici, come nel grafo compilato: l'energia in kWh di un veicolo si ottiene moltiplicando per
+`electric_constant / temperatura`, per cui la stessa matrice serve per qualsiasi veicolo e temperatura.
+
+La matrice non viene mai costruita durante una richiesta: va preparata prima, con `StationMatrix.build` o con `station_matrix`,
+che la legge dall'archivio o la costruisce e la salva.
+
+Esempio di utilizzo:
+
+```python
+from station_matrix import StationMatrix, station_matrix
+
+matrix = StationMatrix.build(station_registry(G)) # Preelaborazione (una sola volta per insieme di stazioni)
+matrix.save(store, "Brescia") # Salva la matrice insieme al grafo
+matrix = station_matrix(G, store = store, place = "Brescia") # Dalla memoria o dall'archivio, altrimenti la costruisce e la salva
+stops, energy, time = matrix.plan(start, goal, first_range, full_range) # Soste e costi dei tratti
+```
+"""
+
+class StationMatrix:
+    """
+    Grafo sparso dei costi tra le stazioni di ricarica adiacenti di un grafo non diretto.
+
+    I collegamenti sono memorizzati in formato CSR sulle posizioni del registro delle stazioni: i collegamenti dalla stazione in posizione `k`
+    occupano le posizioni da `offsets[k]` a `offsets[k + 1]` (esclusa), dalla stazione più vicina, con la posizione della stazione di arrivo
+    in `targets`, il coefficiente energetico minimo in `energy` e il tempo di percorrenza lungo quel cammino in `time`.
+
+    Args:
+        registry (StationRegistry): Il registro delle stazioni del grafo.
+        max_cost (float): Il coefficiente energetico massimo dei collegamenti memorizzati.
+        offsets (array): Gli offset CSR dei collegamenti di ogni stazione.
+        targets (array): La posizione nel registro della stazione di arrivo di ogni collegamento.
+        energy (array): Il coefficiente energetico di ogni collegamento.
+        time (array): Il tempo di percorrenza in secondi di ogni collegamento.
+    """
+    def __init__(self, registry, max_cost, offsets, targets, energy, time):
+        self.registry = registry
+        self.max_cost = float(max_cost)
+        self.offsets = np.asarray(offsets)
+        self.targets = np.asarray(targets)
+        self.energy = np.asarray(energy)
+        self.time = np.asarray(time)
+        self._lists = None # Collegamenti come liste Python, create alla prima pianificazione
+
+    def __len__(self):
+        return len(self.targets)
+
+    @classmethod
+    def build(cls, registry, max_cost = float('inf')):
+        """
+        Calcola i collegamenti tra le stazioni adiacenti, con una ricerca di Dijkstra da ogni stazione che non attraversa le altre stazioni.
+
+        Args:
+            registry (StationRegistry): Il registro delle stazioni del grafo.
+            max_cost (float, optional): Il coefficiente energetico massimo dei collegamenti, ad esempio l'autonomia del veicolo con la batteria
+                più grande. Default è infinito.
+
+        Returns:
+            StationMatrix: La matrice dei costi tra le stazioni.
+
+        Raises:
+            ValueError: Se il grafo è diretto.
+        """
+        compiled_graph = registry.compiled_graph
+        if compiled_graph.directed:
+            raise ValueError("La matrice delle stazioni è supportata solo su grafi non diretti")
+        position = {i: k for k, i in enumerate(registry.indices.tolist())} # Indice del nodo -> posizione nel registro
+        offsets, targets, energy, time = [0], [], [], []
+        for k, station in enumerate(registry.station_list):
+            tree = bounded_dijkstra(compiled_graph, station, max_cost, barriers = registry.station_list)
+            for i, cost in tree.costs.items(): # In ordine di costo crescente
+                target = position.get(i)
+                if target is not None and target != k:
+                    targets.append(target)
+                    energy.append(cost)
+                    time.append(tree.times[i])
+            offsets.append(len(targets))
+        return cls(registry, max_cost, np.array(offsets, dtype=np.int64), np.array(targets, dtype=np.int64),
+                   np.array(energy, dtype=np.float64), np.array(time, dtype=np.float64))
+
+    def save(self, store, place, network_type = 'drive'):
+        """
+        Salva la matrice nell'archivio dei grafi, insieme al grafo della località e alle stazioni per cui è stata calcolata.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+        """
+        arrays = {'stations': self.registry.stations, 'max_cost': np.array(self.max_cost), 'offsets': self.offsets, 'targets': self.targets,
+                  'energy': self.energy, 'time': self.time}
+        store.save_arrays(place, "station_links", arrays, network_type)
+
+    @classmethod
+    def load(cls, store, place, registry, network_type = 'drive'):
+        """
+        Carica la matrice dall'archivio dei grafi.
+
+        Args:
+            store (GraphStore): L'archivio dei grafi.
+            place (str): Il nome della località.
+            registry (StationRegistry): Il registro delle stazioni del grafo della località.
+            network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+
+        Returns:
+            StationMatrix: La matrice, o None se non è presente nell'archivio o è stata calcolata per stazioni diverse.
+        """
+        arrays = store.load_arrays(place, "station_links", network_type)
+        if arrays is None or not np.array_equal(arrays.pop('stations'), registry.stations):
+            return None
+        return cls(registry, **arrays)
+
+    def reach(self, k, budget):
+        """
+        Calcola i costi minimi dalla stazione in posizione `k` alle stazioni raggiungibili entro un budget, senza soste intermedie.
+
+        È una ricerca di Dijkstra sul grafo delle stazioni: le stazioni intermedie vengono attraversate senza ricaricare.
+
+        Args:
+            k (int): La posizione nel registro della stazione di partenza.
+            budget (float): Il coefficiente energetico massimo.
+
+        Returns:
+            tuple: Due dizionari, dalla posizione di ogni stazione raggiunta (esclusa `k`) al coefficiente energetico e al tempo in secondi.
+        """
+        if self._lists is None:
+            self._lists = (self.offsets.tolist(), self.targets.tolist(), self.energy.tolist(), self.time.tolist())
+        offsets, targets, energy, time = self._lists
+        costs, times = {}, {} # Costi e tempi definitivi
+        best = {k: 0.0}
+        frontier = [(0.0, 0.0, k)]
+        while frontier:
+            cost, leg_time, u = heappop(frontier)
+            if u in costs: # Voce obsoleta
+                continue
+            costs[u] = cost
+            times[u] = leg_time
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                new_cost = cost + energy[e]
+                if new_cost <= budget and new_cost < best.get(v, float('inf')):
+                    best[v] = new_cost
+                    heappush(frontier, (new_cost, leg_time + time[e], v))
+        del costs[k], times[k]
+        return costs, times
+
+    def plan(self, start, goal, first_range, full_range, availability = None):
+        """
+        Sceglie le soste di ricarica di un viaggio con il minor numero di soste e, a parità di soste, il minor costo energetico.
+
+        Due ricerche di Dijkstra limitate sulla rete stradale calcolano i costi dalla partenza alle stazioni (entro `first_range`) e dalle stazioni
+        all'arrivo (entro `full_range`). Le soste vengono poi cercate per livelli sul grafo delle stazioni: le stazioni raggiungibili con una sosta
+        in più sono calcolate con `reach` solo se l'arrivo non è raggiungibile dalle stazioni del livello attuale.
+
+        Args:
+            start (int): L'ID del nodo di partenza.
+            goal (int): L'ID del nodo di arrivo.
+            first_range (float): Il coefficiente energetico massimo del primo tratto, con la batteria alla partenza.
+            full_range (float): Il coefficiente energetico massimo dei tratti successivi, con la batteria ricaricata.
+            availability (StationAvailability, optional): Le stazioni disponibili per la richiesta. Default sono le stazioni disponibili nel registro.
+
+        Returns:
+            tuple: Gli ID dei nodi delle soste, il coefficiente energetico e il tempo di percorrenza in secondi di ogni tratto
+            (uno più delle soste), oppure None se l'arrivo non è raggiungibile.
+        """
+        registry = self.registry
+        compiled_graph = registry.compiled_graph
+        start_tree = bounded_dijkstra(compiled_graph, start, first_range, targets = registry.station_list + [goal])
+        if goal in start_tree: # Arrivo raggiungibile senza soste
+            return [], [start_tree.cost(goal)], [start_tree.time(goal)]
+        goal_tree = bounded_dijkstra(compiled_graph, goal, full_range, targets = registry.station_list)
+        available = (registry.available if availability is None else availability.mask).tolist()
+        indices = registry.indices.tolist()
+        goal_label = len(indices) # Etichetta dell'arrivo
+        labels = {-1: (0.0, None, 0.0)} # Posizione -> (costo, precedente, tempo del tratto); -1 è la partenza
+        layer = {k: (start_tree.costs[i], -1, start_tree.times[i]) for k, i in enumerate(indices) if available[k] and i in start_tree.costs}
+        while layer: # Un livello per ogni numero di soste
+            labels.update(layer)
+            best = None
+            for k, (cost, _, _) in layer.items(): # Arrivo dalle stazioni del livello, con il costo minimo
+                i = indices[k]
+                if i in goal_tree.costs and (best is None or cost + goal_tree.costs[i] < best[0]):
+                    best = (cost + goal_tree.costs[i], k, goal_tree.times[i])
+            if best is not None:
+                labels[goal_label] = best
+                break
+            next_layer = {}
+            for k, (cost, _, _) in layer.items(): # Stazioni raggiungibili con una sosta in più
+                costs, times = self.reach(k, full_range)
+                for target, leg_cost in costs.items():
+                    if available[target] and target not in labels and (target not in next_layer or cost + leg_cost < next_layer[target][0]):
+                        next_layer[target] = (cost + leg_cost, k, times[target])
+            layer = next_layer
+        if goal_label not in labels:
+            return None
+        positions, costs, times = [], [], []
+        k = goal_label
+        while k != -1: # Ricostruisce le soste a ritroso, con il costo e il tempo di ogni tratto
+            cost, previous, leg_time = labels[k]
+            costs.append(cost - labels[previous][0])
+            times.append(leg_time)
+            if previous != -1:
+                positions.append(previous)
+            k = previous
+        positions.reverse()
+        costs.reverse()
+        times.reverse()
+        return [registry.station_list[k] for k in positions], costs, times
+
+_matrices = WeakKeyDictionary() # Matrici già costruite, rilasciate insieme al registro delle stazioni
+
+def station_matrix(graph, max_cost = float('inf'), store = None, place = None, network_type = 'drive', build = True):
+    """
+    Restituisce la matrice delle stazioni di ricarica di un grafo, leggendola dall'archivio o costruendola.
+
+    Una matrice già disponibile viene riutilizzata se copre almeno `max_cost`. Se la località è indicata, una matrice costruita viene salvata
+    nell'archivio. Quando le stazioni cambiano (`place_charging_stations`) il registro viene ricostruito, e con lui la matrice.
+
+    Args:
+        graph (networkx.Graph): Il grafo che contiene le stazioni.
+        max_cost (float, optional): Il coefficiente energetico massimo dei collegamenti richiesto. Default è infinito.
+        store (GraphStore, optional): L'archivio dei grafi da cui leggere e in cui salvare la matrice. Default è None, solo in memoria.
+        place (str, optional): Il nome della località nell'archivio. Default è None.
+        network_type (str, optional): Il tipo di rete stradale. Default è 'drive'.
+        build (bool, optional): Se False, la matrice non viene costruita: viene restituita solo se è già in memoria o nell'archivio. Default è True.
+
+    Returns:
+        StationMatrix: La matrice dei costi tra le stazioni, o None se non è disponibile e `build` è False.
+    """
+    registry = station_registry(graph)
+    matrix = _matrices.get(registry)
+    if matrix is None or matrix.max_cost < max_cost:
+        matrix = StationMatrix.load(store, place, registry, network_type) if store is not None and place is not None else None
+        if matrix is None or matrix.max_cost < max_cost:
+            if not build:
+                return None
+            matrix = StationMatrix.build(registry, max_cost)
+            if store is not None and place is not None:
+                matrix.save(store, place, network_type)
+        _matrices[registry] = matrix
+    return matrix
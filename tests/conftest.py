@@ -0,0 +1,7 @@
+import os
+import sys
+"""
+Configurazione dei test: i moduli del progetto sono nella radice del repository.
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
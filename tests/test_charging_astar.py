@@ -0,0 +1,61 @@
+import networkx as nx
+from ASTAR import ChargingAStar
+from charging_path_finding import ChargingPathFinding
+"""
+Modulo test_charging_astar.py
+
+Test di regressione per la dominanza tra etichette e il limite di etichette per nodo di `ChargingAStar`.
+"""
+
+def kwh_edge(kwh, travel_time, speed_kph = 50, electric_constant = 0.06, ambient_temperature = 20):
+    """
+    Restituisce gli attributi di un arco che consuma `kwh` kWh con la costante elettrica e la temperatura indicate.
+    """
+    length = kwh / (speed_kph * electric_constant / ambient_temperature) * 1000
+    return {'length': length, 'speed_kph': speed_kph, 'travel_time': travel_time}
+
+def test_faster_label_does_not_prune_label_with_more_charge():
+    # S→A→X→G è più veloce ma arriva con 17.5 kWh (sotto il minimo), S→B→X→G arriva con 20.4 kWh:
+    # X viene raggiunto prima con 50.5 kWh e poi, con un costo maggiore, con 53.4 kWh, che non è dominata e va espansa
+    G = nx.Graph()
+    G.add_nodes_from(['S', 'A', 'B', 'X', 'G'], x = 10.0, y = 45.0) # Stesse coordinate: euristica nulla
+    G.add_edge('S', 'A', **kwh_edge(4.75, 10))
+    G.add_edge('A', 'X', **kwh_edge(4.75, 10))
+    G.add_edge('S', 'B', **kwh_edge(3.3, 100))
+    G.add_edge('B', 'X', **kwh_edge(3.3, 100))
+    G.add_edge('X', 'G', **kwh_edge(33, 10))
+    problem = ChargingPathFinding(G, 'S', 'G', battery = 60, min_battery = 20, stations = [])
+    solution = ChargingAStar().solve(problem)
+    assert solution == [('S', 'B'), ('B', 'X'), ('X', 'G')]
+
+def test_faster_label_is_kept_when_it_has_enough_charge():
+    G = nx.Graph()
+    G.add_nodes_from(['S', 'A', 'B', 'X', 'G'], x = 10.0, y = 45.0)
+    G.add_edge('S', 'A', **kwh_edge(4.75, 10))
+    G.add_edge('A', 'X', **kwh_edge(4.75, 10))
+    G.add_edge('S', 'B', **kwh_edge(3.3, 100))
+    G.add_edge('B', 'X', **kwh_edge(3.3, 100))
+    G.add_edge('X', 'G', **kwh_edge(20, 10))
+    problem = ChargingPathFinding(G, 'S', 'G', battery = 60, min_battery = 20, stations = [])
+    assert ChargingAStar().solve(problem) == [('S', 'A'), ('A', 'X'), ('X', 'G')]
+
+def test_charges_only_the_missing_energy():
+    # Da S a G servono 40 kWh più il minimo di 20: con 30 kWh alla partenza bisogna ricaricare in C almeno 30 kWh,
+    # cioè fino al primo livello (multiplo di 5 kWh) che lo permette, 50 kWh dopo aver consumato 10 kWh
+    G = nx.Graph()
+    G.add_nodes_from(['S', 'C', 'G'], x = 10.0, y = 45.0)
+    G.add_edge('S', 'C', **kwh_edge(10, 60))
+    G.add_edge('C', 'G', **kwh_edge(30, 60))
+    problem = ChargingPathFinding(G, 'S', 'G', battery = 30, min_battery = 20, stations = ['C'])
+    solution = ChargingAStar().solve(problem)
+    assert [action for action in solution if action[0] != 'charge'] == [('S', 'C'), ('C', 'G')]
+    charge = solution[1]
+    assert charge[:2] == ('charge', 'C') and abs(charge[2] - 30) < 1e-9
+
+def test_max_labels_bounds_node_expansions():
+    G = nx.Graph()
+    G.add_nodes_from(['S', 'C', 'G'], x = 10.0, y = 45.0)
+    G.add_edge('S', 'C', **kwh_edge(10, 60))
+    G.add_edge('C', 'G', **kwh_edge(30, 60))
+    problem = ChargingPathFinding(G, 'S', 'G', battery = 30, min_battery = 20, stations = ['C'], max_labels = 1)
+    assert ChargingAStar().solve(problem) is None # C andrebbe espanso due volte, all'arrivo e dopo la ricarica
@@ -0,0 +1,60 @@
+import random
+import networkx as nx
+import pytest
+from ASTAR import BidirectionalAStar, CompiledAStar
+from compiled_graph import compile_graph
+from contraction_hierarchies import ContractionHierarchiesSearch, ContractionHierarchy
+from landmarks import Landmarks
+from path_finding import PathFinding
+"""
+Modulo test_shortest_paths.py
+
+Test di correttezza delle ricerche punto-punto ottime (Contraction Hierarchies, A* bidirezionale, A* con euristica ALT)
+rispetto alla ricerca di Dijkstra di NetworkX, sullo stesso costo energetico di `SearchProblem.getSuccessors`.
+"""
+
+def energy(u, v, edge_data):
+    """
+    Restituisce il costo energetico di un arco, come in `SearchProblem.getSuccessors`.
+    """
+    return edge_data['length'] / 1000 * edge_data['speed_kph']
+
+def random_graph(seed, nodes = 120, edges = 300):
+    """
+    Genera un grafo non diretto casuale e connesso, con coordinate e attributi degli archi come quelli di `build_osm_graph`.
+    """
+    rng = random.Random(seed)
+    G = nx.gnm_random_graph(nodes, edges, seed = seed)
+    G.add_edges_from((u, u + 1) for u in range(nodes - 1) if not G.has_edge(u, u + 1)) # Garantisce la connessione
+    for node in G.nodes:
+        G.nodes[node].update(x = 10 + rng.random() * 0.1, y = 45 + rng.random() * 0.1)
+    for u, v in G.edges:
+        length, speed = rng.uniform(50, 2000), rng.choice([30, 50, 70, 90])
+        G.edges[u, v].update(length = length, speed_kph = speed, travel_time = length / 1000 / speed * 3600)
+    return G
+
+def check_solution(G, start, goal, solution):
+    """
+    Verifica che la soluzione sia una lista contigua di azioni `(u, v)` da `start` a `goal` con il costo minimo.
+    """
+    assert solution is not None
+    assert solution[0][0] == start and solution[-1][1] == goal
+    assert all(a[1] == b[0] for a, b in zip(solution, solution[1:])) # Azioni contigue
+    cost = sum(energy(u, v, G.edges[u, v]) for u, v in solution) # Ogni azione è un arco del grafo originale
+    assert cost == pytest.approx(nx.dijkstra_path_length(G, start, goal, weight = energy))
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_searches_match_dijkstra(seed):
+    G = random_graph(seed)
+    compiled = compile_graph(G)
+    landmarks = Landmarks.build(compiled, k = 4, seed = seed)
+    searches = [
+        ContractionHierarchiesSearch(ContractionHierarchy.build(compiled)),
+        BidirectionalAStar(G, landmarks.heuristic),
+        CompiledAStar(compiled, landmarks.index_heuristic)
+    ]
+    rng = random.Random(seed)
+    for _ in range(30):
+        start, goal = rng.sample(list(G.nodes), 2)
+        for search in searches:
+            check_solution(G, start, goal, search.solve(PathFinding(G, start, goal)))